@@ -15,11 +15,20 @@ Assumptions:
 Outputs:
 - graphs/response_by_day.png
 - graphs/response_by_month.png
+- graphs/response_by_day_cv.png (with --control-variate)
+
+With --control-variate the daily arrival counts (summary.entrati) are used as a
+control variate: their expectation is lambda_per_sec * 86400 from the arrival
+rates CSV written by the engine (<input-dir>_arrivals/generated_daily_arrivals<rep>.csv).
+For every day the replica responses are regressed on the replica arrival counts
+and the adjusted mean and 95% CI are plotted against the plain ones.
 
 Usage: run the script from the repo root. Optional args --input-dir and --out-dir.
 """
 
 import os
+import sys
+import csv
 import glob
 import json
 from datetime import datetime
@@ -30,6 +39,9 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from batch.batchMeanPriority import controlVariateEstimate, replicationInterval
+
 
 def read_replica_file(path):
 	"""Read one replica file and return dict date_str -> avg_response_seconds"""
@@ -65,6 +77,69 @@ def read_replica_file(path):
 	return date_to_response
 
 
+def read_replica_arrivals(path):
+	"""Read one replica file and return dict date_str -> arrivals of that day (summary.entrati)"""
+	date_to_arrivals = {}
+	with open(path, 'r') as f:
+		for line in f:
+			line = line.strip()
+			if not line:
+				continue
+			try:
+				obj = json.loads(line)
+			except Exception:
+				continue
+			if obj.get('type') != 'daily_summary':
+				continue
+			date_to_arrivals[obj.get('date')] = (obj.get('summary', {}) or {}).get('entrati', float('nan'))
+	return date_to_arrivals
+
+
+def read_expected_arrivals(rates_csv, dates):
+	"""Expected arrivals per date: lambda_per_sec * 86400 of the day offset from the first date."""
+	with open(rates_csv, 'r', encoding='utf-8') as f:
+		rates = [float(row['lambda_per_sec']) for row in csv.DictReader(f)]
+	first = dates[0]
+	expected = []
+	for d in dates:
+		i = (d - first).days
+		expected.append(rates[i] * 86400 if 0 <= i < len(rates) else np.nan)
+	return pd.Series(expected, index=dates)
+
+
+def control_variate_by_day(df, arrivals_df, expected):
+	"""Per day: plain mean/CI across replicas and control-variate adjusted mean/CI."""
+	rows = []
+	for d in df.index:
+		y = df.loc[d].values.astype(float)
+		c = arrivals_df.loc[d].values.astype(float)
+		ok = np.isfinite(y) & np.isfinite(c)
+		if ok.sum() < 3 or not np.isfinite(expected.loc[d]):
+			continue
+		r = controlVariateEstimate(y[ok], c[ok], expected.loc[d])
+		rows.append({'date': d, 'mean': r['raw_mean'], 'half_width': r['raw_half_width'],
+					 'cv_mean': r['mean'], 'cv_half_width': r['half_width'], 'beta': r['beta']})
+	return pd.DataFrame(rows).set_index('date') if rows else pd.DataFrame()
+
+
+def plot_control_variate_daily(cv_df, outpath, title='Daily response: plain vs control-variate 95% CI'):
+	plt.figure(figsize=(14, 6))
+	plt.plot(cv_df.index, cv_df['mean'], label='mean', alpha=0.8)
+	plt.fill_between(cv_df.index, cv_df['mean'] - cv_df['half_width'], cv_df['mean'] + cv_df['half_width'],
+					 alpha=0.2, label='95% CI')
+	plt.plot(cv_df.index, cv_df['cv_mean'], label='mean (control variate)', alpha=0.8)
+	plt.fill_between(cv_df.index, cv_df['cv_mean'] - cv_df['cv_half_width'],
+					 cv_df['cv_mean'] + cv_df['cv_half_width'], alpha=0.3, label='95% CI (control variate)')
+	plt.title(title)
+	plt.xlabel('Date')
+	plt.ylabel('Response (s)')
+	plt.grid(alpha=0.3)
+	plt.legend(fontsize='small')
+	plt.tight_layout()
+	plt.savefig(outpath)
+	plt.close()
+
+
 def collect_replicas(input_dir):
 	pattern = os.path.join(input_dir, 'daily_stats_rep*.json')
 	files = sorted(glob.glob(pattern))
@@ -150,7 +225,7 @@ def ensure_dir(d):
 		os.makedirs(d, exist_ok=True)
 
 
-def main(input_dir='src/transient_analysis_json', out_dir='graphs'):
+def main(input_dir='src/transient_analysis_json', out_dir='graphs', control_variate=False, rates_csv=None):
 	print(f'Reading replicas from: {input_dir}')
 	replicas, files = collect_replicas(input_dir)
 	if not replicas:
@@ -172,6 +247,37 @@ def main(input_dir='src/transient_analysis_json', out_dir='graphs'):
 	plot_replicas_monthly(monthly, out_month, title='Replica responses by month (system-wide)')
 	print(f'Wrote {out_month}')
 
+	if control_variate:
+		if rates_csv is None:
+			# run_finito_experiment writes <out_dir>_arrivals in the repository root
+			name = os.path.basename(input_dir.rstrip('/')) + '_arrivals'
+			candidates = [os.path.join(input_dir.rstrip('/') + '_arrivals', 'generated_daily_arrivals0.csv'),
+						  os.path.join(os.path.dirname(os.path.abspath(__file__)), name, 'generated_daily_arrivals0.csv')]
+			rates_csv = next((c for c in candidates if os.path.exists(c)), candidates[0])
+		if not os.path.exists(rates_csv):
+			print(f'Arrival rates CSV not found: {rates_csv} (use --rates-csv)')
+			return
+		arrivals_df = build_dataframe([read_replica_arrivals(p) for p in files]).reindex(df.index)
+		expected = read_expected_arrivals(rates_csv, list(df.index))
+		cv_df = control_variate_by_day(df, arrivals_df, expected)
+		if cv_df.empty:
+			print('Control variate needs at least 3 replicas per day')
+			return
+		out_cv = os.path.join(out_dir, 'response_by_day_cv.png')
+		plot_control_variate_daily(cv_df, out_cv)
+		print(f'Wrote {out_cv}')
+		print(f"Mean CI half-width: plain {cv_df['half_width'].mean():.2f} s, "
+			  f"control variate {cv_df['cv_half_width'].mean():.2f} s")
+
+		# whole horizon: one observation per replica (mean daily response vs total arrivals)
+		y = df.mean(axis=0).values
+		c = arrivals_df.sum(axis=0).values
+		if len(y) >= 3:
+			r = controlVariateEstimate(y, c, expected.sum())
+			_, plain_hw, _ = replicationInterval(y)
+			print(f"Horizon mean response: {r['raw_mean']:.2f} ± {plain_hw:.2f} s, "
+				  f"control variate {r['mean']:.2f} ± {r['half_width']:.2f} s (beta={r['beta']:.3e})")
+
 
 if __name__ == '__main__':
 	import argparse
@@ -179,6 +285,8 @@ if __name__ == '__main__':
 	parser = argparse.ArgumentParser(description='Plot system response by day and month from replica JSONs')
 	parser.add_argument('--input-dir', default='src/finite_horizon_json_base', help='Folder containing daily_stats_rep*.json')
 	parser.add_argument('--out-dir', default='graphs', help='Output folder for plots')
+	parser.add_argument('--control-variate', action='store_true', help='Also plot control-variate adjusted daily CIs')
+	parser.add_argument('--rates-csv', default=None, help='Arrival rates CSV (default: <input-dir>_arrivals/generated_daily_arrivals0.csv)')
 	args = parser.parse_args()
-	main(args.input_dir, args.out_dir)
+	main(args.input_dir, args.out_dir, args.control_variate, args.rates_csv)
 
@@ -3,7 +3,7 @@ import json
 import matplotlib.pyplot as plt
 import numpy as np
 import os
-from desPython import rvms
+from desPython import rvmsNumpy
 
 
 """
@@ -98,6 +98,42 @@ def read_stats(file_path, n):
                         service_data[key].extend(values[:n - len(service_data[key])])
     return service_data
 
+def read_daily_series(file_path):
+    """
+    Legge le serie giornaliere (una osservazione per giorno) dai file JSON per giorno.
+    Per ogni servizio la media del giorno di queue_time, service_time e response_time
+    (le code di InValutazione diventano InValutazione_<coda>) e in "arrivals" le entrate
+    nel sistema del giorno (summary.entrati, la variabile di controllo).
+    Le serie sono allineate per giorno: se un servizio non compare in un giorno vale NaN.
+    Restituisce: (dates, { "Service:metric": [valori,...], "arrivals": [...] })
+    """
+    dates = []
+    series = {"arrivals": []}
+    with open(file_path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            day = json.loads(line)
+            if day.get("type") != "daily_summary":
+                continue
+            idx = len(dates)
+            dates.append(day["date"])
+            series["arrivals"].append(day.get("summary", {}).get("entrati", np.nan))
+            for service_name, s in day.get("stats", {}).items():
+                if isinstance(s.get("visited"), dict):
+                    entries = [(f"{service_name}_{q}", s["queue_time"][q], s["executing_time"][q]) for q in s["visited"]]
+                else:
+                    entries = [(service_name, s["queue_time"], s["executing_time"])]
+                for name, queue_time, exec_time in entries:
+                    for metric, value in (("queue_time", queue_time), ("service_time", exec_time),
+                                          ("response_time", queue_time + exec_time)):
+                        values = series.setdefault(f"{name}:{metric}", [])
+                        values.extend([np.nan] * (idx - len(values)))
+                        values.append(value)
+    for values in series.values():
+        values.extend([np.nan] * (len(dates) - len(values)))
+    return dates, series
+
 def computeBatchMeans(data, batch_count):
     """
     Divide i dati in batch_count batch e ritorna le medie dei batch.
@@ -132,7 +168,113 @@ def getStudent(k):
     Restituisce il t-critico per un intervallo di confidenza al 95%.
     """
     alpha = 0.05
-    return rvms.idfStudent(k - 1, 1 - alpha/2)
+    return rvmsNumpy.idfStudentCached(k - 1, 1 - alpha/2)
+
+def replicationInterval(values, antithetic=False):
+    """
+    Intervallo di confidenza al 95% su una stima per replica.
+    Con antithetic=True le repliche (2k, 2k+1) sono una coppia antitetica: le due stime
+    sono correlate negativamente, quindi l'osservazione i.i.d. è la media della coppia
+    (un'eventuale replica spaiata finale viene scartata).
+
+    Returns:
+        tuple: (media, semiampiezza, numero di osservazioni indipendenti)
+    """
+    values = list(values)
+    if antithetic:
+        values = [(values[i] + values[i + 1]) / 2 for i in range(0, len(values) - 1, 2)]
+    n = len(values)
+    if n < 2:
+        raise ValueError(f"Servono almeno 2 osservazioni indipendenti, trovate {n}")
+    mean = sum(values) / n
+    stdev = sqrt(sum((x - mean) ** 2 for x in values) / (n - 1))
+    return mean, getStudent(n) * stdev / sqrt(n), n
+
+def expectedDailyArrivals(dates, daily_rates):
+    """
+    Valore atteso delle entrate giornaliere: daily_rates[i] * 86400, con i il giorno
+    contato dalla prima data delle serie (inizio della simulazione).
+    """
+    from datetime import date as _date
+    first = _date.fromisoformat(dates[0])
+    expected = []
+    for d in dates:
+        i = (_date.fromisoformat(d) - first).days
+        expected.append(daily_rates[i] * 86400 if 0 <= i < len(daily_rates) else np.nan)
+    return expected
+
+def controlVariateEstimate(y, c, c_expected):
+    """
+    Stimatore a variabile di controllo: y_cv = mean(y) - beta * mean(c - E[c]),
+    con beta = cov(y, c) / var(c) stimato per regressione sulle stesse osservazioni.
+    c_expected può essere uno scalare o una lista (un valore atteso per osservazione).
+    La semiampiezza al 95% usa la varianza dei residui (n - 2 gradi di libertà).
+    Restituisce: dict {mean, half_width, beta, raw_mean, raw_half_width, n}
+    """
+    y = np.asarray(y, dtype=float)
+    d = np.asarray(c, dtype=float) - np.asarray(c_expected, dtype=float)
+    n = len(y)
+    if n < 3:
+        raise ValueError(f"Servono almeno 3 osservazioni, trovate {n}")
+    y_mean, d_mean = y.mean(), d.mean()
+    raw_half_width = getStudent(n) * y.std(ddof=1) / sqrt(n)
+    sdd = float(((d - d_mean) ** 2).sum())
+    if sdd == 0.0:
+        return {"mean": float(y_mean), "half_width": float(raw_half_width), "beta": 0.0,
+                "raw_mean": float(y_mean), "raw_half_width": float(raw_half_width), "n": n}
+    beta = float(((d - d_mean) * (y - y_mean)).sum()) / sdd
+    resid = y - y_mean - beta * (d - d_mean)
+    s2 = float((resid ** 2).sum()) / (n - 2)
+    half_width = getStudent(n - 1) * sqrt(s2 * (1.0 / n + d_mean ** 2 / sdd))
+    return {"mean": float(y_mean - beta * d_mean), "half_width": float(half_width), "beta": beta,
+            "raw_mean": float(y_mean), "raw_half_width": float(raw_half_width), "n": n}
+
+def controlVariateBatchMeans(values, arrivals, expected, batch_count=None, rho_threshold=0.2, min_batches=32):
+    """
+    Batch means con variabile di controllo su serie giornaliere allineate: risposta,
+    entrate osservate ed entrate attese vengono raggruppate negli stessi batch
+    (scelti con selectBatchSize se batch_count è None), poi si applica controlVariateEstimate.
+    I giorni con valori mancanti vengono scartati.
+    """
+    rows = [(y, c, e) for y, c, e in zip(values, arrivals, expected)
+            if np.isfinite(y) and np.isfinite(c) and np.isfinite(e)]
+    y, c, e = ([r[i] for r in rows] for i in range(3))
+    if batch_count is None:
+        selection = selectBatchSize(y, rho_threshold, min_batches)
+        b, k = selection["batch_size"], selection["batch_count"]
+    else:
+        b, k = len(y) // batch_count, batch_count
+    if b == 0:
+        raise ValueError(f"Servono almeno {batch_count} giorni, disponibili {len(y)}")
+    result = controlVariateEstimate(computeBatchMeans(y[:b * k], k), computeBatchMeans(c[:b * k], k),
+                                    computeBatchMeans(e[:b * k], k))
+    result.update({"batch_size": b, "batch_count": k})
+    return result
+
+def controlVariateRows(file_path, daily_rates, keys, batch_count=None, rho_threshold=0.2, min_batches=32):
+    """
+    Tabella degli stimatori con variabile di controllo (entrate giornaliere) per le chiavi
+    "Service:metric" indicate, a partire dal file JSON per giorno di una run.
+    Restituisce righe [chiave, media, ±semiampiezza, media CV, ±semiampiezza CV, beta, riduzione %].
+    """
+    dates, series = read_daily_series(file_path)
+    if not dates:
+        return []
+    expected = expectedDailyArrivals(dates, daily_rates)
+    rows = []
+    for key in keys:
+        if key not in series:
+            continue
+        try:
+            r = controlVariateBatchMeans(series[key], series["arrivals"], expected,
+                                         batch_count, rho_threshold, min_batches)
+        except ValueError as e:
+            print(f"⚠️ {key}: variabile di controllo non applicabile ({e})")
+            continue
+        reduction = 100.0 * (1.0 - r["half_width"] / r["raw_half_width"]) if r["raw_half_width"] > 0 else 0.0
+        rows.append([key, f"{r['raw_mean']:.4f}", f"±{r['raw_half_width']:.4f}", f"{r['mean']:.4f}",
+                     f"±{r['half_width']:.4f}", f"{r['beta']:.3e}", f"{reduction:.1f}%"])
+    return rows
 
 def autocorr_stats(arr, k):
     """
@@ -171,6 +313,50 @@ def autocorr_stats(arr, k):
     autocorr_1 = cosum[1] / cosum[0] if cosum[0] != 0 else 0.0
     return autocorr_1, mean, stdev
 
+def selectBatchSize(data, rho_threshold=0.2, min_batches=32, initial_batch_size=1):
+    """
+    Sceglie automaticamente la dimensione dei batch: parte da initial_batch_size e la
+    raddoppia finché l'autocorrelazione lag-1 delle medie dei batch (autocorr_stats)
+    scende sotto rho_threshold.
+    Al raddoppio le nuove medie si ottengono mediando a coppie quelle precedenti,
+    quindi i dati vengono scansionati una sola volta.
+    Se la soglia non è raggiungibile mantenendo almeno min_batches batch la run è
+    troppo corta: viene restituita l'ultima configurazione valida con sufficient=False
+    e in min_samples_needed una stima dei campioni necessari.
+    Restituisce: dict {batch_size, batch_count, batch_means, autocorr_1, mean, stdev,
+                       sufficient, min_samples_needed}
+    """
+    n = len(data)
+    b = max(1, int(initial_batch_size))
+    min_batches = max(2, int(min_batches))
+    k = n // b
+    if k < 2:
+        raise ValueError(f"Servono almeno {2 * b} campioni, ricevuti {n}.")
+
+    means = computeBatchMeans(data[:k * b], k)
+    result = None
+    while True:
+        autocorr_1, mean, stdev = autocorr_stats(means, 1)
+        result = {
+            "batch_size": b,
+            "batch_count": len(means),
+            "batch_means": means,
+            "autocorr_1": autocorr_1,
+            "mean": mean,
+            "stdev": stdev,
+            "sufficient": autocorr_1 < rho_threshold and len(means) >= min_batches,
+            "min_samples_needed": None,
+        }
+        if result["sufficient"] or len(means) // 2 < min_batches:
+            break
+        # Raddoppio: la media di un batch di 2b è la media di due batch consecutivi di b
+        means = [(means[2 * i] + means[2 * i + 1]) / 2 for i in range(len(means) // 2)]
+        b *= 2
+
+    if not result["sufficient"]:
+        result["min_samples_needed"] = 2 * b * min_batches
+    return result
+
 # =============================
 # Test manuale (solo se eseguito direttamente)
 # =============================
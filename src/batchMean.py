@@ -3,7 +3,8 @@ import json
 import matplotlib.pyplot as plt
 import numpy as np
 import os
-from desPython import rvms
+from desPython import rvmsNumpy
+from batch.batchMeanPriority import read_daily_series, expectedDailyArrivals, controlVariateEstimate, controlVariateBatchMeans, controlVariateRows
 
 
 
@@ -121,7 +122,7 @@ def getStudent(k):
     Restituisce il t-critico per un intervallo di confidenza al 95%.
     """
     alpha = 0.05
-    return rvms.idfStudent(k - 1, 1 - alpha/2)
+    return rvmsNumpy.idfStudentCached(k - 1, 1 - alpha/2)
 
 
 
@@ -0,0 +1,317 @@
+"""
+Benchmark degli engine e delle primitive della simulazione.
+
+1) End-to-end: eventi al secondo del ciclo degli eventi di ogni engine (Base, Migliorativa,
+   SimulationEngineExp, Priority) su un orizzonte breve e un seme fissi. La costruzione dei blocchi
+   (compreso il fit della Pareto) non è cronometrata; il ciclo è quello degli engine, senza le
+   misure aggiuntive sulle code di Priority.normale.
+2) Microbenchmark: rngs.random, rvgs.Exponential / Lognormal / Normal, rvgsCostum.BoundedPareto,
+   push/pop di EventQueue, instradamento di InValutazione (estrazioni in cascata contro tabella
+   alias), EndBlock._update_stats e batchMean.autocorr_stats (ns per operazione, migliore e
+   mediana su più ripetizioni).
+
+I risultati vanno in benchmark_json/bench_<data>.json; con --compare si confronta la run con una
+precedente (speedup > 1 = più veloce).
+
+Uso (dalla cartella src):
+    python benchmark.py --days 3
+    python benchmark.py --only micro --compare benchmark_json/bench_20251019_101500.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from tabulate import tabulate
+
+from batchMean import autocorr_stats
+from desPython import rngs, rngsCrn, rvgs, rvgsCostum
+from models.person import Person
+from simulation.Event import Event
+from simulation.EventQueue import EventQueue
+from simulation.Routing import AliasRouter
+from simulation.blocks.EndBlock import EndBlock
+from simulation.states.NormalState import NormalState
+
+
+OUT_ROOT = Path(__file__).resolve().parent / "benchmark_json"
+TRANSIENT_DIR = Path(__file__).resolve().parent / "transient_analysis_json"
+
+
+# ---------------------------------------------------------------------------
+# End-to-end
+# ---------------------------------------------------------------------------
+
+def _build_base():
+    from simulation.SimulationEngine import SimulationEngine
+    engine = SimulationEngine()
+    return engine.buildBlocks(replica_id="bench"), engine.getArrivalsEqualsRates(["may", "june"], [9, 300])
+
+
+def _build_migliorativa():
+    from simulation.SimulationEngineMigliorativa import SimulationEngine
+    engine = SimulationEngine()
+    return engine.buildBlocks(replica_id="bench"), engine.getArrivalsEqualsRates(["may", "june"], [7, 190])
+
+
+def _build_exp():
+    from simulation.verification.base.SimulationEngine import SimulationEngineExp
+    engine = SimulationEngineExp()
+    return engine.buildBlocks(replica_id="bench"), engine.getArrivalsRates()
+
+
+def _build_priority():
+    from simulation.verification.SimulationEnginePriority import SimulationEngine
+    engine = SimulationEngine()
+    return engine.buildBlocks(), engine.getArrivalsRates()
+
+
+ENGINES = {
+    "base": _build_base,
+    "migliorativa": _build_migliorativa,
+    "exp": _build_exp,
+    "priority": _build_priority,
+}
+
+
+@contextlib.contextmanager
+def _preserve(path: Path):
+    """Ripristina path com'era: l'EndBlock senza replica_id di Priority lo riscrive alla costruzione."""
+    original = path.read_bytes() if path.exists() else None
+    try:
+        yield
+    finally:
+        if original is None:
+            path.unlink(missing_ok=True)
+        else:
+            path.write_bytes(original)
+
+
+def bench_engine(name: str, days: int, seed: int) -> dict:
+    """Eventi al secondo del ciclo degli eventi dell'engine indicato."""
+    with _preserve(TRANSIENT_DIR / "daily_stats.json"), open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        rngs.plantSeeds(seed)
+        rngs.selectStream(0)        # il fit della Pareto estrae dallo stream corrente
+        blocks, daily_rates = ENGINES[name]()
+        startingBlock, endBlock = blocks[0], blocks[-1]
+        endBlock.redirectOutput("bench")
+        startingBlock.setDailyRates(daily_rates)
+        start = startingBlock.start_timestamp
+        startingBlock.setStartAndEndTimestamps(start, start + timedelta(days=days))
+
+        event_queue = EventQueue()
+        event_queue.setArrivals(startingBlock.arrivalStream())
+        events = 0
+        t0 = time.perf_counter()
+        while not event_queue.is_empty():
+            event = event_queue.pop()
+            event = event[0] if isinstance(event, list) else event
+            if event.handler:
+                new_events = event.handler(event.person)
+                if new_events:
+                    for new_event in new_events:
+                        event_queue.push(new_event)
+            events += 1
+        elapsed = time.perf_counter() - t0
+        endBlock.finalize()
+        Path(endBlock.output_file).unlink(missing_ok=True)
+
+    return {"days": days, "seed": seed, "events": events, "entities": endBlock.total_processed,
+            "seconds": round(elapsed, 4), "events_per_sec": round(events / elapsed, 1)}
+
+
+# ---------------------------------------------------------------------------
+# Microbenchmark
+# ---------------------------------------------------------------------------
+
+def _timeit(run, number: int, repeat: int) -> dict:
+    """run(number) esegue number operazioni; restituisce ns per operazione (migliore e mediana)."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run(number)
+        times.append((time.perf_counter() - t0) / number * 1e9)
+    return {"ops": number, "repeat": repeat, "ns_per_op_best": round(min(times), 1),
+            "ns_per_op_median": round(statistics.median(times), 1)}
+
+
+def _loop(fn, *args):
+    def run(n):
+        for _ in range(n):
+            fn(*args)
+    return run
+
+
+def _event_queue_run(n):
+    """Push di n eventi con timestamp casuali e pop di tutti: un'operazione = un push + un pop."""
+    base = datetime(2025, 5, 1)
+    events = [Event(base + timedelta(seconds=rngs.random() * 86400), "Bench", None, "bench") for _ in range(n)]
+
+    def run(_):
+        queue = EventQueue()
+        for event in events:
+            queue.push(event)
+        while not queue.is_empty():
+            queue.pop()
+    return run
+
+
+def _cascade_route(s, d, q):
+    """Instradamento di InValutazione senza tabella alias: fino a tre uniformi."""
+    rngsCrn.selectStream(105)
+    if rvgs.Uniform(0, 1) <= s or rvgs.Uniform(0, 1) <= d:
+        return "end"
+    rngsCrn.selectStream(5)
+    return "compilazionePrecompilata" if rvgs.Uniform(0, 1) < q else "invioDiretto"
+
+
+def _bench_person(i: int) -> Person:
+    """Persona con il percorso tipico Start -> CompilazionePrecompilata -> InValutazione."""
+    person = Person(i)
+    t = datetime(2025, 5, 1, 8) + timedelta(seconds=i)
+    for name, wait, service in (("Start", 0, 0), ("CompilazionePrecompilata", 30, 600), ("InValutazione", 3600, 900)):
+        state = NormalState(name, t, i % 50)
+        state.service_start_time = t + timedelta(seconds=wait)
+        state.service_end_time = state.service_start_time + timedelta(seconds=service)
+        person.append_state(state)
+        t = state.service_end_time
+    return person
+
+
+def _update_stats_run(end_block: EndBlock):
+    persons = [_bench_person(i) for i in range(1024)]
+
+    def run(n):
+        end_block.daily_stats = {}
+        for i in range(n):
+            end_block._update_stats(persons[i & 1023])
+    return run
+
+
+def bench_micro(scale: float = 1.0, repeat: int = 5) -> dict:
+    rngs.plantSeeds(12345)
+    rngs.selectStream(0)
+    n = max(1, int(200_000 * scale))
+    results = {
+        "rngs.random": _timeit(_loop(rngs.random), n, repeat),
+        "rvgs.Exponential": _timeit(_loop(rvgs.Exponential, 1.0), n, repeat),
+        "rvgs.Lognormal": _timeit(_loop(rvgs.Lognormal, 0.5, 0.3), n, repeat),
+        "rvgs.Normal": _timeit(_loop(rvgs.Normal, 0.0, 1.0), n, repeat),
+        "rvgsCostum.BoundedPareto": _timeit(_loop(rvgsCostum.BoundedPareto, 1.5, 0.1, 0.1, 1.0), n, repeat),
+    }
+    s, d, q = 0.96, 0.5, 0.78
+    router = AliasRouter([s + (1 - s) * d, (1 - s) * (1 - d) * q, (1 - s) * (1 - d) * (1 - q)],
+                         ["end", "compilazionePrecompilata", "invioDiretto"])
+    results["routing InValutazione (cascata)"] = _timeit(_loop(_cascade_route, s, d, q), n, repeat)
+    results["routing InValutazione (alias)"] = _timeit(_loop(router.route, None, 105), n, repeat)
+    n_queue = max(1, int(50_000 * scale))
+    results["EventQueue.push+pop"] = _timeit(_event_queue_run(n_queue), n_queue, repeat)
+
+    end_block = EndBlock(replica_id="bench")
+    try:
+        results["EndBlock._update_stats"] = _timeit(_update_stats_run(end_block), max(1, int(50_000 * scale)), repeat)
+    finally:
+        end_block.file_handle.close()
+        Path(end_block.output_file).unlink(missing_ok=True)
+
+    data = [rngs.random() for _ in range(4096)]
+    results["batchMean.autocorr_stats(n=4096,k=64)"] = _timeit(
+        _loop(autocorr_stats, data, 64), max(1, int(20 * scale)), repeat)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Report e confronto
+# ---------------------------------------------------------------------------
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).resolve().parent,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict):
+    if results.get("engines"):
+        print("\n=== Engine (eventi/s) ===")
+        print(tabulate([[name, r["events"], r["entities"], f"{r['seconds']:.2f}", f"{r['events_per_sec']:.0f}"]
+                        for name, r in results["engines"].items()],
+                       headers=["Engine", "Eventi", "Entità", "Secondi", "Eventi/s"], tablefmt="fancy_grid"))
+    if results.get("micro"):
+        print("\n=== Microbenchmark (ns/op) ===")
+        print(tabulate([[name, r["ops"], f"{r['ns_per_op_best']:.1f}", f"{r['ns_per_op_median']:.1f}"]
+                        for name, r in results["micro"].items()],
+                       headers=["Primitiva", "Op", "Migliore", "Mediana"], tablefmt="fancy_grid"))
+
+
+def compare(results: dict, previous: dict):
+    """Speedup rispetto a una run precedente (> 1 = più veloce)."""
+    rows = []
+    for name, r in results.get("engines", {}).items():
+        old = previous.get("engines", {}).get(name)
+        if old:
+            rows.append([f"engine:{name}", f"{old['events_per_sec']:.0f} ev/s", f"{r['events_per_sec']:.0f} ev/s",
+                         f"{r['events_per_sec'] / old['events_per_sec']:.2f}x"])
+    for name, r in results.get("micro", {}).items():
+        old = previous.get("micro", {}).get(name)
+        if old:
+            rows.append([name, f"{old['ns_per_op_best']:.1f} ns", f"{r['ns_per_op_best']:.1f} ns",
+                         f"{old['ns_per_op_best'] / r['ns_per_op_best']:.2f}x"])
+    print(f"\n=== Confronto con {previous.get('git_commit')} ({previous.get('timestamp')}) ===")
+    print(tabulate(rows, headers=["Benchmark", "Prima", "Ora", "Speedup"], tablefmt="fancy_grid"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark degli engine e delle primitive")
+    parser.add_argument("--only", choices=["engines", "micro"], default=None)
+    parser.add_argument("--engines", default=",".join(ENGINES), help=f"Engine da misurare ({','.join(ENGINES)})")
+    parser.add_argument("--days", type=int, default=3, help="Orizzonte simulato dei benchmark end-to-end")
+    parser.add_argument("--seed", type=int, default=123456789)
+    parser.add_argument("--scale", type=float, default=1.0, help="Fattore sul numero di operazioni dei microbenchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=None, help="File JSON dei risultati (default: benchmark_json/bench_<data>.json)")
+    parser.add_argument("--compare", default=None, help="JSON di una run precedente da confrontare")
+    args = parser.parse_args()
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "engines": {},
+        "micro": {},
+    }
+    if args.only != "micro":
+        for name in [e.strip() for e in args.engines.split(",") if e.strip()]:
+            if name not in ENGINES:
+                raise ValueError(f"Engine sconosciuto: {name} (disponibili: {', '.join(ENGINES)})")
+            print(f"▶ Engine {name} ({args.days} giorni)...")
+            results["engines"][name] = bench_engine(name, args.days, args.seed)
+    if args.only != "engines":
+        print("▶ Microbenchmark...")
+        results["micro"] = bench_micro(args.scale, args.repeat)
+
+    print_results(results)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+    out_path = Path(args.out) if args.out else OUT_ROOT / f"bench_{datetime.now():%Y%m%d_%H%M%S}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with out_path.open("w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📁 Risultati salvati in: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -43,11 +43,13 @@ MULTIPLIER = 48271      #/* DON'T CHANGE THIS VALUE                  */
 CHECK = 399268537  #/* DON'T CHANGE THIS VALUE                  */
 STREAMS = 256        #/* # of streams, DON'T CHANGE THIS VALUE    */
 A256 = 22925      #/* jump multiplier, DON'T CHANGE THIS VALUE */
+STREAM_JUMP = 8367782  #/* calls to Random() between planted streams */
 DEFAULT = 123456789  #/* initial seed, use 0 < DEFAULT < MODULUS  */
 
 #statics
 stream = 0
 initialized = 0
+antithetic = False   #/* if True random() returns 1 - u (antithetic replicas) */
 seed = [DEFAULT]
 for i in range(1,STREAMS):
   seed.append(DEFAULT)
@@ -59,6 +61,9 @@ def random():
   #* uniformly distributed between 0.0 and 1.0.  The period is (m - 1)
   #* where m = 2,147,483,647 amd the smallest and largest possible values
   #* are (1 / m) and 1 - (1 / m) respectively.
+  #* In antithetic mode the complement 1 - u is returned: the support is
+  #* symmetric, so the state sequence is unchanged and every variate
+  #* generated by inversion (rvgs, rvgsCostum) becomes antithetic.
   #* ---------------------------------------------------------------------
   #*/
   global seed
@@ -72,6 +77,8 @@ def random():
   else:
     seed[stream] = int(t + MODULUS)
 
+  if antithetic:
+    return float((MODULUS - seed[stream]) / MODULUS)
   return float(seed[stream] / MODULUS)
 
 def plantSeeds(x): 
@@ -144,6 +151,116 @@ def getSeed():
   return seed[stream]
 
 
+def getState():
+  # /* --------------------------------------------------------------------
+  #  * Use this (optional) procedure to get a copy of the states of all
+  #  * the streams, e.g. to restart a replica from the same point.
+  #  * --------------------------------------------------------------------
+  #  */
+  return list(seed)
+
+
+def putState(state):
+  # /* --------------------------------------------------------------------
+  #  * Use this (optional) procedure to restore the states of all the
+  #  * streams from a copy obtained with getState().
+  #  * --------------------------------------------------------------------
+  #  */
+  global initialized
+
+  if len(state) != STREAMS:
+    raise ValueError(f"Stato non valido: attesi {STREAMS} semi, trovati {len(state)}")
+  seed[:] = [int(x) for x in state]
+  initialized = 1
+
+
+def setAntithetic(flag):
+  # /* --------------------------------------------------------------------
+  #  * Use this (optional) procedure to switch antithetic mode on or off:
+  #  * while it is on random() returns 1 - u instead of u.
+  #  * --------------------------------------------------------------------
+  #  */
+  global antithetic
+
+  antithetic = bool(flag)
+
+
+def jumpAhead(n):
+  # /* --------------------------------------------------------------------
+  #  * Use this (optional) procedure to advance every stream by n calls to
+  #  * Random() in O(log n): the state of a Lehmer generator after n steps
+  #  * is x * a^n mod m. Two copies of a stream advanced by n1 < n2 share
+  #  * draws as soon as the first one makes n2 - n1 calls to Random(): for
+  #  * independent replicas use disjointOffsets instead.
+  #  * --------------------------------------------------------------------
+  #  */
+  if n < 0:
+    raise ValueError(f"Salto non valido: {n}")
+  a = pow(MULTIPLIER, int(n), MODULUS)
+  for j in range(STREAMS):
+    seed[j] = (seed[j] * a) % MODULUS
+
+
+def streamDraws(start, end, limit=STREAM_JUMP):
+  # /* --------------------------------------------------------------------
+  #  * Use this (optional) procedure to count the calls to Random() that
+  #  * take a stream from state start to state end: the n in [0, limit)
+  #  * with end = start * a^n mod m (baby-step giant-step, O(sqrt(limit))),
+  #  * or None if end is not reached within limit calls.
+  #  * --------------------------------------------------------------------
+  #  */
+  steps = int(limit ** 0.5) + 1
+  baby = {}
+  x = int(start)
+  for i in range(steps):
+    baby.setdefault(x, i)
+    x = (x * MULTIPLIER) % MODULUS
+  back = pow(MULTIPLIER, MODULUS - 1 - steps, MODULUS)    #/* a^(-steps) */
+  y = int(end)
+  for k in range(steps + 1):
+    if y in baby:
+      n = k * steps + baby[y]
+      return n if n < limit else None
+    y = (y * back) % MODULUS
+  return None
+
+
+def streamUsage(starts, limit=STREAM_JUMP):
+  # /* --------------------------------------------------------------------
+  #  * Use this (optional) procedure to get, for every stream moved since
+  #  * the states starts (a copy from getState), the calls to Random() made
+  #  * since then, or None if they are limit or more (see streamDraws).
+  #  * --------------------------------------------------------------------
+  #  */
+  return {j: streamDraws(starts[j], seed[j], limit) for j in range(STREAMS) if seed[j] != starts[j]}
+
+
+def disjointOffsets(used, n, reserved=()):
+  # /* --------------------------------------------------------------------
+  #  * Use this (optional) procedure to place n replicas on disjoint planted
+  #  * streams. plantSeeds(x) with x the planted state of stream q moves
+  #  * every stream j to the planted stream q + j, STREAM_JUMP calls away
+  #  * from its neighbours: the offsets q returned keep the sets q + used
+  #  * pairwise disjoint, disjoint from reserved and below STREAMS, so two
+  #  * replicas never share draws as long as each stream makes fewer than
+  #  * STREAM_JUMP calls to Random() (see streamDraws).
+  #  * --------------------------------------------------------------------
+  #  */
+  used = sorted(set(used))
+  taken = set(reserved)
+  offsets = []
+  for q in range(STREAMS - (used[-1] if used else 0)):
+    if len(offsets) == n:
+      break
+    streams = {q + j for j in used}
+    if streams.isdisjoint(taken):
+      offsets.append(q)
+      taken |= streams
+  if len(offsets) < n:
+    raise ValueError(f"Stream insufficienti: al massimo {len(offsets)} repliche disgiunte, richieste {n}")
+  return offsets
+
+
 def selectStream(index):
   #/* ------------------------------------------------------------------
   #* Use this function to set the current random number generator
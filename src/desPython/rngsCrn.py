@@ -0,0 +1,83 @@
+#--------------------------------------------------------------------------
+# Common Random Numbers (CRN) con sottostream per entità.
+#
+# In modalità CRN ogni persona ha un proprio generatore di Lehmer per ogni
+# stream usato dai blocchi (arrivo, instradamento, servizio): il seme
+# iniziale dipende solo da (seed della replica, indice della replica, ID
+# della persona, stream) e lo stato viene salvato sulla persona stessa.
+# Così due modelli diversi (es. base e migliorativo) assegnano alla stessa
+# persona gli stessi tempi di interarrivo, le stesse decisioni di routing e
+# gli stessi tempi di servizio, indipendentemente dall'ordine degli eventi o
+# dal momento in cui il tempo di servizio viene estratto (inizio servizio nel
+# blocco base, ingresso in coda nel blocco a priorità).
+#
+# Uso nei blocchi, al posto di rngs.selectStream(self.stream):
+#
+#     rngsCrn.selectStream(self.stream, person)
+#     x = rvgs.Exponential(...)
+#
+# Con la modalità disattivata equivale a rngs.selectStream(stream).
+# Le estrazioni avvengono su ENTITY_STREAM, che nessun blocco usa.
+#--------------------------------------------------------------------------
+
+from desPython import rngs
+
+ENTITY_STREAM = 255
+_MASK64 = (1 << 64) - 1
+
+enabled = False
+_replica_key = 0
+_active = None       # (dizionario dei semi della persona, stream) attualmente caricato
+
+
+def _mix64(x):
+  # finalizzatore SplitMix64: disperde bene chiavi vicine (ID consecutivi)
+  x = (x + 0x9E3779B97F4A7C15) & _MASK64
+  x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+  x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+  return x ^ (x >> 31)
+
+
+def enable(seed_base, replica_id=0):
+  # Attiva la modalità CRN per una replica: stessa coppia (seed_base, replica_id)
+  # => stessi input per entità in qualunque modello.
+  global enabled, _replica_key, _active
+  enabled = True
+  _replica_key = _mix64((int(seed_base) << 20) ^ int(replica_id))
+  _active = None
+
+
+def disable():
+  global enabled, _active
+  _commit()
+  enabled = False
+  _active = None
+
+
+def entitySeed(entity_id, stream):
+  # Seme iniziale del sottostream (entità, stream), in [1, MODULUS - 1].
+  key = _mix64(_replica_key ^ _mix64((int(entity_id) << 8) | (stream % rngs.STREAMS)))
+  return key % (rngs.MODULUS - 1) + 1
+
+
+def _commit():
+  # Salva sulla persona lo stato del sottostream caricato per ultimo
+  if _active is not None:
+    seeds, stream = _active
+    seeds[stream] = rngs.seed[ENTITY_STREAM]
+
+
+def selectStream(stream, person=None):
+  # Seleziona lo stream da cui verranno le prossime estrazioni.
+  # In modalità CRN (e con una persona) carica il sottostream (person.ID, stream).
+  global _active
+  if not enabled or person is None:
+    rngs.selectStream(stream)
+    return
+  _commit()
+  seeds = person.rng_seeds
+  if stream not in seeds:
+    seeds[stream] = entitySeed(person.ID, stream)
+  rngs.selectStream(ENTITY_STREAM)
+  rngs.seed[ENTITY_STREAM] = seeds[stream]
+  _active = (seeds, stream)
@@ -0,0 +1,482 @@
+#--------------------------------------------------------------------------
+# Versione vettoriale (NumPy) delle funzioni di rvms.py.
+#
+# Ogni pdf/cdf/idf accetta scalari o array NumPy (con broadcasting fra
+# parametri e argomento) e restituisce un array con lo stesso risultato,
+# elemento per elemento, della corrispondente funzione scalare di rvms.py:
+# le iterazioni di InGamma, InBeta e Newton-Raphson sono le stesse, ma ogni
+# elemento si ferma quando converge (maschere booleane) invece di iterare
+# in un ciclo Python per ciascun valore.
+#
+# In aggiunta sono disponibili versioni memoizzate di idfStudent e
+# idfNormal (i quantili usati per gli intervalli di confidenza) e la
+# funzione studentTable che precalcola i t-critici per 1..n gradi di libertà.
+#
+# Discrete random variables:   Bernoulli, Equilikely, Binomial,
+#                              Geometric, Pascal, Poisson
+# Continuous random variables: Uniform, Exponential, Erlang, Normal,
+#                              Lognormal, Chisquare, Student
+#--------------------------------------------------------------------------
+
+from functools import lru_cache
+
+import numpy as np
+
+from desPython import rvms
+
+TINY = rvms.TINY
+SQRT2PI = rvms.SQRT2PI
+
+# Limite di sicurezza sulle iterazioni vettoriali (le versioni scalari
+# convergono in poche decine di passi).
+MAX_ITERATIONS = 10000
+
+
+def _asarrays(*args):
+    return np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in args])
+
+
+def _result(x):
+    # restituisce uno scalare float se l'input era scalare
+    return x[()] if x.ndim == 0 else x
+
+
+# ===================================================================
+# Funzioni speciali (LogGamma, LogBeta, LogChoose, InGamma, InBeta)
+# ===================================================================
+
+def LogGamma(a):
+    a = np.asarray(a, dtype=float)
+    s = (76.180091729406 / a
+         - 86.505320327112 / (a + 1.0)
+         + 24.014098222230 / (a + 2.0)
+         - 1.231739516140 / (a + 3.0)
+         + 0.001208580030 / (a + 4.0)
+         - 0.000005363820 / (a + 5.0))
+    total = 1.000000000178 + s
+    return _result((a - 0.5) * np.log(a + 4.5) - (a + 4.5) + np.log(SQRT2PI * total))
+
+
+def LogFactorial(n):
+    return LogGamma(np.asarray(n, dtype=float) + 1)
+
+
+def LogBeta(a, b):
+    a, b = _asarrays(a, b)
+    return _result(np.asarray(LogGamma(a) + LogGamma(b) - LogGamma(a + b)))
+
+
+def LogChoose(n, m):
+    n, m = _asarrays(n, m)
+    out = np.zeros(n.shape)
+    pos = m > 0
+    if pos.any():
+        out[pos] = -np.asarray(LogBeta(m[pos], n[pos] - m[pos] + 1)) - np.log(m[pos])
+    return _result(out)
+
+
+def InGamma(a, x):
+    # Vedi rvms.InGamma: serie (A & S 6.5.29) per x < a + 1,
+    # frazione continua (A & S 6.5.31) altrimenti.
+    a, x = _asarrays(a, x)
+    a = a.copy()
+    x = x.copy()
+    out = np.empty(a.shape)
+
+    factor = np.zeros(a.shape)
+    pos = x > 0.0
+    if pos.any():
+        factor[pos] = np.exp(-x[pos] + a[pos] * np.log(x[pos]) - np.asarray(LogGamma(a[pos])))
+
+    series = x < a + 1.0
+    if series.any():
+        aa, xx = a[series], x[series]
+        t = aa.copy()
+        term = 1.0 / aa
+        total = term.copy()
+        active = term >= TINY * total
+        it = 0
+        while active.any() and it < MAX_ITERATIONS:
+            t[active] += 1
+            term[active] = term[active] * (xx[active] / t[active])
+            total[active] += term[active]
+            active[active] = term[active] >= TINY * total[active]
+            it += 1
+        out[series] = factor[series] * total
+
+    frac = ~series
+    if frac.any():
+        aa, xx = a[frac], x[frac]
+        p0 = np.zeros(aa.shape)
+        p1 = np.ones(aa.shape)
+        q0 = np.ones(aa.shape)
+        q1 = xx.copy()
+        f = p1 / q1
+        active = np.ones(aa.shape, dtype=bool)
+        n = 0
+        while active.any() and n < MAX_ITERATIONS:
+            g = f.copy()
+            n += 1
+            if n % 2 > 0:
+                c0 = ((n + 1) / 2.0) - aa
+                c1 = 1.0
+            else:
+                c0 = np.full(aa.shape, n / 2.0)
+                c1 = xx
+            p2 = c1 * p1 + c0 * p0
+            q2 = c1 * q1 + c0 * q0
+            upd = active & (q2 != 0.0)
+            p0 = np.where(upd, p1 / np.where(q2 != 0.0, q2, 1.0), p0)
+            q0 = np.where(upd, q1 / np.where(q2 != 0.0, q2, 1.0), q0)
+            p1 = np.where(upd, p2 / np.where(q2 != 0.0, q2, 1.0), p1)
+            q1 = np.where(upd, 1.0, q1)
+            f = np.where(upd, p1, f)
+            active = active & ((np.fabs(f - g) >= TINY) | (q1 != 1.0))
+        out[frac] = 1.0 - factor[frac] * f
+
+    return _result(out)
+
+
+def InBeta(a, b, x):
+    # Vedi rvms.InBeta: frazione continua (A & S 26.5.8).
+    a, b, x = _asarrays(a, b, x)
+    swap = x > (a + 1.0) / (a + b + 1.0)
+    a, b = np.where(swap, b, a), np.where(swap, a, b)
+    x = np.where(swap, 1.0 - x, x)
+
+    factor = np.zeros(a.shape)
+    pos = x > 0
+    if pos.any():
+        factor[pos] = np.exp(a[pos] * np.log(x[pos]) + b[pos] * np.log(1.0 - x[pos])
+                             - np.asarray(LogBeta(a[pos], b[pos]))) / a[pos]
+
+    p0 = np.zeros(a.shape)
+    p1 = np.ones(a.shape)
+    q0 = np.ones(a.shape)
+    q1 = np.ones(a.shape)
+    f = p1 / q1
+    active = np.ones(a.shape, dtype=bool)
+    n = 0
+    while active.any() and n < MAX_ITERATIONS:
+        g = f.copy()
+        n += 1
+        if n % 2 > 0:
+            t = (n - 1) / 2.0
+            c = -(a + t) * (a + b + t) * x / ((a + n - 1.0) * (a + n))
+        else:
+            t = n / 2.0
+            c = t * (b - t) * x / ((a + n - 1.0) * (a + n))
+        p2 = p1 + c * p0
+        q2 = q1 + c * q0
+        upd = active & (q2 != 0.0)
+        safe = np.where(q2 != 0.0, q2, 1.0)
+        p0 = np.where(upd, p1 / safe, p0)
+        q0 = np.where(upd, q1 / safe, q0)
+        p1 = np.where(upd, p2 / safe, p1)
+        q1 = np.where(upd, 1.0, q1)
+        f = np.where(upd, p1, f)
+        active = active & ((np.fabs(f - g) >= TINY) | (q1 != 1.0))
+
+    return _result(np.where(swap, 1.0 - factor * f, factor * f))
+
+
+def _newton(u, x0, cdf, pdf, params=(), positive=False):
+    # Newton-Raphson elemento per elemento, con lo stesso criterio di arresto
+    # delle idf scalari: ogni elemento si ferma appena |x - t| < TINY.
+    # cdf e pdf ricevono i parametri (già indicizzati) seguiti da t.
+    arrays = _asarrays(u, x0, *params)
+    shape = arrays[0].shape
+    u, x = arrays[0].ravel(), arrays[1].ravel().copy()
+    params = [p.ravel() for p in arrays[2:]]
+    active = np.ones(x.shape, dtype=bool)
+    it = 0
+    while active.any() and it < MAX_ITERATIONS:
+        idx = np.flatnonzero(active)
+        t = x[idx]
+        args = [p[idx] for p in params]
+        new = t + (u[idx] - np.asarray(cdf(*args, t))) / np.asarray(pdf(*args, t))
+        if positive:
+            new = np.where(new <= 0.0, 0.5 * t, new)
+        x[idx] = new
+        active[idx] = np.fabs(new - t) >= TINY
+        it += 1
+    return _result(x.reshape(shape))
+
+
+# ===================================================================
+# Variabili discrete
+# ===================================================================
+
+def pdfBernoulli(p, x):
+    p, x = _asarrays(p, x)
+    return _result(np.where(x == 0, 1.0 - p, p))
+
+
+def cdfBernoulli(p, x):
+    p, x = _asarrays(p, x)
+    return _result(np.where(x == 0, 1.0 - p, 1.0))
+
+
+def idfBernoulli(p, u):
+    p, u = _asarrays(p, u)
+    return _result(np.where(u < 1.0 - p, 0, 1).astype(int))
+
+
+def pdfEquilikely(a, b, x):
+    a, b, x = _asarrays(a, b, x)
+    return _result(1.0 / (b - a + 1.0))
+
+
+def cdfEquilikely(a, b, x):
+    a, b, x = _asarrays(a, b, x)
+    return _result((x - a + 1.0) / (b - a + 1.0))
+
+
+def idfEquilikely(a, b, u):
+    a, b, u = _asarrays(a, b, u)
+    return _result((a + np.trunc(u * (b - a + 1))).astype(int))
+
+
+def pdfBinomial(n, p, x):
+    n, p, x = _asarrays(n, p, x)
+    s = np.asarray(LogChoose(n, x))
+    t = x * np.log(p) + (n - x) * np.log(1.0 - p)
+    return _result(np.exp(s + t))
+
+
+def cdfBinomial(n, p, x):
+    n, p, x = _asarrays(n, p, x)
+    out = np.ones(n.shape)
+    lt = x < n
+    if lt.any():
+        out[lt] = 1.0 - np.asarray(InBeta(x[lt] + 1, n[lt] - x[lt], p[lt]))
+    return _result(out)
+
+
+def pdfGeometric(p, x):
+    p, x = _asarrays(p, x)
+    return _result((1.0 - p) * np.exp(x * np.log(p)))
+
+
+def cdfGeometric(p, x):
+    p, x = _asarrays(p, x)
+    return _result(1.0 - np.exp((x + 1) * np.log(p)))
+
+
+def idfGeometric(p, u):
+    p, u = _asarrays(p, u)
+    return _result(np.trunc(np.log(1.0 - u) / np.log(p)).astype(int))
+
+
+def pdfPascal(n, p, x):
+    n, p, x = _asarrays(n, p, x)
+    s = np.asarray(LogChoose(n + x - 1, x))
+    t = x * np.log(p) + n * np.log(1.0 - p)
+    return _result(np.exp(s + t))
+
+
+def cdfPascal(n, p, x):
+    n, p, x = _asarrays(n, p, x)
+    return _result(1.0 - np.asarray(InBeta(x + 1, n, p)))
+
+
+def pdfPoisson(m, x):
+    m, x = _asarrays(m, x)
+    return _result(np.exp(-m + x * np.log(m) - np.asarray(LogFactorial(x))))
+
+
+def cdfPoisson(m, x):
+    m, x = _asarrays(m, x)
+    return _result(1.0 - np.asarray(InGamma(x + 1, m)))
+
+
+def _discrete_idf(scalar_idf, *args):
+    # Le idf discrete sono ricerche sequenziali partendo dalla media:
+    # si applica la versione scalare elemento per elemento.
+    arrays = _asarrays(*args)
+    out = np.empty(arrays[0].shape, dtype=int)
+    for idx in np.ndindex(out.shape):
+        out[idx] = scalar_idf(*[float(arr[idx]) for arr in arrays])
+    return _result(out)
+
+
+def idfBinomial(n, p, u):
+    return _discrete_idf(lambda n_, p_, u_: rvms.idfBinomial(int(n_), p_, u_), n, p, u)
+
+
+def idfPascal(n, p, u):
+    return _discrete_idf(lambda n_, p_, u_: rvms.idfPascal(int(n_), p_, u_), n, p, u)
+
+
+def idfPoisson(m, u):
+    return _discrete_idf(rvms.idfPoisson, m, u)
+
+
+# ===================================================================
+# Variabili continue
+# ===================================================================
+
+def pdfUniform(a, b, x):
+    a, b, x = _asarrays(a, b, x)
+    return _result(1.0 / (b - a))
+
+
+def cdfUniform(a, b, x):
+    a, b, x = _asarrays(a, b, x)
+    return _result((x - a) / (b - a))
+
+
+def idfUniform(a, b, u):
+    a, b, u = _asarrays(a, b, u)
+    return _result(a + (b - a) * u)
+
+
+def pdfExponential(m, x):
+    m, x = _asarrays(m, x)
+    return _result((1.0 / m) * np.exp(-x / m))
+
+
+def cdfExponential(m, x):
+    m, x = _asarrays(m, x)
+    return _result(1.0 - np.exp(-x / m))
+
+
+def idfExponential(m, u):
+    m, u = _asarrays(m, u)
+    return _result(-m * np.log(1.0 - u))
+
+
+def pdfErlang(n, b, x):
+    n, b, x = _asarrays(n, b, x)
+    t = (n - 1) * np.log(x / b) - (x / b) - np.log(b) - np.asarray(LogGamma(n))
+    return _result(np.exp(t))
+
+
+def cdfErlang(n, b, x):
+    n, b, x = _asarrays(n, b, x)
+    return InGamma(n, x / b)
+
+
+def idfErlang(n, b, u):
+    n, b, u = _asarrays(n, b, u)
+    return _newton(u, n * b, cdfErlang, pdfErlang, params=(n, b), positive=True)
+
+
+def pdfStandard(x):
+    x = np.asarray(x, dtype=float)
+    return _result(np.exp(-0.5 * x * x) / SQRT2PI)
+
+
+def cdfStandard(x):
+    x = np.asarray(x, dtype=float)
+    t = np.asarray(InGamma(np.full(x.shape, 0.5), 0.5 * x * x))
+    return _result(np.where(x < 0.0, 0.5 * (1.0 - t), 0.5 * (1.0 + t)))
+
+
+def idfStandard(u):
+    u = np.asarray(u, dtype=float)
+    return _newton(u, np.zeros(u.shape), cdfStandard, pdfStandard)
+
+
+def pdfNormal(m, s, x):
+    m, s, x = _asarrays(m, s, x)
+    return _result(np.asarray(pdfStandard((x - m) / s)) / s)
+
+
+def cdfNormal(m, s, x):
+    m, s, x = _asarrays(m, s, x)
+    return cdfStandard((x - m) / s)
+
+
+def idfNormal(m, s, u):
+    m, s, u = _asarrays(m, s, u)
+    return _result(m + s * np.asarray(idfStandard(u)))
+
+
+def pdfLognormal(a, b, x):
+    a, b, x = _asarrays(a, b, x)
+    t = (np.log(x) - a) / b
+    return _result(np.asarray(pdfStandard(t)) / (b * x))
+
+
+def cdfLognormal(a, b, x):
+    a, b, x = _asarrays(a, b, x)
+    return cdfStandard((np.log(x) - a) / b)
+
+
+def idfLognormal(a, b, u):
+    a, b, u = _asarrays(a, b, u)
+    return _result(np.exp(a + b * np.asarray(idfStandard(u))))
+
+
+def pdfChisquare(n, x):
+    n, x = _asarrays(n, x)
+    s = n / 2.0
+    t = (s - 1.0) * np.log(x / 2.0) - (x / 2.0) - np.log(2.0) - np.asarray(LogGamma(s))
+    return _result(np.exp(t))
+
+
+def cdfChisquare(n, x):
+    n, x = _asarrays(n, x)
+    return InGamma(n / 2.0, x / 2)
+
+
+def idfChisquare(n, u):
+    n, u = _asarrays(n, u)
+    return _newton(u, n, cdfChisquare, pdfChisquare, params=(n,), positive=True)
+
+
+def pdfStudent(n, x):
+    n, x = _asarrays(n, x)
+    s = -0.5 * (n + 1) * np.log(1.0 + ((x * x) / n))
+    t = -1 * np.asarray(LogBeta(np.full(n.shape, 0.5), n / 2.0))
+    return _result(np.exp(s + t) / np.sqrt(n))
+
+
+def cdfStudent(n, x):
+    n, x = _asarrays(n, x)
+    t = (x * x) / (n + x * x)
+    s = np.asarray(InBeta(np.full(n.shape, 0.5), n / 2.0, t))
+    return _result(np.where(x >= 0.0, 0.5 * (1.0 + s), 0.5 * (1.0 - s)))
+
+
+def idfStudent(n, u):
+    n, u = _asarrays(n, u)
+    return _newton(u, np.zeros(n.shape), cdfStudent, pdfStudent, params=(n,))
+
+
+# ===================================================================
+# Quantili memoizzati (intervalli di confidenza)
+# ===================================================================
+
+@lru_cache(maxsize=None)
+def idfStudentCached(n, u):
+    """idfStudent scalare di rvms.py con memoizzazione su (n, u)."""
+    return rvms.idfStudent(n, u)
+
+
+@lru_cache(maxsize=None)
+def idfStandardCached(u):
+    """idfStandard scalare di rvms.py con memoizzazione su u."""
+    return rvms.idfStandard(u)
+
+
+def idfNormalCached(m, s, u):
+    """idfNormal scalare: il quantile standard è memoizzato, m e s sono applicati dopo."""
+    return m + s * idfStandardCached(u)
+
+
+@lru_cache(maxsize=None)
+def _studentTable(u, n_max):
+    table = np.asarray(idfStudent(np.arange(1, n_max + 1), np.full(n_max, u)))
+    table.flags.writeable = False
+    return table
+
+
+def studentTable(u, n_max):
+    """
+    Restituisce un array (sola lettura) con i quantili idfStudent(n, u) per
+    n = 1..n_max: table[n - 1] è il t-critico con n gradi di libertà.
+    La tabella è calcolata una volta sola per coppia (u, n_max).
+    """
+    return _studentTable(float(u), int(n_max))
@@ -0,0 +1,214 @@
+"""
+Verifica di determinismo: engine di riferimento contro modalità ottimizzate.
+
+La stessa config e lo stesso seme vengono eseguiti con l'engine di riferimento e con una modalità
+ottimizzata (ogni run in un processo separato, a orizzonte finito). I daily_stats delle repliche
+vengono poi confrontati giorno per giorno e metrica per metrica, con una tolleranza sui float, e
+viene riportato il primo punto in cui divergono. Le righe metadata e completion (che contengono
+timestamp reali) sono ignorate.
+
+Le modalità sono registrate in MODES: una nuova ottimizzazione si aggiunge lì come funzione che
+restituisce gli argomenti aggiuntivi del costruttore dell'engine.
+
+Uso (dalla cartella src):
+    python determinism.py run --mode telemetry --model base --days 3 --replicas 2
+    python determinism.py compare finite_horizon_json_base ../altra_run --rel-tol 1e-9
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from simulation.verification import queueingNetwork as qn
+
+
+OUT_ROOT = Path(__file__).resolve().parent / "determinism_json"
+
+
+def _telemetry_mode():
+    from simulation.Telemetry import Telemetry
+    return {"telemetry": Telemetry(interval=0.1)}
+
+
+def _profiler_mode():
+    from simulation.Profiler import EventProfiler
+    return {"profiler": EventProfiler()}
+
+
+def _reuse_mode():
+    return {"reuse_blocks": True}
+
+
+# modalità che non devono cambiare i risultati: nome -> argomenti aggiuntivi dell'engine
+MODES = {
+    "reference": dict,
+    "telemetry": _telemetry_mode,
+    "profiler": _profiler_mode,
+    "reuse": _reuse_mode,
+}
+
+
+# ---------------------------------------------------------------------------
+# Confronto
+# ---------------------------------------------------------------------------
+
+def read_days(file_path) -> list[dict]:
+    """Righe daily_summary del file, nell'ordine in cui sono state scritte."""
+    days = []
+    with open(file_path, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if row.get("type") == "daily_summary":
+                days.append(row)
+    return days
+
+
+def flatten(value, prefix="") -> dict:
+    """{"a": {"b": [1, 2]}} -> {"a.b[0]": 1, "a.b[1]": 2}"""
+    if isinstance(value, dict):
+        out = {}
+        for key, v in value.items():
+            out.update(flatten(v, f"{prefix}.{key}" if prefix else str(key)))
+        return out
+    if isinstance(value, list):
+        out = {}
+        for i, v in enumerate(value):
+            out.update(flatten(v, f"{prefix}[{i}]"))
+        return out
+    return {prefix: value}
+
+
+def _equal(a, b, rel_tol, abs_tol) -> bool:
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+        if math.isnan(a) and math.isnan(b):
+            return True
+        return math.isclose(a, b, rel_tol=rel_tol, abs_tol=abs_tol)
+    return a == b
+
+
+def first_divergence(ref_file, fast_file, rel_tol=1e-9, abs_tol=0.0):
+    """
+    Confronta due file daily_stats; restituisce None se coincidono, altrimenti un dict con
+    giorno, metrica e i due valori del primo punto di divergenza.
+    """
+    ref_days, fast_days = read_days(ref_file), read_days(fast_file)
+    for ref_row, fast_row in zip(ref_days, fast_days):
+        if ref_row["date"] != fast_row["date"]:
+            return {"date": ref_row["date"], "metric": "date", "reference": ref_row["date"], "fast": fast_row["date"]}
+        ref_metrics = flatten({"summary": ref_row["summary"], "stats": ref_row["stats"]})
+        fast_metrics = flatten({"summary": fast_row["summary"], "stats": fast_row["stats"]})
+        for metric in sorted(ref_metrics.keys() | fast_metrics.keys()):
+            a, b = ref_metrics.get(metric), fast_metrics.get(metric)
+            if not _equal(a, b, rel_tol, abs_tol):
+                return {"date": ref_row["date"], "metric": metric, "reference": a, "fast": b}
+    if len(ref_days) != len(fast_days):
+        longer = ref_days if len(ref_days) > len(fast_days) else fast_days
+        return {"date": longer[min(len(ref_days), len(fast_days))]["date"], "metric": "giorni",
+                "reference": len(ref_days), "fast": len(fast_days)}
+    return None
+
+
+def compare_dirs(ref_dir, fast_dir, rel_tol=1e-9, abs_tol=0.0) -> dict:
+    """Confronta i daily_stats_rep*.json delle due cartelle; {file: divergenza o None}."""
+    ref_dir, fast_dir = Path(ref_dir), Path(fast_dir)
+    ref_files = sorted(p.name for p in ref_dir.glob("daily_stats*.json"))
+    if not ref_files:
+        raise FileNotFoundError(f"Nessun daily_stats in {ref_dir}")
+    results = {}
+    for name in ref_files:
+        if not (fast_dir / name).exists():
+            results[name] = {"date": None, "metric": "file", "reference": name, "fast": None}
+            continue
+        results[name] = first_divergence(ref_dir / name, fast_dir / name, rel_tol, abs_tol)
+    return results
+
+
+def report(results: dict) -> bool:
+    """Stampa l'esito per file; True se tutti i file coincidono."""
+    ok = True
+    for name, divergence in results.items():
+        if divergence is None:
+            print(f"✓ {name}: identico")
+            continue
+        ok = False
+        print(f"✗ {name}: prima divergenza il {divergence['date']} su {divergence['metric']}: "
+              f"riferimento={divergence['reference']} ottimizzato={divergence['fast']}")
+    return ok
+
+
+# ---------------------------------------------------------------------------
+# Esecuzione
+# ---------------------------------------------------------------------------
+
+def run_mode(mode: str, model: str, cfg: dict, replicas: int, seed: int, out_dir: str) -> str:
+    """Esegue le repliche a orizzonte finito con la modalità indicata (in un processo separato)."""
+    if model == "migliorativo":
+        from simulation.SimulationEngineMigliorativa import SimulationEngine
+    else:
+        from simulation.SimulationEngine import SimulationEngine
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(Path(out_dir) / "simulation.log", "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        engine = SimulationEngine(cfg=cfg, out_dir=out_dir, **MODES[mode]())
+        engine.run_finito_experiment(n_replicas=replicas, seed_base=seed)
+    shutil.rmtree(f"{out_dir}_arrivals", ignore_errors=True)
+    return out_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica di determinismo: riferimento contro modalità ottimizzate")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Esegue riferimento e modalità ottimizzata e confronta")
+    p_run.add_argument("--mode", choices=[m for m in MODES if m != "reference"], required=True)
+    p_run.add_argument("--reference", choices=list(MODES), default="reference")
+    p_run.add_argument("--config", default="input.json", help="Config in conf/")
+    p_run.add_argument("--model", choices=["base", "migliorativo"], default="base")
+    p_run.add_argument("--days", type=int, default=3, help="Orizzonte simulato in giorni")
+    p_run.add_argument("--replicas", type=int, default=1)
+    p_run.add_argument("--seed", type=int, default=3)
+
+    p_cmp = sub.add_parser("compare", help="Confronta due cartelle (o due file) di daily_stats")
+    p_cmp.add_argument("reference")
+    p_cmp.add_argument("fast")
+
+    for p in (p_run, p_cmp):
+        p.add_argument("--rel-tol", type=float, default=1e-9, help="Tolleranza relativa sui float")
+        p.add_argument("--abs-tol", type=float, default=0.0, help="Tolleranza assoluta sui float")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        ref, fast = Path(args.reference), Path(args.fast)
+        if ref.is_file():
+            results = {ref.name: first_divergence(ref, fast, args.rel_tol, args.abs_tol)}
+        else:
+            results = compare_dirs(ref, fast, args.rel_tol, args.abs_tol)
+    else:
+        cfg = qn.load_config(args.config)
+        start = datetime.fromisoformat(cfg["date"]["start"])
+        cfg["date"]["end"] = (start + timedelta(days=args.days - 1)).date().isoformat()
+        dirs = {mode: str(OUT_ROOT / f"{args.model}_{mode}") for mode in (args.reference, args.mode)}
+        print(f"▶ {args.model}: {args.reference} contro {args.mode} ({args.days} giorni, "
+              f"{args.replicas} repliche, seed {args.seed})...")
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(run_mode, mode, args.model, cfg, args.replicas, args.seed, out_dir)
+                       for mode, out_dir in dirs.items()]
+            for future in futures:
+                future.result()
+        results = compare_dirs(dirs[args.reference], dirs[args.mode], args.rel_tol, args.abs_tol)
+
+    if not report(results):
+        sys.exit(1)
+    print("\n✓ Nessuna divergenza")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Farm di repliche coordinatore / worker su TCP.
+
+Il coordinatore divide uno studio a orizzonte finito in job (config, replica_id, offset degli
+stream) e li assegna ai worker che si connettono. Ogni worker esegue la replica con l'engine
+scelto (run_finito_experiment con una replica) e restituisce il contenuto del suo daily_stats,
+che il coordinatore salva come <out>/daily_stats_rep{replica_id}.json: l'output ha lo stesso
+formato di run_finito_experiment e si analizza con gli stessi strumenti.
+Se un worker muore (connessione chiusa, errore o timeout) il suo job torna in coda, fino a
+--retries tentativi.
+
+Ogni replica ha un proprio plantSeeds: il seme è lo stato piantato da plantSeeds(seed) per lo
+stream q scelto da rngs.disjointOffsets sugli stream usati dal modello (rilevati dal coordinatore
+con una run di prova di un giorno), così repliche diverse non condividono estrazioni e il
+risultato non dipende da quale worker la esegue. Il worker verifica a fine run che nessuno stream
+abbia fatto STREAM_JUMP estrazioni o più (invadendo lo stream successivo) e altrimenti segnala errore.
+
+Protocollo: un messaggio JSON per riga.
+    worker -> coordinatore:  {"type": "ready"}
+    coordinatore -> worker:  {"type": "job", ...} oppure {"type": "stop"}
+    worker -> coordinatore:  {"type": "result", "job_id": ..., "daily_stats": "..."}
+                             oppure {"type": "error", "job_id": ..., "error": "..."}
+
+Uso (dalla cartella src):
+    python farm.py coordinator --replicas 16 --port 5555 --model base
+    python farm.py worker --host 10.0.0.1 --port 5555
+    python farm.py local --replicas 4 --workers 2 --days 7      # tutto su localhost
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import queue
+import shutil
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from batch.batchMeanPriority import replicationInterval
+from desPython import rngs, rngsCrn
+from sweep import replica_response_times
+from simulation.verification import queueingNetwork as qn
+
+
+OUT_ROOT = Path(__file__).resolve().parent / "farm_json"
+
+
+def used_streams(cfg: dict, model: str, seed: int) -> list[int]:
+    """Stream mossi da una run di prova di un giorno del modello (escluso quello dei sottostream CRN)."""
+    probe = dict(cfg, date=dict(cfg["date"], end=cfg["date"]["start"]))
+    rngs.plantSeeds(seed)
+    planted = rngs.getState()
+    _run_replica(model, probe, seed, "farm_probe_")
+    return sorted(set(rngs.streamUsage(planted)) - {rngsCrn.ENTITY_STREAM})
+
+
+def make_jobs(cfg: dict, model: str, replicas: int, seed: int) -> list[dict]:
+    streams = used_streams(cfg, model, seed)
+    offsets = rngs.disjointOffsets(streams, replicas, reserved={rngsCrn.ENTITY_STREAM})
+    rngs.plantSeeds(seed)
+    planted = rngs.getState()
+    return [{"type": "job", "job_id": rep, "replica_id": rep, "model": model, "cfg": cfg,
+             "seed": planted[q], "streams": streams} for rep, q in enumerate(offsets)]
+
+
+def _send(stream, message: dict):
+    stream.write((json.dumps(message) + "\n").encode("utf-8"))
+    stream.flush()
+
+
+def _recv(stream):
+    """Legge un messaggio; None se la connessione è stata chiusa."""
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+# ---------------------------------------------------------------------------
+# Coordinatore
+# ---------------------------------------------------------------------------
+
+class Coordinator:
+    """Distribuisce i job ai worker e raccoglie i daily_stats delle repliche."""
+
+    def __init__(self, jobs: list[dict], out_dir: Path, retries: int = 2, job_timeout: float = None):
+        """
+        Args:
+            jobs (list[dict]): Job da eseguire (vedi make_jobs).
+            out_dir (Path): Cartella in cui salvare daily_stats_rep{replica_id}.json.
+            retries (int): Tentativi aggiuntivi per job dopo la morte di un worker.
+            job_timeout (float): Secondi oltre i quali un worker silenzioso è considerato morto.
+        """
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.retries = retries
+        self.job_timeout = job_timeout
+        self.pending = queue.Queue()
+        for job in jobs:
+            self.pending.put(job)
+        self.remaining = len(jobs)
+        self.attempts = {job["job_id"]: 0 for job in jobs}
+        self.report = {}
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if not jobs:
+            self.done.set()
+
+    def next_job(self):
+        """Attende un job da assegnare; None quando lo studio è concluso."""
+        while not self.done.is_set():
+            try:
+                job = self.pending.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self.lock:
+                self.attempts[job["job_id"]] += 1
+            return job
+        return None
+
+    def _close_job(self, job: dict, status: dict):
+        self.report[job["job_id"]] = status
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.done.set()
+
+    def complete(self, job: dict, worker: str, daily_stats: str):
+        out_path = self.out_dir / f"daily_stats_rep{job['replica_id']}.json"
+        out_path.write_text(daily_stats, encoding="utf-8")
+        with self.lock:
+            self._close_job(job, {"replica_id": job["replica_id"], "worker": worker,
+                                  "attempts": self.attempts[job["job_id"]], "output": str(out_path)})
+        print(f"✓ Replica {job['replica_id']} completata da {worker}")
+
+    def fail(self, job: dict, worker: str, reason: str):
+        with self.lock:
+            if self.attempts[job["job_id"]] <= self.retries:
+                print(f"⚠️  Replica {job['replica_id']} persa da {worker} ({reason}): rimessa in coda")
+                self.pending.put(job)
+                return
+            self._close_job(job, {"replica_id": job["replica_id"], "worker": worker,
+                                  "attempts": self.attempts[job["job_id"]], "error": reason})
+        print(f"✗ Replica {job['replica_id']} fallita dopo {self.attempts[job['job_id']]} tentativi: {reason}")
+
+    def serve(self, host: str = "0.0.0.0", port: int = 5555, on_ready=None) -> dict:
+        """Accetta worker finché tutti i job sono conclusi; restituisce il report per job."""
+        server = _FarmServer((host, port), _WorkerHandler)
+        server.coordinator = self
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        address = server.server_address
+        print(f"▶ Coordinatore in ascolto su {address[0]}:{address[1]} ({self.remaining} job)")
+        if on_ready:
+            on_ready(address)
+        try:
+            self.done.wait()
+        finally:
+            server.shutdown()
+            server.server_close()
+        return self.report
+
+
+class _FarmServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    """Una connessione per worker: assegna un job alla volta finché il worker resta vivo."""
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        worker = f"{self.client_address[0]}:{self.client_address[1]}"
+        self.request.settimeout(coordinator.job_timeout)
+        while True:
+            try:
+                message = _recv(self.rfile)
+            except (OSError, ValueError):
+                return
+            if message is None or message.get("type") != "ready":
+                return
+            job = coordinator.next_job()
+            if job is None:
+                with contextlib.suppress(OSError):
+                    _send(self.wfile, {"type": "stop"})
+                return
+            try:
+                _send(self.wfile, job)
+                reply = _recv(self.rfile)
+            except (OSError, ValueError) as e:
+                coordinator.fail(job, worker, f"connessione persa: {e}")
+                return
+            if reply is None:
+                coordinator.fail(job, worker, "worker terminato")
+                return
+            if reply.get("type") == "result":
+                coordinator.complete(job, worker, reply["daily_stats"])
+            else:
+                coordinator.fail(job, worker, reply.get("error", "risposta non valida"))
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+def _run_replica(model: str, cfg: dict, seed: int, prefix: str) -> str:
+    """Esegue una replica in una cartella temporanea e restituisce il contenuto del suo daily_stats."""
+    if model == "migliorativo":
+        from simulation.SimulationEngineMigliorativa import SimulationEngine
+    else:
+        from simulation.SimulationEngine import SimulationEngine
+
+    tmp_dir = tempfile.mkdtemp(prefix=prefix)
+    # il fit della Pareto di InValutazione estrae dallo stream corrente: come in un processo nuovo,
+    # così il risultato non dipende dai job già eseguiti dal worker
+    rngs.selectStream(0)
+    try:
+        with open(Path(tmp_dir) / "simulation.log", "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+            engine = SimulationEngine(cfg=cfg, out_dir=tmp_dir)
+            engine.run_finito_experiment(n_replicas=1, seed_base=seed)
+        return (Path(tmp_dir) / "daily_stats_rep0.json").read_text(encoding="utf-8")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # run_finito_experiment scrive i tassi generati in <out_dir>_arrivals
+        shutil.rmtree(f"{tmp_dir}_arrivals", ignore_errors=True)
+
+
+def run_job(job: dict) -> str:
+    """Esegue la replica del job e verifica che sia rimasta nei propri stream."""
+    daily_stats = _run_replica(job["model"], job["cfg"], job["seed"], f"farm_rep{job['replica_id']}_")
+    end = rngs.getState()
+    rngs.plantSeeds(job["seed"])                # stati iniziali della replica
+    starts = rngs.getState()
+    rngs.putState(end)
+    usage = rngs.streamUsage(starts)
+    usage.pop(rngsCrn.ENTITY_STREAM, None)
+    for stream, draws in usage.items():
+        if stream not in job["streams"]:
+            raise RuntimeError(f"Stream {stream} non rilevato dalla run di prova: le repliche potrebbero condividere estrazioni")
+        if draws is None:
+            raise RuntimeError(f"Lo stream {stream} ha fatto almeno {rngs.STREAM_JUMP} estrazioni "
+                               "e si sovrappone allo stream successivo (accorciare l'orizzonte)")
+    return daily_stats
+
+
+def run_worker(host: str, port: int, connect_timeout: float = 30.0):
+    """Chiede job al coordinatore finché non riceve stop o la connessione viene chiusa."""
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+    with sock, sock.makefile("rwb") as stream:
+        while True:
+            _send(stream, {"type": "ready"})
+            message = _recv(stream)
+            if message is None or message["type"] == "stop":
+                return
+            print(f"▶ Replica {message['replica_id']} (seed {message['seed']})")
+            try:
+                reply = {"type": "result", "job_id": message["job_id"], "daily_stats": run_job(message)}
+            except Exception as e:
+                traceback.print_exc()
+                reply = {"type": "error", "job_id": message["job_id"], "error": f"{type(e).__name__}: {e}"}
+            _send(stream, reply)
+
+
+# ---------------------------------------------------------------------------
+# Riepilogo e CLI
+# ---------------------------------------------------------------------------
+
+def summarize(report: dict, out_dir: Path):
+    failed = [r["replica_id"] for r in report.values() if "error" in r]
+    values = [v for v in replica_response_times(out_dir) if v == v]
+    summary = {"completed": len(report) - len(failed), "failed": failed, "jobs": list(report.values())}
+    if len(values) >= 2:
+        mean, half_width, n = replicationInterval(values)
+        summary["response_time"] = {"mean": mean, "half_width": half_width, "replicas": n}
+        print(f"\n✓ Tempo medio di risposta: {mean:.2f} ± {half_width:.2f} s (95%, {n} repliche)")
+    if failed:
+        print(f"✗ Repliche fallite: {failed}")
+    with (out_dir / "farm.json").open("w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"📁 Risultati salvati in: {out_dir}")
+
+
+def _coordinator_args(parser):
+    parser.add_argument("--config", default="input.json", help="Config in conf/")
+    parser.add_argument("--model", choices=["base", "migliorativo"], default="base")
+    parser.add_argument("--days", type=int, default=None, help="Orizzonte simulato in giorni (default: date della config)")
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--retries", type=int, default=2, help="Tentativi aggiuntivi per replica")
+    parser.add_argument("--job-timeout", type=float, default=None, help="Secondi massimi per replica")
+    parser.add_argument("--out", default=None, help="Cartella dei risultati (default: farm_json/<modello>)")
+
+
+def _make_coordinator(args) -> Coordinator:
+    cfg = qn.load_config(args.config)
+    if args.days is not None:
+        start = datetime.fromisoformat(cfg["date"]["start"])
+        cfg["date"]["end"] = (start + timedelta(days=args.days - 1)).date().isoformat()
+    out_dir = Path(args.out) if args.out else OUT_ROOT / args.model
+    return Coordinator(make_jobs(cfg, args.model, args.replicas, args.seed), out_dir,
+                       args.retries, args.job_timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Farm di repliche coordinatore / worker su TCP")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_coord = sub.add_parser("coordinator", help="Distribuisce le repliche ai worker")
+    _coordinator_args(p_coord)
+    p_coord.add_argument("--host", default="0.0.0.0")
+    p_coord.add_argument("--port", type=int, default=5555)
+
+    p_worker = sub.add_parser("worker", help="Esegue le repliche assegnate dal coordinatore")
+    p_worker.add_argument("--host", default="127.0.0.1")
+    p_worker.add_argument("--port", type=int, default=5555)
+
+    p_local = sub.add_parser("local", help="Coordinatore e worker su localhost")
+    _coordinator_args(p_local)
+    p_local.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        run_worker(args.host, args.port)
+        return
+
+    coordinator = _make_coordinator(args)
+    if args.command == "coordinator":
+        report = coordinator.serve(args.host, args.port)
+    else:
+        workers = []
+
+        def start_workers(address):
+            for _ in range(max(1, args.workers)):
+                workers.append(subprocess.Popen(
+                    [sys.executable, str(Path(__file__).resolve()), "worker", "--host", "127.0.0.1",
+                     "--port", str(address[1])],
+                    stdout=subprocess.DEVNULL))
+
+        try:
+            report = coordinator.serve("127.0.0.1", 0, on_ready=start_workers)
+        finally:
+            for worker in workers:
+                with contextlib.suppress(subprocess.TimeoutExpired):
+                    worker.wait(timeout=10)
+                if worker.poll() is None:
+                    worker.kill()
+    summarize(report, coordinator.out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -40,4 +40,31 @@ class SimBlockInterface:
         Returns:
             list[Event]: Una lista di eventi generati dal completamento del servizio.
         """
-        pass
\ No newline at end of file
+        pass
+
+    def reset(self, replica_id=None):
+        """Riporta il blocco allo stato iniziale per una nuova replica, senza ricostruirlo.
+
+        Svuota le code (anche quelle per classe) e libera i serventi; collegamenti e parametri
+        già calcolati restano. I blocchi con altro stato lo azzerano ridefinendo il metodo.
+
+        Args:
+            replica_id: Identificativo della nuova replica (usato dai blocchi che scrivono su file).
+        """
+        if isinstance(getattr(self, "queue", None), dict):
+            for key in self.queue:
+                self.queue[key] = []
+                self.queueLenght[key] = 0
+        elif hasattr(self, "queue"):
+            self.queue = []
+            self.queueLenght = 0
+        if hasattr(self, "working"):
+            self.working = 0
+
+    def finalize(self):
+        """Chiude la replica: rilascia le persone ancora in coda (i blocchi con output lo scrivono)."""
+        if isinstance(getattr(self, "queue", None), dict):
+            for key in self.queue:
+                self.queue[key] = []
+        elif hasattr(self, "queue"):
+            self.queue = []
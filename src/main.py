@@ -3,6 +3,9 @@ from simulation.SimulationEngine import SimulationEngine as BaseEngine
 from simulation.SimulationEngineMigliorativa import SimulationEngine as MigliorativoEngine
 from simulation.verification.base.SimulationEngine import SimulationEngineExp as ExponentialEngine 
 from simulation.verification.SimulationEnginePriority import SimulationEngine as PriorityEngine
+from batch.batchMeanPriority import replicationInterval
+from sweep import replica_response_times
+from simulation.Telemetry import Telemetry
 
 
 
@@ -31,7 +34,6 @@ def menu_verifiche():
         engine.run_and_analyze(
             daily_rates=daily_rates,
             n=64*100,
-            batch_count=64,
             theo_json="theo_values.json"
         )
     elif scelta == "2":
@@ -41,7 +43,6 @@ def menu_verifiche():
         engine.run_and_analyze(
             daily_rates=daily_rates,
             n=64*100,
-            batch_count=64,
             theo_json="theo_valuesP.json"
         )
     elif scelta == "0":
@@ -55,6 +56,39 @@ def menu_verifiche():
     print("="*60 + "\n")
 
 
+def confronto_crn(n_replicas=4, seed_base=3):
+    """
+    Confronta modello base e migliorativo con i Common Random Numbers: a parità di replica
+    le persone hanno gli stessi arrivi, instradamenti e tempi di servizio nei due modelli,
+    quindi l'intervallo di confidenza è calcolato sulle differenze appaiate.
+    I due engine hanno calendari dei tassi diversi (picco 0.9 e 1.2): entrambi usano quello del
+    modello base, altrimenti la differenza misurerebbe il carico e non il modello.
+    """
+    base = BaseEngine(out_dir="finite_horizon_json_base_crn", crn=True)
+    migliorativo = MigliorativoEngine(out_dir="finite_horizon_json_migliorativo_crn", crn=True)
+    daily_rates = base.getArrivalsRates()
+
+    print(f"▶ Modello base ({n_replicas} repliche, CRN)...\n")
+    base.run_finito_experiment(n_replicas=n_replicas, seed_base=seed_base, daily_rates=daily_rates)
+    print(f"\n▶ Modello migliorativo ({n_replicas} repliche, CRN)...\n")
+    migliorativo.run_finito_experiment(n_replicas=n_replicas, seed_base=seed_base, daily_rates=daily_rates)
+
+    r_base = replica_response_times(base.out_dir)
+    r_migl = replica_response_times(migliorativo.out_dir)
+    diffs = [b - m for b, m in zip(r_base, r_migl)]
+
+    print("\n=== Tempo medio di risposta per replica (s) ===")
+    for rep, (b, m) in enumerate(zip(r_base, r_migl)):
+        print(f"  Replica {rep+1}: base = {b:.2f}   migliorativo = {m:.2f}   differenza = {b - m:.2f}")
+
+    try:
+        mean, w, _ = replicationInterval(diffs)
+    except ValueError as e:
+        print(f"⚠️  {e}")
+        return
+    print(f"\n✓ Differenza media (base - migliorativo): {mean:.2f} ± {w:.2f} s (95%)")
+
+
 def main():
     print("\n" + "="*60)
     print("   SISTEMA DI SIMULAZIONE - PMCSN PROJECT")
@@ -66,6 +100,7 @@ def main():
     print("├" + "─"*58 + "┤")
     print("│  1 - Simulazioni" + " "*41 + "│")
     print("│  2 - Verifiche modelli" + " "*35 + "│")
+    print("│  3 - Confronto base vs migliorativo (CRN, 4 repliche)" + " "*4 + "│")
     print("│  0 - Esci" + " "*48 + "│")
     print("└" + "─"*58 + "┘")
     
@@ -77,6 +112,13 @@ def main():
     elif scelta_menu == "2":
         menu_verifiche()
         return
+    elif scelta_menu == "3":
+        print("\n" + "="*60)
+        confronto_crn()
+        print("\n" + "="*60)
+        print("   CONFRONTO COMPLETATO")
+        print("="*60 + "\n")
+        return
     elif scelta_menu != "1":
         print("\n✗ Scelta non valida. Uscita.")
         sys.exit(1)
@@ -91,11 +133,14 @@ def main():
     
     scelta_modello = input("\n➤ Inserisci scelta: ").strip()
 
+    # avanzamento ogni 10 s su console e in telemetry.jsonl (al posto delle stampe giornaliere)
+    telemetry = Telemetry(interval=10, path="telemetry.jsonl", echo=True)
+
     if scelta_modello == "1":
-        engine = BaseEngine()
+        engine = BaseEngine(telemetry=telemetry)
         print("\n✓ Modello Base selezionato")
     elif scelta_modello == "2":
-        engine = MigliorativoEngine()
+        engine = MigliorativoEngine(telemetry=telemetry)
         print("\n✓ Modello Migliorativo selezionato")
     else:
         print("\n✗ Scelta non valida. Uscita.")
@@ -109,6 +154,9 @@ def main():
     print("│  2 - Orizzonte finito (1 replica)" + " "*24 + "│")
     print("│  3 - Orizzonte finito (tasso variabile, 16 repliche)" + " "*5 + "│")
     print("│  4 - Analisi transitoria (6 repliche)" + " "*20 + "│")
+    print("│  5 - Orizzonte finito (4 repliche antitetiche)" + " "*11 + "│")
+    print("│  6 - Riprendi analisi transitoria da checkpoint" + " "*10 + "│")
+    print("│  7 - Transitorio da warm-up condiviso (6 repliche)" + " "*7 + "│")
     print("└" + "─"*58 + "┘")
     
     scelta_simulazione = input("\n➤ Inserisci scelta: ").strip()
@@ -129,8 +177,27 @@ def main():
         engine.normale_with_replication(16, 123456789, daily_rates)
         
     elif scelta_simulazione == "4":
-        print("▶ Avvio analisi transitoria (6 repliche)...\n")
-        engine.run_transient_analysis(6, 123456789)
+        print("▶ Avvio analisi transitoria (6 repliche, checkpoint settimanale)...\n")
+        engine.run_transient_analysis(6, 123456789, checkpoint_every=7)
+
+    elif scelta_simulazione == "5":
+        print("▶ Avvio simulazione orizzonte finito (2 coppie antitetiche)...\n")
+        engine.antithetic = True
+        engine.run_finito_experiment(n_replicas=4)
+        mean, w, n = replicationInterval(replica_response_times(engine.out_dir), antithetic=True)
+        print(f"\n✓ Tempo medio di risposta: {mean:.2f} ± {w:.2f} s (95%, {n} coppie)")
+
+    elif scelta_simulazione == "6":
+        print("▶ Ripresa analisi transitoria dall'ultimo checkpoint...\n")
+        try:
+            engine.resume_transient_analysis()
+        except FileNotFoundError as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+
+    elif scelta_simulazione == "7":
+        print("▶ Avvio analisi transitoria (warm-up di 30 giorni, 6 repliche)...\n")
+        engine.run_forked_replicas(6, 123456789, warmup_days=30)
 
     else:
         print("✗ Scelta non valida. Uscita.")
@@ -15,6 +15,7 @@ class Person:
         self.request_refused=0
         self.login_failed=0
         self.ID = ID
+        self.rng_seeds = {}     # stato dei sottostream per entità (modalità CRN, vedi desPython/rngsCrn.py)
         
     def append_state(self, state):
         """Aggiunge un nuovo stato alla lista degli stati facendo una append."""
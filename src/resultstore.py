@@ -0,0 +1,88 @@
+"""
+Archivio indicizzato dei risultati di un esperimento (simulation/ResultStore.py).
+
+build raccoglie i daily_stats_rep{k}.json di una cartella (transient_analysis_json,
+finite_horizon_json_base, finite_horizon_json_migliorativo, farm_json/<modello>, ...) in un unico
+archivio con indice per (replica, data, centro); query legge solo i record richiesti.
+In alternativa l'engine scrive direttamente nell'archivio con result_store=<cartella>.
+
+Uso (dalla cartella src):
+    python resultstore.py build finite_horizon_json_base
+    python resultstore.py query finite_horizon_json_base/results_store --replicas 0,3 \\
+        --from 2025-05-10 --to 2025-05-12 --center InValutazione --metric queue_time
+"""
+
+import argparse
+import json
+import re
+import shutil
+import sys
+from pathlib import Path
+
+from simulation.ResultStore import ResultStore, ResultStoreWriter, replica_sort_key
+
+
+STORE_DIR = "results_store"
+
+_REPLICA_FILE = re.compile(r"daily_stats(?:_rep(.+))?\.json$")
+
+
+def build(results_dir, store_path=None) -> Path:
+    """Crea (sovrascrivendolo) l'archivio dei daily_stats di results_dir; restituisce la sua cartella."""
+    results_dir = Path(results_dir)
+    files = [(m.group(1) or "0", p) for p in results_dir.glob("daily_stats*.json")
+             if (m := _REPLICA_FILE.match(p.name))]
+    if not files:
+        raise FileNotFoundError(f"Nessun daily_stats in {results_dir}")
+    store_path = Path(store_path) if store_path else results_dir / STORE_DIR
+    shutil.rmtree(store_path, ignore_errors=True)
+
+    with ResultStoreWriter(store_path) as store:
+        for replica, file_path in sorted(files, key=lambda f: replica_sort_key(f[0])):
+            days = store.ingest(file_path, replica)
+            print(f"✓ {file_path.name}: replica {replica}, {days} giorni")
+    return store_path
+
+
+def _metric(record, metric):
+    """Valore della metrica nel record (per i centri con più code, dizionario coda -> valore)."""
+    return record.get(metric) if metric else record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivio indicizzato dei risultati per replica, data e centro")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Crea l'archivio dai daily_stats di una cartella")
+    p_build.add_argument("results_dir")
+    p_build.add_argument("--store", default=None, help=f"Cartella dell'archivio (default: <results_dir>/{STORE_DIR})")
+
+    p_query = sub.add_parser("query", help="Legge i record di repliche, date e centri indicati")
+    p_query.add_argument("store")
+    p_query.add_argument("--replicas", default=None, help="Repliche separate da virgole (default: tutte)")
+    p_query.add_argument("--from", dest="start", default=None, help="Prima data (ISO, inclusa)")
+    p_query.add_argument("--to", dest="end", default=None, help="Ultima data (ISO, inclusa)")
+    p_query.add_argument("--center", action="append", default=None, help="Centro (ripetibile; summary = entrati/usciti)")
+    p_query.add_argument("--metric", default=None, help="Solo questa metrica del record (es. queue_time)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        store_path = build(args.results_dir, args.store)
+        with ResultStore(store_path) as store:
+            print(f"\n📦 Archivio: {store_path} ({len(store.replicas())} repliche, "
+                  f"{len(store.dates())} giorni, centri: {', '.join(store.centers())})")
+        return
+
+    replicas = args.replicas.split(",") if args.replicas else None
+    with ResultStore(args.store) as store:
+        found = 0
+        for replica, date, center, record in store.query(replicas, args.start, args.end, args.center):
+            print(f"{replica}\t{date}\t{center}\t{json.dumps(_metric(record, args.metric))}")
+            found += 1
+    if not found:
+        print("Nessun record per i criteri indicati", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
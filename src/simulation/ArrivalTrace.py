@@ -0,0 +1,227 @@
+import bisect
+import csv
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from desPython import rngs
+
+
+"""
+Arrivi letti da una traccia invece che generati come processo di Poisson (StartBlock con "trace").
+
+Due tipi di traccia, nella sezione della config del blocco di partenza:
+
+    "trace": {"type": "timestamps", "file": "arrivi.csv"}
+        un arrivo per riga, timestamp ISO (prima colonna; un'eventuale intestazione viene saltata),
+        in ordine crescente. Alla prima lettura il file viene convertito in un array .npy di secondi
+        (arrivi.csv.npy, rigenerato se il CSV è più recente), poi letto con memory-mapping a blocchi:
+        la traccia non viene mai caricata per intero. Si può indicare direttamente un file .npy.
+
+    "trace": {"type": "daily_counts", "file": "dataset_arrivals.json", "profile": "uniform"}
+        conteggi giornalieri ({"days": [{"date": ..., "arrivals": ...}]}), distribuiti nel giorno
+        secondo il profilo: "uniform" oppure 24 pesi orari. Gli istanti di un giorno sono estratti
+        dallo stream del blocco di partenza all'inizio del giorno, quindi dipendono dal seme.
+
+I percorsi relativi sono risolti rispetto a conf/. Gli arrivi fuori dall'orizzonte simulato vengono
+ignorati. Le tracce sono serializzabili con pickle (checkpoint delle repliche).
+"""
+
+CONF_DIR = Path(__file__).resolve().parents[2] / "conf"
+
+_EPOCH = datetime(1970, 1, 1)       # i .npy contengono secondi da _EPOCH (datetime senza fuso)
+CHUNK = 65536                       # arrivi letti dal file per ogni blocco
+
+
+def open_trace(spec: dict, start_timestamp: datetime, end_timestamp: datetime, stream: int):
+    """Iteratore dei timestamp di arrivo in [start_timestamp, end_timestamp] per la specifica indicata."""
+    kind = spec.get("type")
+    if "file" not in spec:
+        raise ValueError(f"Traccia senza il campo 'file': {spec}")
+    path = Path(spec["file"])
+    if not path.is_absolute():
+        path = CONF_DIR / path
+    if not path.exists():
+        raise FileNotFoundError(f"File della traccia non trovato: {path}")
+
+    if kind == "timestamps":
+        return TimestampTrace(path, start_timestamp, end_timestamp)
+    if kind == "daily_counts":
+        return DailyCountsTrace(path, spec.get("profile", "uniform"), start_timestamp, end_timestamp, stream)
+    raise ValueError(f"Tipo di traccia non valido: {kind} (ammessi: timestamps, daily_counts)")
+
+
+# ---------------------------------------------------------------------------
+# Timestamp espliciti
+# ---------------------------------------------------------------------------
+
+def _parse_timestamp(field: str) -> float:
+    return (datetime.fromisoformat(field.strip()) - _EPOCH).total_seconds()
+
+
+def convert_timestamps(src: Path, dst: Path) -> int:
+    """
+    Converte un CSV di timestamp ISO in un .npy di secondi, in due passate in streaming
+    (conteggio, poi scrittura su un array mappato in memoria). Restituisce il numero di arrivi.
+    """
+    def rows():
+        with open(src, encoding="utf-8", newline="") as f:
+            for i, row in enumerate(csv.reader(f)):
+                if not row or not row[0].strip():
+                    continue
+                if i == 0:
+                    try:
+                        _parse_timestamp(row[0])
+                    except ValueError:
+                        continue            # intestazione
+                yield row[0]
+
+    n = sum(1 for _ in rows())
+    tmp = dst.with_name(dst.name + ".tmp")
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float64, shape=(n,))
+    previous = -np.inf
+    for i, field in enumerate(rows()):
+        try:
+            seconds = _parse_timestamp(field)
+        except ValueError:
+            raise ValueError(f"{src}: timestamp non valido alla riga {i + 1}: {field!r}")
+        if seconds < previous:
+            raise ValueError(f"{src}: timestamp non in ordine alla riga {i + 1}: {field}")
+        out[i] = previous = seconds
+    out.flush()
+    del out
+    os.replace(tmp, dst)
+    return n
+
+
+class TimestampTrace:
+    """Arrivi da un array .npy di secondi, letto a blocchi di CHUNK con memory-mapping."""
+
+    def __init__(self, path: Path, start_timestamp: datetime, end_timestamp: datetime):
+        path = Path(path)
+        if path.suffix != ".npy":
+            cached = path.with_name(path.name + ".npy")
+            if not cached.exists() or cached.stat().st_mtime < path.stat().st_mtime:
+                n = convert_timestamps(path, cached)
+                print(f"Traccia convertita: {n} arrivi in {cached}")
+            path = cached
+        self.path = path
+        self.end = (end_timestamp - _EPOCH).total_seconds()
+        self._open()
+        # primo arrivo dell'orizzonte: ricerca binaria sul file mappato
+        self.position = int(np.searchsorted(self.array, (start_timestamp - _EPOCH).total_seconds(), side="left"))
+        self.chunk = []
+        self.offset = 0
+
+    def _open(self):
+        self.array = np.load(self.path, mmap_mode="r")
+        if self.array.ndim != 1:
+            raise ValueError(f"La traccia {self.path} deve essere un array monodimensionale")
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["array"]              # la mappatura non si serializza: si riapre al ripristino
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> datetime:
+        if self.offset == len(self.chunk):
+            self.chunk = self.array[self.position:self.position + CHUNK].tolist()
+            self.position += len(self.chunk)
+            self.offset = 0
+            if not self.chunk:
+                raise StopIteration
+        seconds = self.chunk[self.offset]
+        if seconds > self.end:
+            self.chunk, self.offset = [], 0
+            self.position = len(self.array)
+            raise StopIteration
+        self.offset += 1
+        return _EPOCH + timedelta(seconds=seconds)
+
+
+# ---------------------------------------------------------------------------
+# Conteggi giornalieri
+# ---------------------------------------------------------------------------
+
+def _profile_cdf(profile) -> list[float]:
+    """Funzione di ripartizione (24 valori crescenti fino a 1) del profilo orario."""
+    if profile == "uniform":
+        weights = [1.0] * 24
+    elif isinstance(profile, list) and len(profile) == 24:
+        weights = [float(w) for w in profile]
+    else:
+        raise ValueError(f"Profilo giornaliero non valido: {profile} (ammessi: \"uniform\" o 24 pesi orari)")
+    if any(w < 0 for w in weights) or sum(weights) <= 0:
+        raise ValueError(f"I pesi del profilo devono essere non negativi e non tutti nulli: {weights}")
+    total, cdf, acc = sum(weights), [], 0.0
+    for w in weights:
+        acc += w
+        cdf.append(acc / total)
+    cdf[-1] = 1.0
+    return cdf
+
+
+class DailyCountsTrace:
+    """Arrivi dai conteggi giornalieri, distribuiti nel giorno secondo un profilo orario."""
+
+    def __init__(self, path: Path, profile, start_timestamp: datetime, end_timestamp: datetime, stream: int):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if "days" not in data:
+            raise ValueError(f"{path}: manca la lista 'days' dei conteggi giornalieri")
+        self.counts = sorted((datetime.fromisoformat(d["date"]), int(d["arrivals"])) for d in data["days"])
+        self.cdf = _profile_cdf(profile)
+        self.stream = stream
+        self.start = start_timestamp
+        self.end = end_timestamp
+        self.day = 0
+        self.times = []
+        self.offset = 0
+
+    def __iter__(self):
+        return self
+
+    def _fillDay(self, day: datetime, count: int):
+        """Istanti di arrivo (ordinati) del giorno: ora scelta col profilo, posizione uniforme nell'ora."""
+        rngs.selectStream(self.stream)
+        cdf = self.cdf
+        seconds = []
+        for _ in range(count):
+            u = rngs.random()
+            hour = bisect.bisect_right(cdf, u)
+            if hour > 23:
+                hour = 23
+            low = cdf[hour - 1] if hour else 0.0
+            fraction = (u - low) / (cdf[hour] - low)
+            seconds.append(3600.0 * (hour + fraction))
+        seconds.sort()
+        self.times = [day + timedelta(seconds=s) for s in seconds]
+        self.offset = 0
+
+    def __next__(self) -> datetime:
+        while self.offset == len(self.times):
+            if self.day == len(self.counts):
+                raise StopIteration
+            day, count = self.counts[self.day]
+            self.day += 1
+            if day + timedelta(days=1) <= self.start or day > self.end:
+                continue
+            self._fillDay(day, count)
+            # primo e ultimo giorno possono essere parziali
+            self.times = [t for t in self.times if self.start <= t <= self.end]
+        t = self.times[self.offset]
+        self.offset += 1
+        return t
@@ -0,0 +1,71 @@
+import gzip
+import os
+import pickle
+from pathlib import Path
+
+from desPython import rngs, rngsCrn
+
+
+"""
+Checkpoint delle run lunghe: lo stato del modello (coda degli eventi, blocchi con le loro
+code e contatori, persone in transito) viene serializzato insieme allo stato dei
+generatori (semi dei 256 stream, stream corrente, modalità antitetica e CRN).
+Gli EndBlock salvano solo l'offset del file di output: alla ripresa il file viene
+troncato a quell'offset e la scrittura riprende da lì, quindi una run ripresa produce
+gli stessi risultati di una run mai interrotta.
+"""
+
+
+def _rng_state() -> dict:
+    """Stato dei moduli di generazione dei numeri casuali."""
+    return {
+        "seeds": rngs.getState(),
+        "stream": rngs.stream,
+        "antithetic": rngs.antithetic,
+        "crn": (rngsCrn.enabled, rngsCrn._replica_key, rngsCrn._active),
+    }
+
+
+def _restore_rng_state(state: dict):
+    rngs.putState(state["seeds"])
+    rngs.stream = state["stream"]
+    rngs.setAntithetic(state["antithetic"])
+    rngsCrn.enabled, rngsCrn._replica_key, rngsCrn._active = state["crn"]
+
+
+def save_checkpoint(path, payload: dict) -> Path:
+    """
+    Salva payload (oggetti del modello e variabili dell'engine) e lo stato dei generatori.
+    La scrittura è atomica: il checkpoint precedente resta valido finché il nuovo non è completo.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    # un solo pickle: i riferimenti condivisi (persone in coda e negli eventi) restano tali
+    with gzip.open(tmp_path, "wb", compresslevel=1) as f:
+        pickle.dump({"rng": _rng_state(), "payload": payload}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_checkpoint(path) -> dict:
+    """Ripristina lo stato dei generatori e restituisce il payload salvato."""
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Checkpoint non trovato: {path}")
+    with gzip.open(path, "rb") as f:
+        data = pickle.load(f)
+    _restore_rng_state(data["rng"])
+    return data["payload"]
+
+
+def take_snapshot(payload: dict) -> bytes:
+    """Come save_checkpoint, ma in memoria: restituisce lo stato serializzato."""
+    return pickle.dumps({"rng": _rng_state(), "payload": payload}, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def restore_snapshot(snapshot: bytes) -> dict:
+    """Ripristina lo stato dei generatori da uno snapshot e ne restituisce una copia del payload."""
+    data = pickle.loads(snapshot)
+    _restore_rng_state(data["rng"])
+    return data["payload"]
@@ -3,6 +3,9 @@ class Event:
     In particolare, rappresenta un'azione che deve essere eseguita ad un certo timestamp.
     """
 
+    queued = False      # True mentre l'evento è nell'heap di una EventQueue
+    cancelled = False   # True dopo EventQueue.cancel: l'evento viene scartato al pop
+
     def __init__(self, timestamp, serviceName, person,eventType,handler=None):
         """Inizializza un nuovo evento.
         
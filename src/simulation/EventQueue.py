@@ -1,20 +1,68 @@
 import heapq
+
+from simulation.Event import Event
+
+
 class EventQueue:
     """Gestisce una coda di eventi per la simulazione.
     Utilizza un heap per mantenere gli eventi ordinati in base al timestamp.
     (heap inteso come struttura dati, non come memoria)
+
+    Gli eventi possono essere annullati o rischedulati con cancellazione pigra: l'evento annullato
+    resta nell'heap marcato come tale (O(1)) e viene scartato quando arriva in cima; se le voci
+    annullate superano la metà dell'heap, l'heap viene ricostruito senza di esse (O(n) ammortizzato).
+
+    Gli arrivi possono restare fuori dall'heap (setArrivals): sono una sequenza già ordinata per
+    timestamp, di cui la coda tiene solo il prossimo elemento e lo confronta con la cima dell'heap a
+    ogni pop. Il successivo viene chiesto alla sequenza solo alla prima operazione dopo il pop (quindi
+    dopo l'handler dell'arrivo estratto), così l'heap contiene solo i completamenti di servizio.
     """
+
+    COMPACT_MIN_SIZE = 1024      # sotto questa dimensione non conviene ricostruire l'heap
+
+    _stale = 0                   # eventi annullati ancora nell'heap (default per i checkpoint precedenti)
+    _arrivals = None             # sequenza ordinata degli arrivi (setArrivals), fuori dall'heap
+    _arrival = None              # prossimo arrivo della sequenza, se già estratto
+    _refill = False              # True se il prossimo arrivo va ancora chiesto alla sequenza
+
     def __init__(self):
         """Inizializza una nuova coda di eventi vuota."""
         self.events = []
+        self._stale = 0
+        self._arrivals = None
+        self._arrival = None
+        self._refill = False
+
+    def setArrivals(self, arrivals):
+        """Imposta la sequenza degli arrivi, unita all'heap al momento del pop.
+
+        Args:
+            arrivals: Iteratore di Event in ordine di timestamp (es. StartBlock.arrivalStream()).
+                Il primo elemento viene chiesto subito.
+        """
+        self._arrivals = iter(arrivals)
+        self._arrival = next(self._arrivals, None)
+        self._refill = False
+
+    def _nextArrival(self):
+        """Prossimo arrivo della sequenza (None se esaurita), chiedendolo se serve."""
+        if self._refill:
+            self._refill = False
+            self._arrival = next(self._arrivals, None)
+        return self._arrival
 
     def push(self, event):
         """Aggiunge un evento alla coda.
         
         Args:
             event (Event): L'evento da aggiungere alla coda.
+
+        Returns:
+            Event: L'evento stesso, da usare come riferimento per cancel e reschedule.
         """
+        event.queued = True
         heapq.heappush(self.events, event)
+        return event
 
     def pop(self):
         """Rimuove e restituisce l'evento con il timestamp più basso.
@@ -22,7 +70,33 @@ class EventQueue:
         Returns:    
             Event: L'evento con il timestamp più basso.
         """
-        return heapq.heappop(self.events)
+        if self._arrivals is not None:
+            arrival = self._nextArrival()
+            if arrival is not None:
+                self._dropCancelledTop()
+                # a parità di timestamp l'arrivo precede i completamenti
+                if not self.events or not self.events[0] < arrival:
+                    self._arrival = None
+                    self._refill = True
+                    return arrival
+        event = heapq.heappop(self.events)
+        while event.cancelled:
+            self._stale -= 1
+            event = heapq.heappop(self.events)
+        event.queued = False
+        return event
+
+    def peek(self):
+        """Restituisce, senza rimuoverlo, l'evento con il timestamp più basso.
+        
+        Returns:    
+            Event: L'evento con il timestamp più basso.
+        """
+        self._dropCancelledTop()
+        arrival = self._nextArrival() if self._arrivals is not None else None
+        if arrival is not None and (not self.events or not self.events[0] < arrival):
+            return arrival
+        return self.events[0]
 
     def is_empty(self):
         """Verifica se la coda di eventi è vuota.
@@ -30,4 +104,53 @@ class EventQueue:
         Returns:
             bool: True se la coda è vuota, False altrimenti.
         """
-        return len(self.events) == 0
\ No newline at end of file
+        if self._arrivals is not None and self._nextArrival() is not None:
+            return False
+        return len(self.events) == self._stale
+
+    def __len__(self):
+        """Numero di eventi in coda non annullati (compreso il prossimo arrivo, se già estratto)."""
+        return len(self.events) - self._stale + (self._arrival is not None)
+
+    def cancel(self, event) -> bool:
+        """Annulla un evento in coda in O(1): non verrà più restituito da pop e peek.
+
+        Args:
+            event (Event): L'evento restituito da push.
+
+        Returns:
+            bool: False se l'evento non era più in coda (già eseguito o già annullato).
+        """
+        if not event.queued or event.cancelled:
+            return False
+        event.cancelled = True
+        event.queued = False
+        self._stale += 1
+        if self._stale * 2 > len(self.events) and len(self.events) >= self.COMPACT_MIN_SIZE:
+            self.compact()
+        return True
+
+    def reschedule(self, event, timestamp):
+        """Sposta un evento in coda a un nuovo timestamp in O(log n).
+
+        Args:
+            event (Event): L'evento restituito da push.
+            timestamp (datetime): Il nuovo momento di esecuzione.
+
+        Returns:
+            Event: Il nuovo evento in coda (quello passato viene annullato).
+        """
+        if not self.cancel(event):
+            raise ValueError("Si possono rischedulare solo eventi ancora in coda")
+        return self.push(Event(timestamp, event.serviceName, event.person, event.eventType, event.handler))
+
+    def compact(self):
+        """Ricostruisce l'heap senza gli eventi annullati."""
+        self.events = [event for event in self.events if not event.cancelled]
+        heapq.heapify(self.events)
+        self._stale = 0
+
+    def _dropCancelledTop(self):
+        while self.events and self.events[0].cancelled:
+            heapq.heappop(self.events)
+            self._stale -= 1
\ No newline at end of file
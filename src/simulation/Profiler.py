@@ -0,0 +1,160 @@
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Optional
+
+from tabulate import tabulate
+
+
+"""
+Profiler opzionale del ciclo degli eventi.
+
+Per ogni coppia (blocco, handler) dell'evento (Event.serviceName e nome dell'handler) registra
+numero di eventi, tempo reale cumulato e, con allocations=True, memoria allocata al netto
+(tracemalloc attivo per tutta la replica: rallenta sensibilmente la run).
+Il tempo di un handler comprende tutto ciò che chiama: estrazioni dai generatori, inoltro al blocco
+successivo e, per l'ultimo centro, l'aggiornamento delle statistiche dell'EndBlock.
+Per scendere sotto il livello dell'handler si può catturare una finestra di tempo simulato con
+cProfile (funzioni più costose) o tracemalloc (righe che allocano di più).
+La tabella viene stampata alla fine di ogni replica.
+
+Uso:
+    profiler = EventProfiler(allocations=True, capture="cprofile", window=("2025-05-03", "2025-05-04"))
+    engine = SimulationEngine(profiler=profiler)
+"""
+
+
+class EventProfiler:
+    """Conteggi, tempo e allocazioni per (blocco, handler) nel ciclo degli eventi."""
+
+    CAPTURES = (None, "cprofile", "tracemalloc")
+
+    def __init__(self, allocations: bool = False, capture: Optional[str] = None, window: Optional[tuple] = None,
+                 top: int = 15):
+        """
+        Args:
+            allocations (bool): Se True misura i byte allocati al netto da ogni handler (tracemalloc).
+            capture (str): None, "cprofile" o "tracemalloc": cattura di dettaglio nella finestra.
+            window (tuple): (inizio, fine) in tempo simulato (datetime o stringhe ISO) della cattura;
+                            None per tutta la replica.
+            top (int): Righe mostrate per la cattura di dettaglio.
+        """
+        if capture not in self.CAPTURES:
+            raise ValueError(f"Cattura non valida: {capture} (ammesse: {self.CAPTURES})")
+        if window is not None:
+            window = tuple(datetime.fromisoformat(w) if isinstance(w, str) else w for w in window)
+            if len(window) != 2 or window[0] >= window[1]:
+                raise ValueError("La finestra deve essere una coppia (inizio, fine) con inizio < fine")
+        self.allocations = allocations
+        self.capture = capture
+        self.window = window
+        self.top = top
+        self.replica_id = None
+        self.stats = {}
+        self._active = False
+        self._done = False
+        self._cprofile = None
+        self._snapshot = None
+        self._report_capture = None
+
+    def attach(self, replica_id=None):
+        """Azzera le statistiche all'inizio di una replica."""
+        self.replica_id = replica_id
+        self.stats = {}
+        self._active = False
+        self._done = False
+        self._report_capture = None
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._t0 = time.perf_counter()
+        if self.capture and self.window is None:
+            self._start_capture()
+
+    def dispatch(self, event):
+        """Esegue l'handler dell'evento misurandolo; restituisce i nuovi eventi."""
+        if self.capture and self.window is not None and not self._done:
+            self._check_window(event.timestamp)
+        handler = event.handler
+        if self.allocations:
+            bytes0 = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        new_events = handler(event.person)
+        elapsed = time.perf_counter() - t0
+
+        key = (event.serviceName, getattr(handler, "__name__", str(handler)))
+        stat = self.stats.get(key)
+        if stat is None:
+            stat = self.stats[key] = [0, 0.0, 0]
+        stat[0] += 1
+        stat[1] += elapsed
+        if self.allocations:
+            stat[2] += tracemalloc.get_traced_memory()[0] - bytes0
+        return new_events
+
+    # --- cattura di dettaglio ---------------------------------------------------------
+
+    def _check_window(self, sim_time):
+        if not self._active and sim_time >= self.window[0]:
+            self._start_capture()
+        if self._active and sim_time >= self.window[1]:
+            self._stop_capture()
+
+    def _start_capture(self):
+        self._active = True
+        if self.capture == "cprofile":
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def _stop_capture(self):
+        if not self._active:
+            return
+        self._active = False
+        self._done = True
+        if self.capture == "cprofile":
+            self._cprofile.disable()
+            out = io.StringIO()
+            pstats.Stats(self._cprofile, stream=out).sort_stats("tottime").print_stats(self.top)
+            self._report_capture = out.getvalue()
+            self._cprofile = None
+        else:
+            diff = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+            if not self.allocations:
+                tracemalloc.stop()
+            self._snapshot = None
+            self._report_capture = "\n".join(str(line) for line in diff[:self.top])
+
+    # --- report -----------------------------------------------------------------------
+
+    def report(self):
+        """Stampa la tabella per (blocco, handler) ed eventualmente la cattura di dettaglio."""
+        self._stop_capture()
+        if self.allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        wall = time.perf_counter() - self._t0
+        total = sum(s[1] for s in self.stats.values()) or 1.0
+        rows = []
+        for (block, handler), (count, elapsed, nbytes) in sorted(self.stats.items(), key=lambda kv: -kv[1][1]):
+            row = [block, handler, count, f"{elapsed:.3f}", f"{1e6 * elapsed / count:.1f}",
+                   f"{100 * elapsed / total:.1f}"]
+            if self.allocations:
+                row += [f"{nbytes / 1024:.1f}", f"{nbytes / count:.0f}"]
+            rows.append(row)
+        headers = ["Blocco", "Handler", "Eventi", "Tempo (s)", "µs/evento", "% handler"]
+        if self.allocations:
+            headers += ["KB netti", "B netti/evento"]
+
+        label = f" - replica {self.replica_id}" if self.replica_id is not None else ""
+        print(f"\n=== Profilo del ciclo degli eventi{label} ===")
+        print(tabulate(rows, headers=headers, tablefmt="fancy_grid"))
+        print(f"⏱️  Handler: {total:.2f} s su {wall:.2f} s di ciclo "
+              f"({100 * total / wall if wall > 0 else 0:.0f}%, il resto è coda degli eventi e overhead)")
+        if self._report_capture:
+            print(f"\n--- Cattura {self.capture} ---")
+            print(self._report_capture)
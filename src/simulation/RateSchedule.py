@@ -0,0 +1,112 @@
+import csv
+import json
+from pathlib import Path
+
+
+"""
+Tassi di arrivo giornalieri costruiti una volta sola da conf/months_arrival_rate.json.
+
+Il calendario (un tasso per giorno dal 1 maggio al 30 settembre, con i fattori di stagionalità dei
+primi 15 giorni di maggio e degli ultimi 15 di settembre) è immutabile e viene tenuto in memoria
+per file e fattori: le repliche successive non rileggono il JSON. Il tasso di un giorno è una
+lettura d'indice (StartBlock calcola l'indice del giorno una volta per giorno simulato).
+L'esportazione CSV è opzionale.
+"""
+
+MONTHS_RATES_PATH = Path(__file__).resolve().parents[2] / "conf" / "months_arrival_rate.json"
+
+MONTH_DAYS = {
+    "may": 31,
+    "june": 30,
+    "july": 31,
+    "august": 31,
+    "september": 30
+}
+
+PEAK_DAYS = 15                  # giorni di picco all'inizio di maggio e alla fine di settembre
+
+_CACHE = {}                     # (file, mtime, dimensione, fattori) -> RateSchedule
+
+
+class RateSchedule:
+    """Tassi giornalieri immutabili, indicizzati dal giorno della simulazione (0 = primo giorno)."""
+
+    __slots__ = ("rates", "labels")
+
+    def __init__(self, rates, labels=None):
+        """
+        Args:
+            rates (list[float]): Tasso medio di arrivi al secondo per ciascun giorno.
+            labels (list[tuple]): Etichette (mese, giorno) per l'esportazione CSV (opzionali).
+        """
+        self.rates = tuple(float(r) for r in rates)
+        self.labels = tuple(labels) if labels is not None else tuple((None, i + 1) for i in range(len(self.rates)))
+
+    def rate(self, index: int) -> float:
+        """Tasso del giorno index, -1.0 se fuori dal calendario."""
+        if 0 <= index < len(self.rates):
+            return self.rates[index]
+        return -1.0
+
+    def __len__(self):
+        return len(self.rates)
+
+    def __getitem__(self, index):
+        return self.rates[index]
+
+    def __iter__(self):
+        return iter(self.rates)
+
+    def export_csv(self, out_path: Path) -> Path:
+        """Scrive i tassi in out_path (month, day, lambda_per_sec)."""
+        out_path = Path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        with out_path.open("w", encoding="utf-8", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["month", "day", "lambda_per_sec"])
+            for (month, day), rate in zip(self.labels, self.rates):
+                writer.writerow([month, day, rate])
+        return out_path
+
+
+def monthly_schedule(peak_factor: float, off_peak_factor: float = 0.8,
+                     path: Path = MONTHS_RATES_PATH) -> RateSchedule:
+    """
+    Calendario dei tassi giornalieri dai tassi mensili di path, costruito alla prima richiesta.
+
+    A maggio e settembre il tasso mensile è moltiplicato per peak_factor nei PEAK_DAYS giorni di
+    picco e per off_peak_factor negli altri; negli altri mesi resta invariato.
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"File non trovato: {path}")
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size, peak_factor, off_peak_factor)
+    schedule = _CACHE.get(key)
+    if schedule is not None:
+        return schedule
+
+    with path.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    data.pop("mean_arrival_rate", None)
+    data.pop("max_arrival_rate", None)
+
+    rates, labels = [], []
+    for month, rate in data.items():
+        if month not in MONTH_DAYS:
+            raise ValueError(f"Mese non valido in {path.name}: {month}")
+        days = MONTH_DAYS[month]
+        for i in range(days):
+            if month == "may" or month == "september":
+                if (month == "may" and i < PEAK_DAYS) or (month == "september" and i >= days - PEAK_DAYS):
+                    base = rate * peak_factor
+                else:
+                    base = rate * off_peak_factor
+            else:
+                base = rate
+            rates.append(base)
+            labels.append((month, i + 1))
+
+    schedule = RateSchedule(rates, labels)
+    _CACHE[key] = schedule
+    return schedule
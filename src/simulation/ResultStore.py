@@ -0,0 +1,158 @@
+import bisect
+import json
+import mmap
+import os
+from pathlib import Path
+
+
+"""
+Archivio dei risultati giornalieri di tutte le repliche di un esperimento, con accesso diretto.
+
+Una cartella con due file, entrambi solo in aggiunta:
+    data.jsonl   un record JSON per riga: le statistiche di un centro in un giorno di una replica
+                 (il centro "summary" contiene entrati/usciti del giorno)
+    index.tsv    replica, data, centro, offset e lunghezza in byte del record in data.jsonl
+
+ResultStoreWriter aggiunge record (o interi daily_stats_rep*.json con ingest); ResultStore legge
+l'indice e mappa data.jsonl in memoria: una richiesta per replica, intervallo di date e centri
+legge solo i byte dei record richiesti. Un archivio contiene un solo esperimento: l'engine lo
+svuota all'inizio di ogni esperimento (truncate=True), come resultstore.py build; se una chiave
+viene comunque aggiunta più volte vale l'ultima. Le repliche sono identificate come stringhe
+("0", "1", ...).
+"""
+
+DATA_FILE = "data.jsonl"
+INDEX_FILE = "index.tsv"
+SUMMARY = "summary"
+
+
+def replica_sort_key(replica: str):
+    """Ordine delle repliche: prima le numeriche in ordine numerico, poi le altre."""
+    return (not replica.isdigit(), int(replica) if replica.isdigit() else 0, replica)
+
+
+class ResultStoreWriter:
+    """Aggiunge record all'archivio (creandolo se non esiste; svuotandolo con truncate)."""
+
+    def __init__(self, path, truncate: bool = False):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        mode = "w" if truncate else "a"
+        self.data = open(self.path / DATA_FILE, mode + "b")
+        self.index = open(self.path / INDEX_FILE, mode, encoding="utf-8")
+        self.offset = self.data.tell()
+
+    def append(self, replica, date: str, center: str, record) -> None:
+        """Aggiunge il record di (replica, data, centro)."""
+        for field in (str(replica), date, center):
+            if "\t" in field or "\n" in field:
+                raise ValueError(f"Chiave non valida per l'archivio: {field!r}")
+        payload = json.dumps(record).encode("utf-8")
+        self.data.write(payload + b"\n")
+        # i dati arrivano sul file prima della voce dell'indice che li referenzia
+        self.data.flush()
+        self.index.write(f"{replica}\t{date}\t{center}\t{self.offset}\t{len(payload)}\n")
+        self.offset += len(payload) + 1
+
+    def append_day(self, replica, row: dict) -> None:
+        """Aggiunge una riga daily_summary: il riepilogo e un record per centro."""
+        self.append(replica, row["date"], SUMMARY, row["summary"])
+        for center, stats in row["stats"].items():
+            self.append(replica, row["date"], center, stats)
+
+    def ingest(self, file_path, replica) -> int:
+        """Aggiunge tutti i giorni di un file daily_stats; restituisce il numero di giorni."""
+        days = 0
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                if row.get("type") == "daily_summary":
+                    self.append_day(replica, row)
+                    days += 1
+        return days
+
+    def close(self):
+        # prima i dati, poi l'indice: una voce dell'indice non punta mai a byte non scritti
+        self.data.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ResultStore:
+    """Lettura dell'archivio con data.jsonl mappato in memoria."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        index_path, data_path = self.path / INDEX_FILE, self.path / DATA_FILE
+        if not index_path.exists() or not data_path.exists():
+            raise FileNotFoundError(f"Archivio dei risultati non trovato: {self.path}")
+
+        size = os.path.getsize(data_path)
+        self._file = open(data_path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        self._entries = {}          # replica -> data -> centro -> (offset, lunghezza)
+        with open(index_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    continue                # riga troncata da una scrittura interrotta
+                fields = line[:-1].split("\t")
+                if len(fields) != 5:
+                    continue
+                replica, date, center, offset, length = fields
+                offset, length = int(offset), int(length)
+                if offset + length > size:
+                    continue
+                self._entries.setdefault(replica, {}).setdefault(date, {})[center] = (offset, length)
+        self._dates = {replica: sorted(days) for replica, days in self._entries.items()}
+
+    def replicas(self) -> list[str]:
+        return sorted(self._entries, key=replica_sort_key)
+
+    def dates(self, replica=None) -> list[str]:
+        if replica is not None:
+            return list(self._dates.get(str(replica), []))
+        return sorted(set().union(*self._dates.values())) if self._dates else []
+
+    def centers(self) -> list[str]:
+        return sorted({c for days in self._entries.values() for centers in days.values() for c in centers})
+
+    def _read(self, offset: int, length: int) -> dict:
+        return json.loads(self._map[offset:offset + length])
+
+    def get(self, replica, date: str, center: str = SUMMARY) -> dict:
+        """Record di (replica, data, centro); KeyError se assente."""
+        offset, length = self._entries[str(replica)][date][center]
+        return self._read(offset, length)
+
+    def query(self, replicas=None, start: str = None, end: str = None, centers=None):
+        """
+        Record delle repliche indicate (tutte se None) con data in [start, end] (estremi ISO inclusi,
+        aperti se None) e centri indicati (tutti se None), come tuple (replica, data, centro, record).
+        """
+        replicas = self.replicas() if replicas is None else [str(r) for r in replicas]
+        for replica in replicas:
+            days = self._dates.get(replica, [])
+            lo = bisect.bisect_left(days, start) if start is not None else 0
+            hi = bisect.bisect_right(days, end) if end is not None else len(days)
+            for date in days[lo:hi]:
+                entries = self._entries[replica][date]
+                for center in (centers if centers is not None else entries):
+                    if center in entries:
+                        yield replica, date, center, self._read(*entries[center])
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,81 @@
+from desPython import rngs
+from desPython import rngsCrn
+
+
+"""
+Instradamento categorico con una sola estrazione (metodo alias di Walker, costruzione di Vose).
+
+Le probabilità di uscita di un blocco vengono trasformate una volta in una tabella di n colonne:
+la colonna i contiene la soglia prob[i] e l'alias alias[i]. Con u uniforme in (0, 1), i = int(u*n)
+sceglie la colonna e la parte frazionaria di u*n, anch'essa uniforme, decide tra i e alias[i].
+Così ogni decisione costa una sola estrazione e una lettura di tabella, indipendentemente dal
+numero di uscite (InValutazione ne usa fino a tre con getSuccess, getDropout e isPrecompilata).
+
+È opzionale (engine con alias_routing=True): le uscite hanno la stessa distribuzione del modello
+originale, ma i numeri estratti sono diversi, quindi i risultati non coincidono con quelli di riferimento.
+"""
+
+
+class AliasTable:
+    """Tabella alias per una distribuzione discreta su 0..n-1."""
+
+    def __init__(self, probabilities):
+        """
+        Args:
+            probabilities (list[float]): Probabilità delle uscite (non negative, somma 1 a meno di 1e-9).
+        """
+        n = len(probabilities)
+        if n == 0:
+            raise ValueError("Servono almeno una probabilità")
+        if any(p < 0 for p in probabilities):
+            raise ValueError(f"Probabilità negative: {probabilities}")
+        total = sum(probabilities)
+        if abs(total - 1.0) > 1e-9:
+            raise ValueError(f"Le probabilità devono sommare a 1 (somma = {total})")
+
+        scaled = [p * n / total for p in probabilities]
+        self.n = n
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # gli eventuali residui (errori di arrotondamento) restano colonne piene
+
+    def index(self, u: float) -> int:
+        """Uscita corrispondente all'uniforme u in (0, 1)."""
+        x = u * self.n
+        i = int(x)
+        if i >= self.n:
+            i = self.n - 1
+        return i if x - i < self.prob[i] else self.alias[i]
+
+
+class AliasRouter:
+    """Sceglie il blocco successivo tra targets con una sola estrazione dallo stream indicato."""
+
+    def __init__(self, probabilities, targets):
+        if len(probabilities) != len(targets):
+            raise ValueError(f"{len(probabilities)} probabilità per {len(targets)} blocchi")
+        if any(t is None for t in targets):
+            raise ValueError("Instradamento alias da attivare dopo il collegamento dei blocchi")
+        self.table = AliasTable(probabilities)
+        self.targets = tuple(targets)
+        # colonne della tabella già risolte nei blocchi: una sola lettura per decisione
+        self._columns = tuple((p, self.targets[i], self.targets[a])
+                              for i, (p, a) in enumerate(zip(self.table.prob, self.table.alias)))
+
+    def route(self, person, stream):
+        """Blocco successivo della persona (in modalità CRN l'estrazione viene dal suo sottostream)."""
+        rngsCrn.selectStream(stream, person)
+        x = rngs.random() * self.table.n
+        i = int(x)
+        if i == self.table.n:
+            i -= 1
+        p, target, alias = self._columns[i]
+        return target if x - i < p else alias
@@ -1,7 +1,13 @@
-from desPython import rngs, rvgs
-import csv, math
+from desPython import rngs, rvgs, rngsCrn
+import csv, math, os, sys, traceback
 from simulation.states.NormalState import NormalState
 from simulation.EventQueue import EventQueue
+from simulation.Telemetry import Telemetry
+from simulation.Profiler import EventProfiler
+from simulation.Topology import Topology, compile_topology
+from simulation.RateSchedule import RateSchedule, monthly_schedule
+from simulation.ResultStore import ResultStoreWriter
+from simulation.Checkpoint import save_checkpoint, load_checkpoint, take_snapshot, restore_snapshot
 from models.person import Person
 from datetime import datetime, timedelta
 
@@ -13,24 +19,129 @@ from simulation.blocks.CompilazionePrecompilata import CompilazionePrecompilata
 from simulation.blocks.InValutazione import InValutazione
 from simulation.blocks.InValutazioneCodaPrioritaNP import InValutazioneCodaPrioritaNP
 from simulation.blocks.EndBlockModificato import EndBlockModificato
+from simulation.blocks.InValutazionePrioritaMultiClasse import InValutazionePrioritaMultiClasse
+from simulation.blocks.InValutazioneSizeBased import InValutazioneSizeBased
 
 
 from pathlib import Path
 from typing import List, Optional, Tuple
 import json
 
-monthDays={
-    "may":31,
-    "june":30,
-    "july":31,
-    "august":31,
-    "september":30
-}
 
 class SimulationEngine:
     """Gestisce l'esecuzione della simulazione, orchestrando i blocchi di servizio e gli eventi."""
-    def __init__(self):    
+    def __init__(self, cfg: Optional[dict] = None, out_dir: str = "finite_horizon_json_migliorativo", crn: bool = False,
+                 antithetic: bool = False, telemetry: Optional[Telemetry] = None,
+                 profiler: Optional[EventProfiler] = None, reuse_blocks: bool = False,
+                 alias_routing: bool = False, export_rates: bool = False,
+                 result_store: Optional[str] = None):
+        """
+        Args:
+            cfg (dict): Configurazione dei blocchi già caricata; se None viene letta conf/input.json.
+            out_dir (str): Cartella (relativa a src) dei risultati dell'orizzonte finito.
+            crn (bool): Se True usa i Common Random Numbers: arrivi, instradamento e servizi di ogni
+                        persona vengono dai suoi sottostream (desPython/rngsCrn.py), quindi a parità di
+                        seed e replica i due modelli vedono gli stessi input.
+            antithetic (bool): Se True le repliche sono a coppie antitetiche: la replica 2k+1 riparte
+                        dallo stato dei generatori della replica 2k e usa 1-u al posto di ogni u.
+            telemetry (Telemetry): Se presente campiona l'avanzamento della run (simulation/Telemetry.py)
+                        al posto delle stampe giornaliere dello StartBlock.
+            profiler (EventProfiler): Se presente misura tempo e allocazioni per (blocco, handler)
+                        e stampa la tabella alla fine di ogni replica (simulation/Profiler.py).
+            reuse_blocks (bool): Se True i blocchi vengono costruiti alla prima replica e riportati
+                        allo stato iniziale con reset() nelle successive (niente nuovo fit della Pareto).
+            alias_routing (bool): Se True ogni decisione di instradamento usa una sola estrazione da una
+                        tabella alias (simulation/Routing.py): stessa distribuzione, numeri diversi.
+            export_rates (bool): Se True getArrivalsRates scrive anche il CSV dei tassi giornalieri
+                        (run_finito_experiment lo scrive sempre).
+            result_store (str): Se presente, cartella (relativa a src) dell'archivio indicizzato in cui
+                        vengono aggiunti i risultati di ogni replica (simulation/ResultStore.py). L'archivio
+                        viene svuotato all'inizio di ogni esperimento; resume_transient_analysis vi aggiunge
+                        le repliche mancanti.
+        """
         self.stream=66
+        self.cfg = cfg
+        self.out_dir = out_dir
+        self.crn = crn
+        self.antithetic = antithetic
+        self.telemetry = telemetry
+        self.profiler = profiler
+        self.reuse_blocks = reuse_blocks
+        self.alias_routing = alias_routing
+        self.export_rates = export_rates
+        self.result_store = result_store
+        self._storeFresh = False            # True fino alla prima replica archiviata dell'esperimento
+        self._topology = None
+        self._reusable = {}
+        self._pair_state = None
+        self._after_pair_state = None
+
+    def _beginStore(self):
+        """Inizio di un esperimento: la prima replica archiviata svuota l'archivio dei risultati."""
+        self._storeFresh = True
+
+    def _storeReplica(self, replica_id, output_file):
+        """Aggiunge all'archivio dei risultati (se configurato) il daily_stats della replica appena finalizzata."""
+        if self.result_store is None:
+            return
+        store_path = Path(__file__).resolve().parents[1] / self.result_store
+        with ResultStoreWriter(store_path, truncate=self._storeFresh) as store:
+            days = store.ingest(output_file, replica_id)
+        self._storeFresh = False
+        print(f"📦 Replica {replica_id}: {days} giorni aggiunti all'archivio {store_path}")
+
+    def _setupCrn(self, seed_base, replica_id):
+        """Attiva (o disattiva) i sottostream per entità della replica indicata."""
+        if self.crn:
+            # le repliche di una coppia antitetica condividono i sottostream per entità
+            rngsCrn.enable(seed_base, replica_id - replica_id % 2 if self.antithetic else replica_id)
+        else:
+            rngsCrn.disable()
+
+    def _beginReplicaRng(self, replica_id):
+        """In modalità antitetica salva (replica pari) o ripristina (replica dispari) lo stato dei generatori."""
+        if not self.antithetic:
+            return
+        if replica_id % 2 == 0:
+            self._pair_state = rngs.getState()
+        else:
+            self._after_pair_state = rngs.getState()
+            rngs.putState(self._pair_state)
+
+    def _attachTelemetry(self, blocks, replica_id=None):
+        """Collega la telemetria (se attiva) alla replica corrente; restituisce None se disattivata."""
+        if self.telemetry is not None:
+            self.telemetry.attach(self.event_queue, blocks, replica_id)
+        return self.telemetry
+
+    def _attachProfiler(self, replica_id=None):
+        """Azzera il profiler (se attivo) per la replica corrente; restituisce None se disattivato."""
+        if self.profiler is not None:
+            self.profiler.attach(replica_id)
+        return self.profiler
+
+    def _checkStreams(self, label, starts, used=None):
+        """
+        Estrazioni per stream dagli stati starts (rngs.getState) a quelli correnti. Fallisce se uno
+        stream ha fatto STREAM_JUMP estrazioni o più (ha invaso lo stream piantato successivo) o se
+        è stato usato uno stream fuori da used: in entrambi i casi le repliche condividerebbero numeri.
+        """
+        usage = rngs.streamUsage(starts)
+        usage.pop(rngsCrn.ENTITY_STREAM, None)      # sottostream CRN: semi propri per persona
+        for stream, draws in usage.items():
+            if used is not None and stream not in used:
+                raise RuntimeError(f"{label}: stream {stream} non usato nel warm-up, "
+                                   "le repliche potrebbero condividere estrazioni")
+            if draws is None:
+                raise RuntimeError(f"{label}: lo stream {stream} ha fatto almeno {rngs.STREAM_JUMP} estrazioni "
+                                   "e si sovrappone allo stream successivo (accorciare l'orizzonte)")
+        return usage
+
+    def _endReplicaRng(self, replica_id):
+        """Chiude la replica: la coppia successiva prosegue dallo stato raggiunto dalla replica pari."""
+        rngs.setAntithetic(False)
+        if self.antithetic and replica_id % 2 == 1:
+            rngs.putState(self._after_pair_state)
 
     def getArrivalsEqualsRates(self, months: list[str], days_per_month: list[int]) -> list[float]:
         if len(months) != len(days_per_month):
@@ -88,54 +199,253 @@ class SimulationEngine:
 
     
 
-    def run_transient_analysis(self, n_replicas, seed_base):
+    def run_transient_analysis(self, n_replicas, seed_base, checkpoint_every: Optional[int] = None,
+                               checkpoint_path: Optional[str] = None):
         """
         Metodo delle replicazioni per analisi del transitorio.
         Ogni replica avanza di un anno rispetto alla precedente.
+        Con checkpoint_every=N, ogni N giorni simulati (al cambio di giorno) viene salvato
+        un checkpoint in checkpoint_path (default checkpoints/<out_dir>_transient.ckpt, accanto a used_seeds.txt)
+        da cui resume_transient_analysis riprende la run.
         """
+        rngs.plantSeeds(seed_base)
+        self._beginStore()
+        run = {
+            "n_replicas": n_replicas,
+            "seed_base": seed_base,
+            "crn_seed": seed_base,
+            "checkpoint_every": checkpoint_every,
+            "checkpoint_path": checkpoint_path or self._defaultCheckpointPath("transient"),
+        }
+        for rep in range(n_replicas):
+            run["rep"] = rep
+            self._startTransientReplica(run)
+            self._finishTransientReplica(run)
+
+    def resume_transient_analysis(self, checkpoint_path: Optional[str] = None):
+        """Riprende una run di run_transient_analysis dall'ultimo checkpoint salvato."""
+        run = load_checkpoint(checkpoint_path or self._defaultCheckpointPath("transient"))
+        self.event_queue = run.pop("event_queue")
+        self._pair_state, self._after_pair_state = run.pop("pair_states")
+        print(f"\n--- Ripresa replica {run['rep']+1}/{run['n_replicas']} dal giorno {run['day']} ---")
+        self._finishTransientReplica(run)
+        for rep in range(run["rep"] + 1, run["n_replicas"]):
+            run["rep"] = rep
+            self._startTransientReplica(run)
+            self._finishTransientReplica(run)
+
+    def _defaultCheckpointPath(self, kind: str) -> Path:
+        return Path(__file__).resolve().parents[2] / "checkpoints" / f"{Path(self.out_dir).name}_{kind}.ckpt"
+
+    def _startTransientReplica(self, run: dict):
+        """Costruisce i blocchi della replica run["rep"] e genera il primo arrivo."""
+        rep = run["rep"]
+        print(f"\n--- Avvio replica {rep+1}/{run['n_replicas']} ---")
+
+        # Costruisci i blocchi con replica_id
+        self._beginReplicaRng(rep)
+        self.event_queue = EventQueue()
+        self._setupCrn(run["crn_seed"], rep)
+        startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock = self.buildBlocks(replica_id=rep)
+        endBlock.setStartBlock(startingBlock)
+
+        # Imposta i daily_rates costanti da arrival_rate.json
+        daily_rates = self.getArrivalsEqualsRates(["may", "june"], [7, 190])
+        startingBlock.setDailyRates(daily_rates)
 
+        # Non spostiamo l'intervallo temporale: ogni replica è una run indipendente
+        # che condivide la stessa finestra temporale (ma ha replica_id diverso).
+        start_date = startingBlock.start_timestamp
+        end_date = startingBlock.end_timestamp
+        endBlock.setWorkingStatus(True)
+        startingBlock.start_timestamp = start_date
+        startingBlock.current_time = start_date
+        startingBlock.end_timestamp = end_date
         seeds_path = Path(__file__).resolve().parents[2] / "used_seeds.txt"
+        with seeds_path.open("a", encoding="utf-8") as f:
+                        f.write(f"Replica {rep+1}: seed = {run['seed_base']}\n")
+        # Avvio simulazione (i blocchi sono costruiti con u: il fit della Pareto resta identico nella coppia)
+        rngs.setAntithetic(self.antithetic and rep % 2 == 1)
+        self.event_queue.setArrivals(startingBlock.arrivalStream())
+        run["blocks"] = (startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock)
+        run["day"] = start_date.date()
+
+    def _finishTransientReplica(self, run: dict):
+        """Esegue il ciclo degli eventi della replica corrente (con checkpoint) e la finalizza."""
+        rep = run["rep"]
+        startingBlock, endBlock = run["blocks"][0], run["blocks"][-1]
+        checkpoint_every = run["checkpoint_every"]
+        start_day = startingBlock.start_timestamp.date()
+
+        profiler = self._attachProfiler(rep)
+        telemetry = self._attachTelemetry(run["blocks"], rep)
+        while not self.event_queue.is_empty():
+            if checkpoint_every:
+                # checkpoint al cambio di giorno, prima del primo evento del nuovo giorno
+                day = self.event_queue.peek().timestamp.date()
+                if day != run["day"]:
+                    run["day"] = day
+                    if (day - start_day).days % checkpoint_every == 0:
+                        save_checkpoint(run["checkpoint_path"], dict(run, event_queue=self.event_queue,
+                                        pair_states=(self._pair_state, self._after_pair_state)))
+            event = self.event_queue.pop()
+            event = event[0] if isinstance(event, list) else event
+            if telemetry:
+                telemetry.tick(event.timestamp)
+            if event.handler:
+                new_events = profiler.dispatch(event) if profiler else event.handler(event.person)
+                if new_events:
+                    for new_event in new_events:
+                        self.event_queue.push(new_event)
+
+        # Finalizza la replica
+        if telemetry:
+            telemetry.finish()
+        endBlock.finalize()
+        self._storeReplica(rep, endBlock.output_file)
+        if profiler:
+            profiler.report()
+        self._endReplicaRng(rep)
+        print(f"✅ Replica {rep+1} completata! ({startingBlock.start_timestamp.date()} → {startingBlock.end_timestamp.date()})")
+
+        run["seed_base"] = rngs.getSeed() #just to print it on file
+    
+    def run_forked_replicas(self, n_replicas, seed_base, warmup_days, use_fork: Optional[bool] = None,
+                            max_parallel: Optional[int] = None):
+        """
+        Repliche del transitorio generate da un unico warm-up.
+        I primi warmup_days giorni vengono simulati una sola volta (l'EndBlock non li registra);
+        dallo stato raggiunto partono n_replicas repliche, ognuna con un proprio file
+        daily_stats_rep{rep}.json e un proprio plantSeeds: il seme è lo stato piantato dello stream q
+        scelto da rngs.disjointOffsets, così gli stream di repliche diverse (e del warm-up) sono
+        disgiunti. Ogni run verifica poi di non aver superato STREAM_JUMP estrazioni per stream
+        (altrimenti invaderebbe lo stream successivo) e fallisce se succede.
+        Con use_fork (default: se os.fork è disponibile) ogni replica è un processo figlio che eredita
+        lo stato in copy-on-write (al più max_parallel alla volta); altrimenti lo stato viene serializzato
+        in memoria e ripristinato prima di ogni replica.
+        In modalità antitetica le repliche 2k e 2k+1 usano lo stesso seme, la seconda con 1-u.
+        """
+        if n_replicas < 1:
+            raise ValueError("Serve almeno una replica")
         rngs.plantSeeds(seed_base)
+        planted = rngs.getState()
+        self._beginStore()
+        self.event_queue = EventQueue()
+        # chiave CRN del warm-up distinta da quelle delle repliche (0..n_replicas-1)
+        self._setupCrn(seed_base, n_replicas + n_replicas % 2)
+        blocks = self.buildBlocks(replica_id="warmup")
+        startingBlock, endBlock = blocks[0], blocks[-1]
+        startingBlock.setDailyRates(self.getArrivalsEqualsRates(["may", "june"], [7, 190]))
+
+        warmup_end = startingBlock.start_timestamp + timedelta(days=warmup_days)
+        if warmup_end >= startingBlock.end_timestamp:
+            raise ValueError("Il warm-up deve terminare prima della fine dell'orizzonte simulato")
+
+        print(f"\n--- Warm-up condiviso: {startingBlock.start_timestamp.date()} → {warmup_end.date()} ---")
+        endBlock.setWorkingStatus(False)
+        self.event_queue.setArrivals(startingBlock.arrivalStream())
+        while not self.event_queue.is_empty() and self.event_queue.peek().timestamp < warmup_end:
+            event = self.event_queue.pop()
+            event = event[0] if isinstance(event, list) else event
+            if event.handler:
+                new_events = event.handler(event.person)
+                if new_events:
+                    for new_event in new_events:
+                        self.event_queue.push(new_event)
 
+        # stream usati dal modello (quelli mossi dal warm-up): ogni replica ne riceve una copia disgiunta
+        used = set(self._checkStreams("Warm-up", planted))
+        groups = (n_replicas + 1) // 2 if self.antithetic else n_replicas
+        offsets = rngs.disjointOffsets(used, groups, reserved=used | {rngsCrn.ENTITY_STREAM})
+        seeds = [planted[offsets[rep // 2 if self.antithetic else rep]] for rep in range(n_replicas)]
+        if use_fork is None:
+            use_fork = hasattr(os, "fork")
+        if use_fork:
+            self._runForks(blocks, n_replicas, seed_base, seeds, used, max_parallel or os.cpu_count() or 1)
+        else:
+            snapshot = take_snapshot({"event_queue": self.event_queue, "blocks": blocks})
+            for rep in range(n_replicas):
+                state = restore_snapshot(snapshot)
+                self.event_queue = state["event_queue"]
+                self._runForkedReplica(state["blocks"], rep, n_replicas, seed_base, seeds[rep], used)
+            rngsCrn.disable()
+
+        # archiviate dal processo principale, in ordine: i figli non scrivono in parallelo sull'archivio
         for rep in range(n_replicas):
-            print(f"\n--- Avvio replica {rep+1}/{n_replicas} ---")
+            self._storeReplica(rep, Path(endBlock.output_file).with_name(f"daily_stats_rep{rep}.json"))
 
-            # Costruisci i blocchi con replica_id
-            self.event_queue = EventQueue()
-            startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock = self.buildBlocks(replica_id=rep)
-            endBlock.setStartBlock(startingBlock)
+        # il file del warm-up contiene solo l'intestazione
+        endBlock.file_handle.close()
+        Path(endBlock.output_file).unlink(missing_ok=True)
 
-            # Imposta i daily_rates costanti da arrival_rate.json
-            daily_rates = self.getArrivalsEqualsRates(["may", "june"], [7, 190])
-            startingBlock.setDailyRates(daily_rates)
+    def _runForks(self, blocks, n_replicas, seed_base, seeds, used, max_parallel):
+        """Una replica per processo figlio, tutte a partire dallo stato corrente del modello."""
+        blocks[-1].file_handle.flush()
+        running, failed = [], []
 
-            # Non spostiamo l'intervallo temporale: ogni replica è una run indipendente
-            # che condivide la stessa finestra temporale (ma ha replica_id diverso).
-            start_date = startingBlock.start_timestamp
-            end_date = startingBlock.end_timestamp
-            endBlock.setWorkingStatus(True)
-            startingBlock.start_timestamp = start_date
-            startingBlock.current_time = start_date
-            startingBlock.end_timestamp = end_date
-            with seeds_path.open("a", encoding="utf-8") as f:
-                            f.write(f"Replica {rep+1}: seed = {seed_base}\n")
-            # Avvio simulazione
-            self.event_queue.push(startingBlock.start())
-            while not self.event_queue.is_empty():
-                event = self.event_queue.pop()
-                event = event[0] if isinstance(event, list) else event
-                if event.handler:
-                    new_events = event.handler(event.person)
-                    if new_events:
-                        for new_event in new_events:
-                            self.event_queue.push(new_event)
+        def wait_first():
+            pid, rep = running.pop(0)
+            _, status = os.waitpid(pid, 0)
+            if os.waitstatus_to_exitcode(status) != 0:
+                failed.append(rep + 1)
+
+        for rep in range(n_replicas):
+            if len(running) >= max_parallel:
+                wait_first()
+            sys.stdout.flush()
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    self._runForkedReplica(blocks, rep, n_replicas, seed_base, seeds[rep], used)
+                except BaseException:
+                    traceback.print_exc()
+                    code = 1
+                finally:
+                    sys.stdout.flush()
+                    os._exit(code)
+            running.append((pid, rep))
+        while running:
+            wait_first()
+        if failed:
+            raise RuntimeError(f"Repliche fallite: {failed}")
+
+    def _runForkedReplica(self, blocks, rep, n_replicas, seed_base, replica_seed, used):
+        """Prosegue dallo stato del warm-up con i generatori piantati da replica_seed."""
+        startingBlock, endBlock = blocks[0], blocks[-1]
+        print(f"\n--- Avvio replica {rep+1}/{n_replicas} dal warm-up (seed {replica_seed}) ---")
+        rngs.plantSeeds(replica_seed)
+        starts = rngs.getState()
+        self._setupCrn(seed_base, rep)
+        rngs.setAntithetic(self.antithetic and rep % 2 == 1)
+        endBlock.redirectOutput(rep)
+        endBlock.setWorkingStatus(True)
+        seeds_path = Path(__file__).resolve().parents[2] / "used_seeds.txt"
+        with seeds_path.open("a", encoding="utf-8") as f:
+            f.write(f"Replica {rep+1}: seed = {replica_seed} (warm-up condiviso con seed {seed_base})\n")
+
+        profiler = self._attachProfiler(rep)
+        telemetry = self._attachTelemetry(blocks, rep)
+        while not self.event_queue.is_empty():
+            event = self.event_queue.pop()
+            event = event[0] if isinstance(event, list) else event
+            if telemetry:
+                telemetry.tick(event.timestamp)
+            if event.handler:
+                new_events = profiler.dispatch(event) if profiler else event.handler(event.person)
+                if new_events:
+                    for new_event in new_events:
+                        self.event_queue.push(new_event)
+
+        if telemetry:
+            telemetry.finish()
+        endBlock.finalize()
+        if profiler:
+            profiler.report()
+        rngs.setAntithetic(False)
+        self._checkStreams(f"Replica {rep+1}", starts, used)
+        print(f"✅ Replica {rep+1} completata! ({startingBlock.start_timestamp.date()} → {startingBlock.end_timestamp.date()})")
 
-            # Finalizza la replica
-            endBlock.finalize()
-            print(f"✅ Replica {rep+1} completata! ({start_date.date()} → {end_date.date()})")
-            
-            seed_base = rngs.getSeed() #just to print it on file
-    
     # --- Generatore a bassa varianza, vedi se va bene alex visto che hai detto di usare una normale---
     #def generateLambda_low_var(self, base_rate: float, cv: float = 0.20, clip: tuple[float,float] | None = (0.6, 1.6)) -> float:
     def generateLambda_low_var(
@@ -173,51 +483,22 @@ class SimulationEngine:
         return rvgs.Erlang(k, 1.0)
     
 
-    def getArrivalsRates(self,n_replicas=1,folder="defualt_arrivals") -> list[float]:
-        """Legge dal dataset i valori di arrivo giornalieri."""
-        conf_path = Path(__file__).resolve().parents[2] / "conf" / "months_arrival_rate.json"#{'may_arrival_rate': 0.2736, 'june_arrival_rate': 0.1412, 'july_arrival_rate': 0.1367, 'august_arrival_rate': 0.0912, 'september_arrival_rate': 0.2825, 'mean_arrival_rate': 0.1622935, 'max_arrival_rate': 0.4447835215743806}
-        if not conf_path.exists():
-            raise FileNotFoundError(f"File non trovato: {conf_path}")
-
-        with conf_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        print(data)
-        data.pop("mean_arrival_rate", None)
-        data.pop("max_arrival_rate", None)
-        rates = []
-
-        # Prepare output CSV path and ensure directory exists
-        out_path = Path(__file__).resolve().parents[2] / folder / f"generated_daily_arrivals{n_replicas}.csv"
-        out_path.parent.mkdir(parents=True, exist_ok=True)
-
-        # Write generated daily rates to CSV (overwrite each run)
-        with out_path.open("w", encoding="utf-8", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["month", "day", "lambda_per_sec"])
-
-            # dentro getArrivalsRates(), nel loop per i giorni del mese:
-            for month, rate in data.items():
-                for i in range(monthDays[month]):
-                    # stagionalità come prima
-                    if month == "may" or month == "september":
-                        if (month == "may" and i < 15) or (month == "september" and i >= monthDays[month]-15):
-                            base = rate * 1.2    # primi 15 di maggio ↑, ultimi 15 di settembre ↑
-                        else:
-                            base = rate * 0.8
-                    else:
-                        base = rate
-                    
-                    generated = base
-                    rates.append(generated)
-                    writer.writerow([month, i + 1, generated])
+    def getArrivalsRates(self,n_replicas=1,folder="defualt_arrivals", export_csv=None) -> RateSchedule:
+        """Tassi di arrivo giornalieri dal dataset (calendario costruito una volta, simulation/RateSchedule.py).
 
-        print(f"Wrote {len(rates)} generated daily rates to: {out_path}")
+        Con export_csv (default: export_rates dell'engine) il calendario viene scritto anche in
+        <folder>/generated_daily_arrivals<n_replicas>.csv.
+        """
+        rates = monthly_schedule(peak_factor=1.2)
+        if export_csv if export_csv is not None else self.export_rates:
+            self._exportRates(rates, n_replicas, folder)
         return rates
-            
-
-
 
-        return [float(day["lambda_per_sec"]) for day in days if "lambda_per_sec" in day]
+    def _exportRates(self, rates, n_replicas, folder):
+        if not isinstance(rates, RateSchedule):
+            rates = RateSchedule(rates)
+        out_path = rates.export_csv(Path(__file__).resolve().parents[2] / folder / f"generated_daily_arrivals{n_replicas}.csv")
+        print(f"Wrote {len(rates)} generated daily rates to: {out_path}")
 
     # Registry dei blocchi
     _REGISTRY = {
@@ -228,6 +509,13 @@ class SimulationEngine:
         "compilazionePrecompilata": (CompilazionePrecompilata,   ("name", "serversNumber", "mean", "variance", "successProbability")),
         "invioDiretto":             (InvioDiretto,               ("name", "mean", "variance")),
         "start":                    (StartBlock,                 ("name", "precompilataProbability")),
+        "startTrace":               (StartBlock,                 ("name", "precompilataProbability", "trace")),
+        "inValutazionePriorita":    (InValutazionePrioritaMultiClasse, ("name", "dipendenti","pratichePerDipendente", "mean", "variance",
+                                                                    "successProbability", "dropoutProbability", "precompilataProbability",
+                                                                    "classes", "preemptive")),
+        "inValutazioneSizeBased":   (InValutazioneSizeBased,     ("name", "dipendenti","pratichePerDipendente", "mean", "variance",
+                                                                    "successProbability", "dropoutProbability", "precompilataProbability",
+                                                                    "policy", "srptThreshold")),
     }
 
     _FIELD_ALIASES = {}
@@ -239,9 +527,12 @@ class SimulationEngine:
                 data[target] = data.pop(alias)
         return data
 
-    def _instantiate(self, cfg: dict, key: str):
+    def _resolve(self, cfg: dict, key: str):
+        """Classe e argomenti del costruttore per la sezione key della config (validati)."""
         if key not in cfg:
             raise KeyError(f"Manca la sezione '{key}' nel JSON.")
+        if key not in self._REGISTRY:
+            raise ValueError(f"Blocco '{key}' non registrato (blocchi disponibili: {list(self._REGISTRY)})")
 
         cls, fields = self._REGISTRY[key]
         data = self._normalize_section(cfg[key], key)
@@ -250,126 +541,64 @@ class SimulationEngine:
         if missing:
             raise ValueError(f"Nella sezione '{key}' mancano i campi: {missing}")
 
-        return cls(**{f: data[f] for f in fields})
+        return cls, {f: data[f] for f in fields}
 
-    def buildBlocks(self, replica_id):
-        #self.getArrivalsRates()
-        cfg_path = Path(__file__).resolve().parents[2] / "conf" / "input.json"
-        if not cfg_path.exists():
-            raise FileNotFoundError(f"Config non trovata: {cfg_path}")
-
-        with cfg_path.open("r", encoding="utf-8") as f:
-            cfg = json.load(f)
-
-        # Passa il replica_id qui
-        endBlock                 = EndBlock(replica_id=replica_id)
-        inValutazione            = self._instantiate(cfg, "inValutazione")
-        compilazionePrecompilata = self._instantiate(cfg, "compilazionePrecompilata")
-        invioDiretto             = self._instantiate(cfg, "invioDiretto")
-        startingBlock             = self._instantiate(cfg, "start")
-        start_date = datetime.fromisoformat(cfg["date"]["start"])
-        end_date   = datetime.fromisoformat(cfg["date"]["end"]) + timedelta(days=1)
-
-        startingBlock.setStartAndEndTimestamps(
-            start_timestamp=datetime.combine(start_date, datetime.min.time()),
-            end_timestamp=datetime.combine(end_date, datetime.min.time())
-        )
-
-        # Wiring
-        startingBlock.setCompilazione(compilazionePrecompilata)    
-        startingBlock.setInvioDiretto(invioDiretto)
-                
-
-        compilazionePrecompilata.setNextBlock(inValutazione)
-        invioDiretto.setNextBlock(inValutazione)
-        inValutazione.setEnd(endBlock)
-        inValutazione.setInvioDiretto(invioDiretto)
-        inValutazione.setCompilazione(compilazionePrecompilata)
-        endBlock.setStartBlock(startingBlock)
-
-        return startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock
+    def _instantiate(self, cfg: dict, key: str):
+        cls, kwargs = self._resolve(cfg, key)
+        return cls(**kwargs)
 
-    def buildBlocksFinito(self, replica_id):
-        #self.getArrivalsRates()
+    def _load_config(self) -> dict:
+        """Restituisce la configurazione dell'engine, leggendo conf/input.json se non è stata fornita."""
+        if self.cfg is not None:
+            return self.cfg
         cfg_path = Path(__file__).resolve().parents[2] / "conf" / "input.json"
         if not cfg_path.exists():
             raise FileNotFoundError(f"Config non trovata: {cfg_path}")
 
         with cfg_path.open("r", encoding="utf-8") as f:
-            cfg = json.load(f)
-
-        # Passa il replica_id qui
-        endBlock                 = EndBlockModificato(replica_id=replica_id,outDirString="finite_horizon_json_migliorativo")
-        # Use InValutazioneCodaPrioritaNP with inValutazione config
-        inValutazione            = InValutazioneCodaPrioritaNP(**{f: cfg["inValutazione"][f] for f in ("name", "dipendenti","pratichePerDipendente", "mean", "variance", "successProbability", "dropoutProbability", "precompilataProbability")})
-        compilazionePrecompilata = self._instantiate(cfg, "compilazionePrecompilata")
-        invioDiretto             = self._instantiate(cfg, "invioDiretto")
-        startingBlock             = self._instantiate(cfg, "start")
-        start_date = datetime.fromisoformat(cfg["date"]["start"])
-        end_date   = datetime.fromisoformat(cfg["date"]["end"]) + timedelta(days=1)
-
-        startingBlock.setStartAndEndTimestamps(
-            start_timestamp=datetime.combine(start_date, datetime.min.time()),
-            end_timestamp=datetime.combine(end_date, datetime.min.time())
-        )
-
-        # Wiring
-        startingBlock.setCompilazione(compilazionePrecompilata)    
-        startingBlock.setInvioDiretto(invioDiretto)
-                
-
-        compilazionePrecompilata.setNextBlock(inValutazione)
-        invioDiretto.setNextBlock(inValutazione)
-        inValutazione.setEnd(endBlock)
-        inValutazione.setInvioDiretto(invioDiretto)
-        inValutazione.setCompilazione(compilazionePrecompilata)
-        endBlock.setStartBlock(startingBlock)
+            return json.load(f)
 
-        return startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock
+    def _compiledTopology(self) -> Topology:
+        """Topologia della config (sezione "topology"), compilata alla prima replica e poi riusata."""
+        if self._topology is None:
+            self._topology = compile_topology(self._load_config(), self._resolve)
+        return self._topology
 
+    def _wireReplica(self, kind, replica_id, makeEnd):
+        """
+        Blocchi di una replica dalla topologia compilata, collegati al blocco finale makeEnd(replica_id).
+        Con reuse_blocks quelli già costruiti per lo stesso tipo di run vengono riusati con reset().
+        """
+        topology = self._compiledTopology()
+        blocks = self._reusable.get(kind) if self.reuse_blocks else None
+        if blocks is None:
+            blocks = topology.instantiate(makeEnd(replica_id), self.alias_routing)
+            if self.reuse_blocks:
+                self._reusable[kind] = blocks
+        else:
+            topology.reset(blocks, replica_id)
+        return topology.select(blocks, ("start", "compilazionePrecompilata", "invioDiretto", "inValutazione", "end"))
 
-    def buildBlocksSingleIteration(self):
-        cfg_path = Path(__file__).resolve().parents[2] / "conf" / "input.json"
-        if not cfg_path.exists():
-            raise FileNotFoundError(f"Config non trovata: {cfg_path}")
+    def buildBlocks(self, replica_id):
+        return self._wireReplica("base", replica_id, lambda rid: EndBlock(replica_id=rid))
 
-        with cfg_path.open("r", encoding="utf-8") as f:
-            cfg = json.load(f)
-
-        # Passa il replica_id qui
-        endBlock                 = EndBlock()
-        inValutazione            = self._instantiate(cfg, "inValutazione")
-        compilazionePrecompilata = self._instantiate(cfg, "compilazionePrecompilata")
-        invioDiretto             = self._instantiate(cfg, "invioDiretto")
-        startingBlock             = self._instantiate(cfg, "start")
-
-
-        start_date = datetime.fromisoformat(cfg["date"]["start"])
-        end_date   = datetime.fromisoformat(cfg["date"]["end"]) + timedelta(days=1)
-
-        startingBlock.setStartAndEndTimestamps(
-            start_timestamp=datetime.combine(start_date, datetime.min.time()),
-            end_timestamp=datetime.combine(end_date, datetime.min.time())
-        )
-
-        # Wiring
-        startingBlock.setCompilazione(compilazionePrecompilata)
-        startingBlock.setInvioDiretto(invioDiretto)
-        compilazionePrecompilata.setNextBlock(inValutazione)
-        invioDiretto.setNextBlock(inValutazione)
-        inValutazione.setInvioDiretto(invioDiretto)
-        inValutazione.setCompilazione(compilazionePrecompilata)
-        inValutazione.setEnd(endBlock)
-        endBlock.setStartBlock(startingBlock)
+    def buildBlocksFinito(self, replica_id):
+        return self._wireReplica("finito", replica_id,
+                                 lambda rid: EndBlockModificato(replica_id=rid, outDirString=self.out_dir))
 
-        return startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock
+    def buildBlocksSingleIteration(self):
+        return self._wireReplica("single", None, lambda rid: EndBlock())
 
 
 
-    def run_finito_experiment(self, n_replicas=4, seed_base=3):
+    def run_finito_experiment(self, n_replicas=4, seed_base=3, daily_rates=None):
+        """Repliche a orizzonte finito; con daily_rates tutte usano quei tassi al posto di getArrivalsRates
+        (es. lo stesso calendario per i due modelli nel confronto con i CRN)."""
 
         seeds_path = Path(__file__).resolve().parents[2] / "used_seeds.txt"
         rngs.plantSeeds(seed_base)
+        self._beginStore()
+        crn_seed = seed_base
 
         for rep in range(n_replicas):
             print(f"\n--- Avvio replica {rep+1}/{n_replicas} ---")
@@ -379,11 +608,18 @@ class SimulationEngine:
                 f.write(f"Replica {rep+1}: seed = {seed_base}\n")
 
             # Costruisci i blocchi con replica_id
+            self._beginReplicaRng(rep)
             self.event_queue = EventQueue()
+            self._setupCrn(crn_seed, rep)
             startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock = self.buildBlocksFinito(replica_id=rep)
             #endBlock.setStartBlock(startingBlock)
-            daily_rates = self.getArrivalsRates(rep,"finite_horizon_json_migliorativo_arrivals")
-            startingBlock.setDailyRates(daily_rates)
+            # il CSV dei tassi usati serve a graph_finite.py --control-variate
+            if daily_rates is None:
+                rates = self.getArrivalsRates(rep,f"{self.out_dir}_arrivals", export_csv=True)
+            else:
+                rates = daily_rates
+                self._exportRates(rates, rep, f"{self.out_dir}_arrivals")
+            startingBlock.setDailyRates(rates)
 
             # Sposta l'intervallo temporale di 1 anno per ogni replica
             shift_years = 0
@@ -394,19 +630,30 @@ class SimulationEngine:
             startingBlock.current_time    = start_date
             startingBlock.end_timestamp   = end_date
 
-            # Avvio simulazione
-            self.event_queue.push(startingBlock.start())
+            # Avvio simulazione (i blocchi sono costruiti con u: il fit della Pareto resta identico nella coppia)
+            rngs.setAntithetic(self.antithetic and rep % 2 == 1)
+            profiler = self._attachProfiler(rep)
+            telemetry = self._attachTelemetry((startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock), rep)
+            self.event_queue.setArrivals(startingBlock.arrivalStream())
             while not self.event_queue.is_empty():
                 event = self.event_queue.pop()
                 event = event[0] if isinstance(event, list) else event
+                if telemetry:
+                    telemetry.tick(event.timestamp)
                 if event.handler:
-                    new_events = event.handler(event.person)
+                    new_events = profiler.dispatch(event) if profiler else event.handler(event.person)
                     if new_events:
                         for new_event in new_events:
                             self.event_queue.push(new_event)
 
             # Finalizza la replica
+            if telemetry:
+                telemetry.finish()
             endBlock.finalize()
+            self._storeReplica(rep, endBlock.output_file)
+            if profiler:
+                profiler.report()
+            self._endReplicaRng(rep)
             print(f"✅ Replica {rep+1} completata! ({start_date.date()} → {end_date.date()})")
 
             seed_base = rngs.getSeed() #just for printing
@@ -417,6 +664,7 @@ class SimulationEngine:
         """Avvia la simulazione con i tassi di arrivo specificati."""
         rngs.plantSeeds(2)
         self.event_queue = EventQueue()
+        self._setupCrn(2, 0)
 
         startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock = self.buildBlocksSingleIteration()
 
@@ -425,18 +673,26 @@ class SimulationEngine:
 
         startingBlock.setDailyRates(daily_rates)
         #startingBlock.setNextBlock(instradamento)
-        self.event_queue.push(startingBlock.start())
+        profiler = self._attachProfiler()
+        telemetry = self._attachTelemetry((startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock))
+        self.event_queue.setArrivals(startingBlock.arrivalStream())
 
         while not self.event_queue.is_empty():
             event = self.event_queue.pop()
             event = event[0] if isinstance(event, list) else event
+            if telemetry:
+                telemetry.tick(event.timestamp)
             if event.handler:
-                new_events = event.handler(event.person)
+                new_events = profiler.dispatch(event) if profiler else event.handler(event.person)
                 if new_events:
                     for new_event in new_events:
                         self.event_queue.push(new_event)
 
+        if telemetry:
+            telemetry.finish()
         endBlock.finalize()
+        if profiler:
+            profiler.report()
 
     def normale_with_constant_replication(self, daily_rates):
         """Avvia la simulazione con i tassi di arrivo specificati."""
@@ -450,7 +706,7 @@ class SimulationEngine:
 
         startingBlock.setDailyRates(daily_rates)
         #startingBlock.setNextBlock(instradamento)
-        self.event_queue.push(startingBlock.start())
+        self.event_queue.setArrivals(startingBlock.arrivalStream())
 
         while not self.event_queue.is_empty():
             event = self.event_queue.pop()
@@ -470,6 +726,8 @@ class SimulationEngine:
         """
         seeds_path = Path(__file__).resolve().parents[2] / "used_seeds.txt"
         rngs.plantSeeds(seed_base)
+        self._beginStore()
+        crn_seed = seed_base
 
         for rep in range(n_replicas):
             print(f"\n--- Avvio replica {rep+1}/{n_replicas} ---")
@@ -479,7 +737,9 @@ class SimulationEngine:
                 f.write(f"Replica {rep+1}: seed = {seed_base}\n")
 
             # Costruisci i blocchi con replica_id
+            self._beginReplicaRng(rep)
             self.event_queue = EventQueue()
+            self._setupCrn(crn_seed, rep)
             startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock = self.buildBlocks(replica_id=rep)
             #endBlock.setStartBlock(startingBlock)
 
@@ -494,19 +754,30 @@ class SimulationEngine:
             startingBlock.current_time    = start_date
             startingBlock.end_timestamp   = end_date
 
-            # Avvio simulazione
-            self.event_queue.push(startingBlock.start())
+            # Avvio simulazione (i blocchi sono costruiti con u: il fit della Pareto resta identico nella coppia)
+            rngs.setAntithetic(self.antithetic and rep % 2 == 1)
+            profiler = self._attachProfiler(rep)
+            telemetry = self._attachTelemetry((startingBlock, compilazionePrecompilata, invioDiretto, inValutazione, endBlock), rep)
+            self.event_queue.setArrivals(startingBlock.arrivalStream())
             while not self.event_queue.is_empty():
                 event = self.event_queue.pop()
                 event = event[0] if isinstance(event, list) else event
+                if telemetry:
+                    telemetry.tick(event.timestamp)
                 if event.handler:
-                    new_events = event.handler(event.person)
+                    new_events = profiler.dispatch(event) if profiler else event.handler(event.person)
                     if new_events:
                         for new_event in new_events:
                             self.event_queue.push(new_event)
 
             # Finalizza la replica
+            if telemetry:
+                telemetry.finish()
             endBlock.finalize()
+            self._storeReplica(rep, endBlock.output_file)
+            if profiler:
+                profiler.report()
+            self._endReplicaRng(rep)
             print(f"✅ Replica {rep+1} completata! ({start_date.date()} → {end_date.date()})")
 
             seed_base = rngs.getSeed() #just for printing
\ No newline at end of file
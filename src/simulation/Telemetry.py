@@ -0,0 +1,190 @@
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from simulation.blocks.StartBlock import StartBlock
+
+
+"""
+Telemetria della simulazione durante la run.
+
+A intervalli regolari (in secondi di tempo reale) viene registrato un campione con data simulata,
+eventi elaborati ed eventi al secondo, eventi in coda (heap_size: len(EventQueue), quindi senza gli
+annullati e con il prossimo arrivo), lunghezza della coda e serventi occupati di ogni blocco e
+memoria del processo. I campioni vanno in un file JSON-lines e/o sono esposti su un endpoint
+HTTP locale (GET /metrics restituisce l'ultimo campione).
+Con la telemetria attiva lo StartBlock non stampa più "Date changed to" a ogni nuovo giorno.
+
+Uso:
+    telemetry = Telemetry(interval=5, path="telemetry.jsonl", http_port=8765)
+    engine = SimulationEngine(telemetry=telemetry)
+"""
+
+
+class Telemetry:
+    """Campionamento periodico dello stato di una run."""
+
+    # il tempo reale viene letto solo ogni CHECK_EVERY eventi: tick() resta un incremento
+    CHECK_EVERY = 2048
+
+    def __init__(self, interval: float = 5.0, path: Optional[str] = None, http_port: Optional[int] = None,
+                 echo: bool = False):
+        """
+        Args:
+            interval (float): Secondi di tempo reale tra due campioni.
+            path (str): File JSON-lines dei campioni (relativo a src); None per non scrivere su file.
+            http_port (int): Porta dell'endpoint HTTP su 127.0.0.1; None per non avviarlo (0 = porta libera).
+            echo (bool): Se True stampa anche una riga di riepilogo per ogni campione.
+        """
+        if interval <= 0:
+            raise ValueError("L'intervallo di campionamento deve essere positivo")
+        self.interval = interval
+        self.echo = echo
+        self.path = None
+        self.file_handle = None
+        if path is not None:
+            self.path = Path(path) if Path(path).is_absolute() else Path(__file__).resolve().parents[1] / path
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file_handle = open(self.path, "a", encoding="utf-8", buffering=1)
+        self.last_sample = None
+        self._lock = threading.Lock()
+        self._server = None
+        if http_port is not None:
+            self._start_http(http_port)
+        self.event_queue = None
+        self.blocks = ()
+        self.replica_id = None
+        self.events = 0
+
+    def __reduce__(self):
+        # nei checkpoint e negli snapshot i blocchi non si portano dietro file e server:
+        # la telemetria viene ricollegata dall'engine alla ripresa
+        return type(None), ()
+
+    # --- ciclo degli eventi -------------------------------------------------------------
+
+    def attach(self, event_queue, blocks, replica_id=None):
+        """Collega la telemetria alla coda degli eventi e ai blocchi di una replica."""
+        self.event_queue = event_queue
+        self.blocks = tuple(blocks)
+        self.replica_id = replica_id
+        for block in self.blocks:
+            if isinstance(block, StartBlock):
+                block.telemetry = self
+        self.events = 0
+        self._next_check = self.CHECK_EVERY
+        self._t0 = self._last_t = time.monotonic()
+        self._last_events = 0
+
+    def tick(self, sim_time: datetime):
+        """Da chiamare a ogni evento elaborato."""
+        self.events += 1
+        if self.events >= self._next_check:
+            self._next_check = self.events + self.CHECK_EVERY
+            if time.monotonic() - self._last_t >= self.interval:
+                self.sample(sim_time)
+
+    def finish(self, sim_time: Optional[datetime] = None):
+        """Campione finale della replica."""
+        if self.event_queue is not None:
+            self.sample(sim_time, final=True)
+
+    def close(self):
+        if self.file_handle is not None and not self.file_handle.closed:
+            self.file_handle.close()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # --- campioni -----------------------------------------------------------------------
+
+    def sample(self, sim_time: Optional[datetime] = None, final: bool = False) -> dict:
+        now = time.monotonic()
+        elapsed = now - self._last_t
+        rate = (self.events - self._last_events) / elapsed if elapsed > 0 else 0.0
+        record = {
+            "type": "telemetry",
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "replica_id": self.replica_id,
+            "final": final,
+            "sim_time": sim_time.isoformat() if sim_time else None,
+            "wall_seconds": round(now - self._t0, 3),
+            "events": self.events,
+            "events_per_sec": round(rate, 1),
+            "heap_size": len(self.event_queue),
+            "memory_mb": round(_memory_mb(), 1),
+            "blocks": {b.name: _block_state(b) for b in self.blocks if hasattr(b, "queue")},
+        }
+        self._last_t, self._last_events = now, self.events
+        with self._lock:
+            self.last_sample = record
+        if self.file_handle is not None:
+            self.file_handle.write(json.dumps(record) + "\n")
+        if self.echo:
+            queues = ", ".join(f"{name}={s['queue']}/{s['busy']}" for name, s in record["blocks"].items())
+            print(f"📈 {record['sim_time']} | {record['events_per_sec']:.0f} ev/s | heap {record['heap_size']} | "
+                  f"{queues} | {record['memory_mb']} MB")
+        return record
+
+    # --- endpoint HTTP ------------------------------------------------------------------
+
+    def _start_http(self, port: int):
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                with telemetry._lock:
+                    body = json.dumps(telemetry.last_sample or {}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📡 Telemetria su http://127.0.0.1:{self._server.server_address[1]}/metrics")
+
+    @property
+    def http_port(self):
+        return self._server.server_address[1] if self._server else None
+
+
+def _block_state(block) -> dict:
+    """Lunghezza della coda (per classe se il blocco ha più code) e serventi occupati."""
+    queue = block.queue
+    state = {"queue": sum(len(q) for q in queue.values()) if isinstance(queue, dict) else len(queue),
+             "busy": getattr(block, "working", 0),
+             "servers": getattr(block, "serversNumber", None)}
+    if isinstance(queue, dict):
+        state["queues"] = {name: len(q) for name, q in queue.items()}
+    return state
+
+
+def _memory_mb() -> float:
+    """Memoria residente del processo (picco se /proc non è disponibile)."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    except ImportError:
+        return 0.0
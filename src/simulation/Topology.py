@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta
+
+
+"""
+Topologia della rete dichiarata nella config (sezione "topology") e compilata una volta sola.
+
+    "topology": {
+      "blocks": ["inValutazione", "compilazionePrecompilata", "invioDiretto", "start"],
+      "start": "start",
+      "routes": [
+        {"from": "start", "to": "compilazionePrecompilata", "via": "setCompilazione"},
+        ...
+        {"from": "end", "to": "start", "via": "setStartBlock"}
+      ]
+    }
+
+"blocks" elenca le sezioni della config da istanziare, nell'ordine di costruzione (il costruttore di
+InValutazione estrae numeri casuali per il fit della Pareto, quindi l'ordine fa parte del modello).
+Un blocco può prendere classe e parametri da un'altra sezione, es.
+{"name": "inValutazione", "section": "inValutazionePriorita"}: le route usano sempre il nome.
+"end" è riservato al blocco finale, che l'engine crea per ogni replica (EndBlock o EndBlockModificato).
+Ogni route collega due blocchi chiamando il setter "via" del blocco "from" con il blocco "to".
+Le probabilità di instradamento restano parametri dei blocchi nelle rispettive sezioni.
+
+La compilazione risolve classi e parametri dei blocchi e traduce le route in una tabella di
+indici: istanziare una replica non rilegge la config né ripete le validazioni. In alternativa i
+blocchi di una replica possono essere riusati per la successiva con reset().
+"""
+
+END = "end"
+
+# rete del progetto, usata se la config non ha la sezione "topology"
+DEFAULT_TOPOLOGY = {
+    "blocks": ["inValutazione", "compilazionePrecompilata", "invioDiretto", "start"],
+    "start": "start",
+    "routes": [
+        {"from": "start", "to": "compilazionePrecompilata", "via": "setCompilazione"},
+        {"from": "start", "to": "invioDiretto", "via": "setInvioDiretto"},
+        {"from": "compilazionePrecompilata", "to": "inValutazione", "via": "setNextBlock"},
+        {"from": "invioDiretto", "to": "inValutazione", "via": "setNextBlock"},
+        {"from": "inValutazione", "to": "end", "via": "setEnd"},
+        {"from": "inValutazione", "to": "invioDiretto", "via": "setInvioDiretto"},
+        {"from": "inValutazione", "to": "compilazionePrecompilata", "via": "setCompilazione"},
+        {"from": "end", "to": "start", "via": "setStartBlock"},
+    ],
+}
+
+
+class Topology:
+    """Topologia compilata: blocchi per indice e tabella di instradamento (indice, setter, indice)."""
+
+    def __init__(self, names, factories, routes, start_index, start_timestamp, end_timestamp):
+        self.names = tuple(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.end_index = self.index[END]
+        self.factories = tuple(factories)     # (indice, classe, kwargs) in ordine di costruzione
+        self.routes = tuple(routes)           # (indice sorgente, setter, indice destinazione)
+        self.start_index = start_index
+        self.start_timestamp = start_timestamp
+        self.end_timestamp = end_timestamp
+
+    def instantiate(self, end_block, alias_routing: bool = False) -> list:
+        """
+        Crea i blocchi di una replica, li collega e imposta l'orizzonte; restituisce la lista per indice.
+        Con alias_routing i blocchi che lo supportano scelgono l'uscita con una sola estrazione
+        (enableAliasRouting, simulation/Routing.py).
+        """
+        blocks = [None] * len(self.names)
+        blocks[self.end_index] = end_block
+        for i, cls, kwargs in self.factories:
+            blocks[i] = cls(**kwargs)
+        for src, via, dst in self.routes:
+            getattr(blocks[src], via)(blocks[dst])
+        if alias_routing:
+            for block in blocks:
+                if hasattr(block, "enableAliasRouting"):
+                    block.enableAliasRouting()
+        blocks[self.start_index].setStartAndEndTimestamps(
+            start_timestamp=self.start_timestamp,
+            end_timestamp=self.end_timestamp
+        )
+        return blocks
+
+    def reset(self, blocks: list, replica_id=None) -> list:
+        """
+        Prepara per una nuova replica i blocchi creati da instantiate(), senza ricostruirli:
+        reset() nello stesso ordine della costruzione (stesse estrazioni dal generatore),
+        collegamenti invariati e orizzonte reimpostato.
+        """
+        blocks[self.end_index].reset(replica_id)
+        for i, _, _ in self.factories:
+            blocks[i].reset(replica_id)
+        blocks[self.start_index].setStartAndEndTimestamps(
+            start_timestamp=self.start_timestamp,
+            end_timestamp=self.end_timestamp
+        )
+        return blocks
+
+    def select(self, blocks: list, names) -> tuple:
+        """Blocchi con i nomi indicati (None per i nomi assenti dalla topologia)."""
+        return tuple(blocks[self.index[name]] if name in self.index else None for name in names)
+
+
+def compile_topology(cfg: dict, resolve) -> Topology:
+    """
+    Compila la sezione "topology" di cfg.
+
+    Args:
+        cfg (dict): Configurazione completa (sezioni dei blocchi, "date" ed eventuale "topology").
+        resolve: resolve(cfg, key) -> (classe, kwargs) della sezione key (vedi _resolve degli engine).
+    """
+    spec = cfg.get("topology", DEFAULT_TOPOLOGY)
+    entries = [b if isinstance(b, dict) else {"name": b} for b in spec.get("blocks", [])]
+    names = [b["name"] for b in entries]
+    sections = {b["name"]: b.get("section", b["name"]) for b in entries}
+    if END in names:
+        raise ValueError(f"'{END}' è riservato al blocco finale e non va elencato in topology.blocks")
+    if len(set(names)) != len(names):
+        raise ValueError(f"Blocchi duplicati in topology.blocks: {names}")
+    start = spec.get("start", "start")
+    if start not in names:
+        raise ValueError(f"Il blocco di partenza '{start}' non è in topology.blocks")
+    names.append(END)
+    index = {name: i for i, name in enumerate(names)}
+
+    factories = []
+    for name in names[:-1]:
+        cls, kwargs = resolve(cfg, sections[name])
+        factories.append((index[name], cls, kwargs))
+    classes = {name: cls for (_, cls, _), name in zip(factories, names)}
+
+    routes = []
+    for route in spec.get("routes", []):
+        missing = [k for k in ("from", "to", "via") if k not in route]
+        if missing:
+            raise ValueError(f"Route {route} senza i campi: {missing}")
+        src, dst, via = route["from"], route["to"], route["via"]
+        for name in (src, dst):
+            if name not in index:
+                raise ValueError(f"Route {src} -> {dst}: blocco '{name}' non presente in topology.blocks")
+        if src != END and not callable(getattr(classes[src], via, None)):
+            raise ValueError(f"Route {src} -> {dst}: {classes[src].__name__} non ha il metodo '{via}'")
+        routes.append((index[src], via, index[dst]))
+
+    start_date = datetime.fromisoformat(cfg["date"]["start"])
+    end_date = datetime.fromisoformat(cfg["date"]["end"]) + timedelta(days=1)
+    return Topology(names, factories, routes, index[start],
+                    datetime.combine(start_date, datetime.min.time()),
+                    datetime.combine(end_date, datetime.min.time()))
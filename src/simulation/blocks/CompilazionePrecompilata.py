@@ -4,9 +4,12 @@ from models.person import Person
 from simulation.Event import Event
 from simulation.states.NormalState import NormalState
 from desPython import rvgs
+from desPython import rngsCrn
 from datetime import timedelta
 import math
 
+from simulation.Routing import AliasRouter
+
 
 class CompilazionePrecompilata(SimBlockInterface):
     
@@ -22,6 +25,7 @@ class CompilazionePrecompilata(SimBlockInterface):
         self.queue=[]
         self.working=0
         self.nextBlock = None
+        self.router = None
         self.lognormal_params = self.calculateParameters()
 
 
@@ -31,6 +35,11 @@ class CompilazionePrecompilata(SimBlockInterface):
         self.nextBlock = nextBlock
 
 
+    def enableAliasRouting(self):
+        """Instradamento con una sola estrazione (simulation/Routing.py): blocco successivo o nuova compilazione."""
+        s = self.compilationSuccessRate
+        self.router = AliasRouter([s, 1 - s], [self.nextBlock, self])
+
     def calculateParameters(self):
         """
         Per una variabile casuale Lognormale(a, b), la media e la varianza sono:
@@ -51,18 +60,16 @@ class CompilazionePrecompilata(SimBlockInterface):
         return [a,b]
 
 
-    def getServiceTime(self,time:datetime)->datetime:
-        from desPython import rngs
-        rngs.selectStream(self.stream)
+    def getServiceTime(self,time:datetime,person:Person=None)->datetime:
+        rngsCrn.selectStream(self.stream, person)
         a,b=self.lognormal_params
         lognormal = rvgs.Lognormal(a, b)
         return time + timedelta(seconds=lognormal)
     
 
 
-    def getSuccess(self):
-        from desPython import rngs
-        rngs.selectStream(self.stream+100)
+    def getSuccess(self, person=None):
+        rngsCrn.selectStream(self.stream+100, person)
         n=rvgs.Uniform(0,1)
         if n > self.compilationSuccessRate:
             return False
@@ -99,7 +106,7 @@ class CompilazionePrecompilata(SimBlockInterface):
                 exitQueueTime = person.get_last_state().enqueue_time
             person.get_last_state().service_start_time = exitQueueTime
             self.queueLenght -= 1
-            person.get_last_state().service_end_time = self.getServiceTime(exitQueueTime)
+            person.get_last_state().service_end_time = self.getServiceTime(exitQueueTime, person)
             return [Event(person.get_last_state().service_end_time,  self.name,person, "queue_empty_put_to_work", self.serveNext)]
         return []
 
@@ -115,8 +122,9 @@ class CompilazionePrecompilata(SimBlockInterface):
             if event:
                 events.extend(event)
 
-        compilationSuccess = self.getSuccess()
-        if compilationSuccess:
+        if self.router is not None:
+            event=self.router.route(serving, self.stream+100).putInQueue(serving, endTime)
+        elif self.getSuccess(serving):
             event=self.nextBlock.putInQueue(serving, endTime)
         else:
             event=self.putInQueue(serving, endTime)
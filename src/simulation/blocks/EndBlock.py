@@ -20,12 +20,60 @@ class EndBlock(SimBlockInterface):
         out_dir = Path(__file__).resolve().parents[2] / "transient_analysis_json"
         os.makedirs(out_dir, exist_ok=True)
 
-        # Se è una replica, rinomina il file
-        if replica_id is not None:
-            base, ext = output_file.rsplit(".", 1)
-            output_file = f"{base}_rep{replica_id}.{ext}"
-
+        # Se è una replica, il file viene rinominato in _openOutput
         self.output_file = str(out_dir / output_file)
+        self._openOutput(replica_id)
+
+        # Variabili di stato
+        self.workingDate = None
+        self.daily_stats = {}
+        self.day_summary = {
+            "entrati": 0,
+            "usciti": 0,
+            "trovato_coda_piena": 0
+        }
+        self.total_processed = 0
+        self.start_block = None
+        self.working=True
+
+
+    def __getstate__(self):
+        """Stato per i checkpoint: al posto del file aperto si salva l'offset di scrittura."""
+        state = self.__dict__.copy()
+        handle = state.pop("file_handle")
+        state["_file_offset"] = None
+        if not handle.closed:
+            handle.flush()
+            state["_file_offset"] = handle.tell()
+        return state
+
+    def __setstate__(self, state):
+        """Ripresa da checkpoint: riapre il file di output troncandolo all'offset salvato."""
+        offset = state.pop("_file_offset")
+        self.__dict__.update(state)
+        if offset is None:
+            self.file_handle = open(self.output_file, 'a', encoding='utf-8')
+            self.file_handle.close()
+            return
+        self.file_handle = open(self.output_file, 'r+', encoding='utf-8', buffering=8192)
+        self.file_handle.truncate(offset)
+        self.file_handle.seek(offset)
+
+    def redirectOutput(self, replica_id: int):
+        """
+        Chiude il file corrente e scrive i giorni successivi su quello della replica indicata.
+        Usato dalle repliche che partono da uno snapshot comune dopo il warm-up.
+        """
+        if not self.file_handle.closed:
+            self.file_handle.close()
+        self._openOutput(replica_id)
+
+    def _openOutput(self, replica_id):
+        """Apre (troncandolo) il file della replica indicata nella cartella di output e scrive i metadata."""
+        base, ext = Path(self.output_file).name.rsplit(".", 1)
+        base = base.split("_rep")[0]
+        name = f"{base}_rep{replica_id}.{ext}" if replica_id is not None else f"{base}.{ext}"
+        self.output_file = str(Path(self.output_file).with_name(name))
         self.file_handle = open(self.output_file, 'w', encoding='utf-8', buffering=8192)
 
         # Scrive intestazione metadata
@@ -38,7 +86,12 @@ class EndBlock(SimBlockInterface):
         self.file_handle.write(json.dumps(metadata) + '\n')
         self.file_handle.flush()
 
-        # Variabili di stato
+    def reset(self, replica_id=None):
+        """Nuova replica senza ricostruire il blocco: chiude il file corrente, apre quello della
+        replica indicata e azzera le statistiche."""
+        if not self.file_handle.closed:
+            self.file_handle.close()
+        self._openOutput(replica_id)
         self.workingDate = None
         self.daily_stats = {}
         self.day_summary = {
@@ -47,9 +100,7 @@ class EndBlock(SimBlockInterface):
             "trovato_coda_piena": 0
         }
         self.total_processed = 0
-        self.start_block = None
-        self.working=True
-
+        self.working = True
 
     def setWorkingStatus(self, status: bool):
         self.working = status
@@ -13,19 +13,81 @@ from simulation.blocks.StartBlock import StartBlock
 
 
 class EndBlockModificato(SimBlockInterface):
-    """Blocco finale che raccoglie, aggrega e salva risultati giornalieri della simulazione."""
+    """Blocco finale che raccoglie, aggrega e salva risultati giornalieri della simulazione.
+
+    Le statistiche sono raccolte per giorno di ingresso nel sistema, il riepilogo anche per giorno
+    di uscita, quindi un giorno resta aperto finché tutte le persone entrate quel giorno non sono
+    uscite. Con lo StartBlock collegato (setStartBlock) il blocco tiene una soglia (watermark): il
+    giorno più vecchio con persone ancora nel sistema. I giorni precedenti alla soglia e al giorno
+    corrente sono definitivi: vengono scritti subito e rimossi dalla memoria, così la memoria resta
+    limitata anche su orizzonti lunghi. Il file prodotto è lo stesso della scrittura in finalize.
+    """
+
+    _watermark = None           # giorno più vecchio non ancora scritto (default per i checkpoint precedenti)
+    _watermarkToday = None
+    exits_by_start_day = None   # nei checkpoint precedenti manca: creato in __setstate__
 
     def __init__(self, output_file="daily_stats.json", replica_id: int = None,outDirString: str = "transient_analysis_json"):
         # Directory per i file di transitorio
         out_dir = Path(__file__).resolve().parents[2] / outDirString
         os.makedirs(out_dir, exist_ok=True)
 
-        # Se è una replica, rinomina il file
-        if replica_id is not None:
-            base, ext = output_file.rsplit(".", 1)
-            output_file = f"{base}_rep{replica_id}.{ext}"
-
+        # Se è una replica, il file viene rinominato in _openOutput
         self.output_file = str(out_dir / output_file)
+        self._openOutput(replica_id)
+
+        # Variabili di stato
+        self.workingDate = None
+        self.daily_stats = {}
+        self.day_summary = {
+            "entrati": 0,
+            "usciti": 0,
+            "trovato_coda_piena": 0
+        }
+        self.total_processed = 0
+        self.start_block = None
+        self.pending_daily_summaries = []
+        self.working = True
+        # Support per-date accumulators because completions may arrive out-of-order
+        # Keys are datetime.date objects
+        self.daily_stats_by_date = {}
+        self.day_summary_by_date = {}
+        self.exits_by_start_day = {}                      # uscite per giorno di ingresso, per la soglia
+        self._watermark = None
+        self._watermarkToday = None
+
+
+    def __getstate__(self):
+        """Stato per i checkpoint: al posto del file aperto si salva l'offset di scrittura."""
+        state = self.__dict__.copy()
+        handle = state.pop("file_handle")
+        state["_file_offset"] = None
+        if not handle.closed:
+            handle.flush()
+            state["_file_offset"] = handle.tell()
+        return state
+
+    def __setstate__(self, state):
+        """Ripresa da checkpoint: riapre il file di output troncandolo all'offset salvato."""
+        offset = state.pop("_file_offset")
+        self.__dict__.update(state)
+        if self.exits_by_start_day is None:
+            # checkpoint precedente alla soglia: i giorni restano in memoria fino a finalize
+            self.exits_by_start_day = {}
+        if offset is None:
+            self.file_handle = open(self.output_file, 'a', encoding='utf-8')
+            self.file_handle.close()
+            return
+        self.file_handle = open(self.output_file, 'r+', encoding='utf-8', buffering=8192)
+        self.file_handle.truncate(offset)
+        self.file_handle.seek(offset)
+
+    def _openOutput(self, replica_id):
+        """Apre (troncandolo) il file della replica indicata nella cartella di output e scrive i metadata."""
+        base, ext = Path(self.output_file).name.rsplit(".", 1)
+        base = base.split("_rep")[0]
+        name = f"{base}_rep{replica_id}.{ext}" if replica_id is not None else f"{base}.{ext}"
+        self.output_file = str(Path(self.output_file).with_name(name))
         self.file_handle = open(self.output_file, 'w', encoding='utf-8', buffering=8192)
 
         # Scrive intestazione metadata
@@ -38,7 +100,12 @@ class EndBlockModificato(SimBlockInterface):
         self.file_handle.write(json.dumps(metadata) + '\n')
         self.file_handle.flush()
 
-        # Variabili di stato
+    def reset(self, replica_id=None):
+        """Nuova replica senza ricostruire il blocco: chiude il file corrente, apre quello della
+        replica indicata e azzera le statistiche."""
+        if not self.file_handle.closed:
+            self.file_handle.close()
+        self._openOutput(replica_id)
         self.workingDate = None
         self.daily_stats = {}
         self.day_summary = {
@@ -47,14 +114,13 @@ class EndBlockModificato(SimBlockInterface):
             "trovato_coda_piena": 0
         }
         self.total_processed = 0
-        self.start_block = None
         self.pending_daily_summaries = []
-        self.working = True
-        # Support per-date accumulators because completions may arrive out-of-order
-        # Keys are datetime.date objects
         self.daily_stats_by_date = {}
         self.day_summary_by_date = {}
-
+        self.exits_by_start_day = {}
+        self._watermark = None
+        self._watermarkToday = None
+        self.working = True
 
     def setWorkingStatus(self, status: bool):
         self.working = status
@@ -125,7 +191,7 @@ class EndBlockModificato(SimBlockInterface):
                     stat["queue_time"][state.get_queue_name()] = time_in_queue
                     stat["executing_time"][state.get_queue_name()] = time_executing
                     stat["queue_lenght"][state.get_queue_name()] = in_code
-                    if len(stat["data"]["queue_time"]) < 50*50 and stat["visited"] % 6 == 0:
+                    if len(stat["data"]["queue_time"]) < 50*50 and sum(stat["visited"].values()) % 6 == 0:
                         stat["data"]["queue_time"].append(time_in_queue)
                         stat["data"]["queue_lenght"].append(in_code)
                         stat["data"]["executing_time"].append(time_executing)
@@ -135,7 +201,7 @@ class EndBlockModificato(SimBlockInterface):
                     stat["queue_time"][state.get_queue_name()] += time_in_queue
                     stat["executing_time"][state.get_queue_name()] += time_executing
                     stat["queue_lenght"][state.get_queue_name()] += in_code
-                    if len(stat["data"]["queue_time"]) < 50*50 and stat["visited"] % 6 == 0:
+                    if len(stat["data"]["queue_time"]) < 50*50 and sum(stat["visited"].values()) % 6 == 0:
                         stat["data"]["queue_time"].append(time_in_queue)
                         stat["data"]["queue_lenght"].append(in_code)
                         stat["data"]["executing_time"].append(time_executing)
@@ -174,6 +240,10 @@ class EndBlockModificato(SimBlockInterface):
             list[Event]: Lista vuota (blocco finale).
         """
 
+        # le uscite si contano anche a raccolta disattivata (warm-up): servono alla soglia
+        startDay = person.states[0].get_queue_exit_time().date()
+        self.exits_by_start_day[startDay] = self.exits_by_start_day.get(startDay, 0) + 1
+
         if self.working is False:
             return []
         completion_date = timestamp.date()
@@ -186,53 +256,76 @@ class EndBlockModificato(SimBlockInterface):
         # Aggiorna le statistiche per la data di completamento
         self._update_stats(person, completion_date)
 
+        if self.start_block is not None and (startDay == self._watermark or completion_date != self._watermarkToday):
+            self._advance_watermark(completion_date)
+
         return []
 
+    def _advance_watermark(self, today):
+        """Scrive e libera i giorni chiusi: precedenti a oggi e con tutte le persone entrate già uscite."""
+        self._watermarkToday = today
+        if self._watermark is None:
+            self._watermark = self.start_block.start_timestamp.date()
+        day = self._watermark
+        while day < today and self.get_entrate_nel_sistema(day) == self.exits_by_start_day.get(day, 0):
+            output = self._day_output(day)
+            if output is not None:
+                self.file_handle.write(json.dumps(output) + '\n')
+            self.exits_by_start_day.pop(day, None)
+            day += timedelta(days=1)
+        self._watermark = day
+
+    def _day_output(self, date):
+        """Riepilogo finale del giorno (medie calcolate), rimosso dagli accumulatori; None se il giorno non ha statistiche."""
+        day_summary = self.day_summary_by_date.pop(date, None)
+        stats = self.daily_stats_by_date.pop(date, None)
+        if stats is None:
+            return None
+        if day_summary is None:
+            day_summary = {
+                "entrati": 0,
+                "usciti": 0,
+                "trovato_coda_piena": 0
+            }
+
+        day_summary["entrati"] = self.get_entrate_nel_sistema(date)
+
+        # finalize averages
+        for queue, s in stats.items():
+            if isinstance(s.get("visited"), dict):
+                for queue_name, visited_count in s["visited"].items():
+                    if visited_count > 0:
+                        s["queue_time"][queue_name] /= visited_count
+                        s["queue_lenght"][queue_name] /= visited_count
+                        s["executing_time"][queue_name] /= visited_count
+                    else:
+                        s["queue_time"][queue_name] = 0
+                        s["queue_lenght"][queue_name] = 0
+                        s["executing_time"][queue_name] = 0
+            else:
+                if s.get("visited", 0) > 0:
+                    s["queue_time"] /= s["visited"]
+                    s["queue_lenght"] /= s["visited"]
+                    s["executing_time"] /= s["visited"]
+                else:
+                    s["queue_time"] = 0
+                    s["queue_lenght"] = 0
+                    s["executing_time"] = 0
+
+        return {
+            "type": "daily_summary",
+            "date": date.isoformat(),
+            "summary": day_summary,
+            "stats": stats
+        }
+
     def _flush_all_dates(self):
         """Process all buffered per-date accumulators and append summaries to pending buffer."""
         if not self.daily_stats_by_date:
             return
 
         for date in sorted(self.daily_stats_by_date.keys()):
-            stats = self.daily_stats_by_date[date]
-            day_summary = self.day_summary_by_date.get(date, {
-                "entrati": 0,
-                "usciti": 0,
-                "trovato_coda_piena": 0
-            })
-
-            day_summary["entrati"] = self.get_entrate_nel_sistema(date)
-
-            # finalize averages
-            for queue, s in stats.items():
-                if isinstance(s.get("visited"), dict):
-                    for queue_name, visited_count in s["visited"].items():
-                        if visited_count > 0:
-                            s["queue_time"][queue_name] /= visited_count
-                            s["queue_lenght"][queue_name] /= visited_count
-                            s["executing_time"][queue_name] /= visited_count
-                        else:
-                            s["queue_time"][queue_name] = 0
-                            s["queue_lenght"][queue_name] = 0
-                            s["executing_time"][queue_name] = 0
-                else:
-                    if s.get("visited", 0) > 0:
-                        s["queue_time"] /= s["visited"]
-                        s["queue_lenght"] /= s["visited"]
-                        s["executing_time"] /= s["visited"]
-                    else:
-                        s["queue_time"] = 0
-                        s["queue_lenght"] = 0
-                        s["executing_time"] = 0
-
-            output = {
-                "type": "daily_summary",
-                "date": date.isoformat(),
-                "summary": day_summary,
-                "stats": stats
-            }
-
-            self.pending_daily_summaries.append(output)
+            self.pending_daily_summaries.append(self._day_output(date))
 
         # clear
         self.daily_stats_by_date = {}
@@ -26,6 +26,11 @@ class ExponentialService(SimBlockInterface):
         self.working=None
         self.nextBlock = nextBlock
 
+    def reset(self, replica_id=None):
+        """Nuova replica: coda vuota e servente libero (working contiene la persona servita)."""
+        super().reset(replica_id)
+        self.working = None
+
     def getServiceTime(self,time:datetime)->datetime:
         """Calcola il tempo di servizio esponenziale a partire da un timestamp specificato.
         
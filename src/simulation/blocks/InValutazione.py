@@ -4,9 +4,11 @@ from models.person import Person
 from simulation.Event import Event
 from simulation.states.NormalState import NormalState
 from desPython import rvgs
+from desPython import rngsCrn
 from datetime import timedelta
 import math
 
+from simulation.Routing import AliasRouter
 from desPython.rvgsCostum import generate_denormalized_bounded_pareto,find_best_normalized_pareto_params
 
 
@@ -28,6 +30,7 @@ class InValutazione(SimBlockInterface):
         self.queue=[]
         self.working=0
         self.end=None
+        self.router=None
         self.lower_bound=mean*0.001
         self.upper_bound=mean*8
         self.a,self.k = find_best_normalized_pareto_params(
@@ -39,6 +42,29 @@ class InValutazione(SimBlockInterface):
         )
 
         
+    def reset(self, replica_id=None):
+        """Nuova replica: il fit della Pareto viene ripetuto (senza grafico) perché sceglie (a, k) su
+        campioni dello stream corrente; così parametri ed estrazioni coincidono con quelli di un blocco
+        ricostruito."""
+        super().reset(replica_id)
+        self.serversNumber = self.normalServerNumber
+        self.a,self.k = find_best_normalized_pareto_params(
+            original_mean=self.mean,
+            original_l=self.lower_bound,
+            original_h=self.upper_bound,
+            save_plot=False,
+            verbose=False
+        )
+
+    def enableAliasRouting(self):
+        """Instradamento con una sola estrazione (simulation/Routing.py): fine (successo o abbandono),
+        compilazione precompilata o invio diretto, con le probabilità di getSuccess, getDropout e isPrecompilata."""
+        s, d, q = self.acceptanceRate, self.dropoutProbability, self.precompilataProbability
+        self.router = AliasRouter(
+            [s + (1 - s) * d, (1 - s) * (1 - d) * q, (1 - s) * (1 - d) * (1 - q)],
+            [self.end, self.compilazionePrecompilata, self.invioDiretto]
+        )
+
     def setInvioDiretto(self,nextBlock:SimBlockInterface):
         """Imposta il blocco successivo da chiamare."""
         self.invioDiretto = nextBlock
@@ -51,24 +77,21 @@ class InValutazione(SimBlockInterface):
         """Imposta il blocco di fine."""
         self.end = end
 
-    def getServiceTime(self,time:datetime)->datetime:
-        from desPython import rngs
-        rngs.selectStream(self.stream)
+    def getServiceTime(self,time:datetime,person:Person=None)->datetime:
+        rngsCrn.selectStream(self.stream, person)
         lognormal = generate_denormalized_bounded_pareto(self.a,self.k,0.1,1.0,self.lower_bound,self.upper_bound)
         return time + timedelta(seconds=lognormal)
 
 
-    def getSuccess(self):
-        from desPython import rngs
-        rngs.selectStream(self.stream+100)
+    def getSuccess(self, person=None):
+        rngsCrn.selectStream(self.stream+100, person)
         n=rvgs.Uniform(0,1)
         if n > self.acceptanceRate:
             return False
         return True
 
-    def getDropout(self):
-        from desPython import rngs
-        rngs.selectStream(self.stream+100)
+    def getDropout(self, person=None):
+        rngsCrn.selectStream(self.stream+100, person)
         n=rvgs.Uniform(0,1)
         if n > self.dropoutProbability:
             return False
@@ -93,10 +116,9 @@ class InValutazione(SimBlockInterface):
             return events if events else []
         return []
 
-    def isPrecompilata(self):
+    def isPrecompilata(self, person=None):
         """Determina se il modulo è precompilato."""
-        from desPython import rngs
-        rngs.selectStream(self.stream)
+        rngsCrn.selectStream(self.stream, person)
         n=rvgs.Uniform(0,1)
         if n < self.precompilataProbability:
             return True
@@ -112,7 +134,7 @@ class InValutazione(SimBlockInterface):
                 exitQueueTime = person.get_last_state().enqueue_time
             person.get_last_state().service_start_time = exitQueueTime
             self.queueLenght -= 1
-            person.get_last_state().service_end_time = self.getServiceTime(exitQueueTime)
+            person.get_last_state().service_end_time = self.getServiceTime(exitQueueTime, person)
             return [Event(person.get_last_state().service_end_time,  self.name,person, "queue_empty_put_to_work", self.serveNext)]
         return []
 
@@ -128,16 +150,17 @@ class InValutazione(SimBlockInterface):
             if event:
                 events.extend(event)
 
-        compilationSuccess = self.getSuccess()
-        if compilationSuccess:
+        if self.router is not None:
+            event=self.router.route(serving, self.stream+100).putInQueue(serving, endTime)
+        elif self.getSuccess(serving):
             event=self.end.putInQueue(serving, endTime)
         else:
-            compilationDropout = self.getDropout()
+            compilationDropout = self.getDropout(serving)
             if compilationDropout:
                 #butta fuori dal sistema
                 event=self.end.putInQueue(serving, endTime)
             else:        
-                precompilataSuccess= self.isPrecompilata()
+                precompilataSuccess= self.isPrecompilata(serving)
                 if precompilataSuccess:
                     event=self.compilazionePrecompilata.putInQueue(serving, endTime)
                 else:
@@ -4,9 +4,11 @@ from models.person import Person
 from simulation.Event import Event
 from simulation.states.StateWithServiceTIme import StateWithServiceTime
 from desPython import rvgs
+from desPython import rngsCrn
 from datetime import timedelta
 import math
 
+from simulation.Routing import AliasRouter
 from desPython.rvgsCostum import generate_denormalized_bounded_pareto,find_best_normalized_pareto_params
 
 
@@ -37,6 +39,7 @@ class InValutazioneCodaPrioritaNP(SimBlockInterface):
 
         self.working=0
         self.end=None
+        self.router=None
         self.lower_bound=mean*0.001
         self.upper_bound=mean*8
         self.a,self.k = find_best_normalized_pareto_params(
@@ -48,6 +51,29 @@ class InValutazioneCodaPrioritaNP(SimBlockInterface):
         )
 
         
+    def reset(self, replica_id=None):
+        """Nuova replica: il fit della Pareto viene ripetuto (senza grafico) perché sceglie (a, k) su
+        campioni dello stream corrente; così parametri ed estrazioni coincidono con quelli di un blocco
+        ricostruito."""
+        super().reset(replica_id)
+        self.serversNumber = self.normalServerNumber
+        self.a,self.k = find_best_normalized_pareto_params(
+            original_mean=self.mean,
+            original_l=self.lower_bound,
+            original_h=self.upper_bound,
+            save_plot=False,
+            verbose=False
+        )
+
+    def enableAliasRouting(self):
+        """Instradamento con una sola estrazione (simulation/Routing.py): fine (successo o abbandono),
+        compilazione precompilata o invio diretto, con le probabilità di getSuccess, getDropout e isPrecompilata."""
+        s, d, q = self.acceptanceRate, self.dropoutProbability, self.precompilataProbability
+        self.router = AliasRouter(
+            [s + (1 - s) * d, (1 - s) * (1 - d) * q, (1 - s) * (1 - d) * (1 - q)],
+            [self.end, self.compilazionePrecompilata, self.invioDiretto]
+        )
+
     def setInvioDiretto(self,nextBlock:SimBlockInterface):
         """Imposta il blocco successivo da chiamare."""
         self.invioDiretto = nextBlock
@@ -62,15 +88,13 @@ class InValutazioneCodaPrioritaNP(SimBlockInterface):
 
     
 
-    def getServiceTime(self)->datetime:
-        from desPython import rngs
-        rngs.selectStream(self.stream)
+    def getServiceTime(self, person=None)->datetime:
+        rngsCrn.selectStream(self.stream, person)
         lognormal = generate_denormalized_bounded_pareto(self.a,self.k,0.1,1.0,self.lower_bound,self.upper_bound)
         return timedelta(seconds=lognormal)
 
-    def getDropout(self):
-        from desPython import rngs
-        rngs.selectStream(self.stream+100)
+    def getDropout(self, person=None):
+        rngsCrn.selectStream(self.stream+100, person)
         n=rvgs.Uniform(0,1)
         if n > self.dropoutProbability:
             return False
@@ -85,9 +109,8 @@ class InValutazioneCodaPrioritaNP(SimBlockInterface):
     
 
 
-    def getSuccess(self):
-        from desPython import rngs
-        rngs.selectStream(self.stream+100)
+    def getSuccess(self, person=None):
+        rngsCrn.selectStream(self.stream+100, person)
         n=rvgs.Uniform(0,1)
         if n > self.acceptanceRate:
             return False
@@ -101,10 +124,9 @@ class InValutazioneCodaPrioritaNP(SimBlockInterface):
       
         return self.serviceRate    
 
-    def isPrecompilata(self):
+    def isPrecompilata(self, person=None):
         """Determina se il modulo è precompilato."""
-        from desPython import rngs
-        rngs.selectStream(self.stream)
+        rngsCrn.selectStream(self.stream, person)
         n=rvgs.Uniform(0,1)
         if n < self.precompilataProbability:
             return True
@@ -112,7 +134,7 @@ class InValutazioneCodaPrioritaNP(SimBlockInterface):
 
     def putInQueue(self,person: Person,timestamp: datetime) ->list[Event]:
         comingFrom=person.get_last_state().get_service_name()
-        execTime=self.getServiceTime()
+        execTime=self.getServiceTime(person)
         queueLength=0
         queueName=""    
         if comingFrom=="InvioDiretto":
@@ -173,16 +195,17 @@ class InValutazioneCodaPrioritaNP(SimBlockInterface):
             if event:
                 events.extend(event)
 
-        compilationSuccess = self.getSuccess()
-        if compilationSuccess:
+        if self.router is not None:
+            event=self.router.route(serving, self.stream+100).putInQueue(serving, endTime)
+        elif self.getSuccess(serving):
             event=self.end.putInQueue(serving, endTime)
         else:
-            compilationDropout = self.getDropout()
+            compilationDropout = self.getDropout(serving)
             if compilationDropout:
                 #butta fuori dal sistema
                 event=self.end.putInQueue(serving, endTime)
             else:        
-                precompilataSuccess= self.isPrecompilata()
+                precompilataSuccess= self.isPrecompilata(serving)
                 if precompilataSuccess:
                     event=self.compilazionePrecompilata.putInQueue(serving, endTime)
                 else:
@@ -0,0 +1,162 @@
+from collections import deque
+from datetime import datetime, timedelta
+
+from models.person import Person
+from simulation.Event import Event
+from simulation.states.StateWithServiceTIme import StateWithServiceTime
+from simulation.blocks.InValutazioneCodaPrioritaNP import InValutazioneCodaPrioritaNP
+
+
+class InValutazionePrioritaMultiClasse(InValutazioneCodaPrioritaNP):
+    """Valutazione con N classi di priorità configurabili, senza o con prelazione.
+
+    Le classi sono elencate in ordine di priorità (la prima è servita per prima). Una persona entra
+    nella prima classe la cui regola è soddisfatta:
+        "from": [blocchi]         blocco da cui arriva la persona (es. ["InvioDiretto"])
+        "maxServiceRatio": r      tempo di servizio (estratto all'ingresso) <= r * mean
+        "minServiceRatio": r      tempo di servizio > r * mean
+    Una classe senza regole accetta tutti: l'ultima deve esserlo.
+
+    Ogni classe ha una deque FIFO; una maschera di bit delle classi non vuote dà la classe da servire
+    in O(1) (bit meno significativo acceso). Con preemptive=True una persona di priorità più alta che
+    trova tutti i serventi occupati interrompe l'ultima persona entrata in servizio della classe
+    meno prioritaria in servizio, che torna in testa alla sua coda e riprende il lavoro residuo
+    (preemptive-resume). Il completamento interrotto resta nella coda degli eventi e viene ignorato
+    (cade sempre prima di quello del servizio ripreso).
+    L'executing_time delle persone interrotte comprende il periodo di interruzione.
+
+    Tempi di servizio, fit della Pareto e instradamento in uscita sono quelli di InValutazioneCodaPrioritaNP:
+    con le classi Diretta (da InvioDiretto), Leggera (maxServiceRatio 1.5) e Pesante e senza
+    prelazione il comportamento coincide con il suo.
+    """
+
+    def __init__(self, name, dipendenti, pratichePerDipendente, mean, variance, successProbability,
+                 dropoutProbability, precompilataProbability, classes, preemptive=False):
+        super().__init__(name, dipendenti, pratichePerDipendente, mean, variance, successProbability,
+                         dropoutProbability, precompilataProbability)
+        if not classes:
+            raise ValueError(f"[{name}] Serve almeno una classe di priorità")
+        names = [c["name"] for c in classes]
+        if len(set(names)) != len(names):
+            raise ValueError(f"[{name}] Classi duplicate: {names}")
+        rules = []
+        for c in classes:
+            unknown = set(c) - {"name", "from", "maxServiceRatio", "minServiceRatio"}
+            if unknown:
+                raise ValueError(f"[{name}] Regole sconosciute nella classe {c['name']}: {sorted(unknown)}")
+            origins = frozenset(c["from"]) if "from" in c else None
+            max_service = timedelta(seconds=c["maxServiceRatio"] * mean) if "maxServiceRatio" in c else None
+            min_service = timedelta(seconds=c["minServiceRatio"] * mean) if "minServiceRatio" in c else None
+            rules.append((origins, max_service, min_service))
+        if rules[-1] != (None, None, None):
+            raise ValueError(f"[{name}] L'ultima classe ({names[-1]}) deve accettare tutti (nessuna regola)")
+
+        self.classNames = names
+        self.rules = rules
+        self.preemptive = preemptive
+        self._initQueues()
+
+    def _initQueues(self):
+        self.queue = {c: deque() for c in self.classNames}
+        self.queueLenght = {c: 0 for c in self.classNames}
+        self._deques = [self.queue[c] for c in self.classNames]
+        self.nonEmpty = 0                                     # bit i acceso = classe i con persone in coda
+        self.inService = [{} for _ in self.classNames]        # persone in servizio per classe (in ordine di ingresso)
+        self.busyClasses = 0                                  # bit i acceso = classe i con persone in servizio
+        self.remaining = {}                                   # lavoro residuo delle persone interrotte
+        self.stale = {}                                       # completamenti scaduti ancora in coda, per persona
+
+    def reset(self, replica_id=None):
+        super().reset(replica_id)
+        self._initQueues()
+
+    def finalize(self):
+        self._initQueues()
+
+    def classify(self, person: Person, execTime: timedelta) -> int:
+        """Indice della classe (0 = massima priorità) per la persona con il tempo di servizio indicato."""
+        comingFrom = person.get_last_state().get_service_name()
+        for i, (origins, max_service, min_service) in enumerate(self.rules):
+            if origins is not None and comingFrom not in origins:
+                continue
+            if max_service is not None and execTime > max_service:
+                continue
+            if min_service is not None and execTime <= min_service:
+                continue
+            return i
+        return len(self.rules) - 1
+
+    def putInQueue(self, person: Person, timestamp: datetime) -> list[Event]:
+        execTime = self.getServiceTime(person)
+        c = self.classify(person, execTime)
+        queueName = self.classNames[c]
+
+        state = StateWithServiceTime(self.name, timestamp, self.queueLenght[queueName], execTime, queueName)
+        self.queueLenght[queueName] += 1
+        self._deques[c].append(person)
+        self.nonEmpty |= 1 << c
+        person.append_state(state)
+
+        if self.working < self.serversNumber:
+            return self.putNextEvent(timestamp)
+        if self.preemptive:
+            return self._preempt(c, timestamp)
+        return []
+
+    def _preempt(self, c, now: datetime) -> list[Event]:
+        """Interrompe un servizio di priorità più bassa di c (se c'è) e avvia la classe più prioritaria."""
+        if self.busyClasses >> (c + 1) == 0:
+            return []
+        victimClass = self.busyClasses.bit_length() - 1
+        serving = self.inService[victimClass]
+        victim, _ = serving.popitem()
+        if not serving:
+            self.busyClasses &= ~(1 << victimClass)
+        self.working -= 1
+        self.stale[victim] = self.stale.get(victim, 0) + 1
+
+        state = victim.get_last_state()
+        self.remaining[victim] = max(state.service_end_time - now, timedelta(0))
+        self._deques[victimClass].appendleft(victim)
+        self.queueLenght[self.classNames[victimClass]] += 1
+        self.nonEmpty |= 1 << victimClass
+        return self.putNextEvent(now)
+
+    def putNextEvent(self, exitQueueTime) -> list[Event]:
+        if self.nonEmpty == 0 or self.working >= self.serversNumber:
+            return []
+        c = (self.nonEmpty & -self.nonEmpty).bit_length() - 1
+        queue = self._deques[c]
+        person = queue.popleft()
+        if not queue:
+            self.nonEmpty &= ~(1 << c)
+        self.queueLenght[self.classNames[c]] -= 1
+        self.working += 1
+
+        state = person.get_last_state()
+        serviceTime = self.remaining.pop(person, None)
+        if serviceTime is None:
+            serviceTime = state.getServiceTime()
+            state.service_start_time = exitQueueTime
+        state.service_end_time = exitQueueTime + serviceTime
+
+        if self.preemptive:
+            self.inService[c][person] = None
+            self.busyClasses |= 1 << c
+        return [Event(state.service_end_time, self.name, person, "queue_empty_put_to_work", self.serveNext)]
+
+    def serveNext(self, person) -> list[Event]:
+        if self.preemptive:
+            stale = self.stale.get(person)
+            if stale:
+                # completamento di un servizio poi interrotto: l'evento è scaduto
+                if stale == 1:
+                    del self.stale[person]
+                else:
+                    self.stale[person] = stale - 1
+                return []
+            c = self.classNames.index(person.get_last_state().get_queue_name())
+            del self.inService[c][person]
+            if not self.inService[c]:
+                self.busyClasses &= ~(1 << c)
+        return super().serveNext(person)
@@ -0,0 +1,143 @@
+import heapq
+from datetime import datetime, timedelta
+from itertools import count
+
+from models.person import Person
+from simulation.Event import Event
+from simulation.states.StateWithServiceTIme import StateWithServiceTime
+from simulation.blocks.InValutazioneCodaPrioritaNP import InValutazioneCodaPrioritaNP
+
+
+_EPOCH = datetime(2000, 1, 1)     # chiave dell'heap dei servizi: _EPOCH - fine (i datetime non si negano)
+
+
+class InValutazioneSizeBased(InValutazioneCodaPrioritaNP):
+    """Valutazione con scheduling basato sulla dimensione delle pratiche.
+
+    Il tempo di servizio è estratto all'ingresso in coda (come in InValutazioneCodaPrioritaNP) e la
+    coda è un heap ordinato per lavoro da svolgere, con l'ordine di arrivo a parità: ingresso e
+    uscita costano O(log n) anche con centinaia di migliaia di pratiche in attesa.
+
+    Politiche:
+        "sjf"   shortest job first, senza prelazione.
+        "srpt"  shortest remaining processing time (preemptive-resume), approssimato: la prelazione
+                si valuta solo agli arrivi e interrompe il servizio con più lavoro residuo solo se
+                questo supera srptThreshold volte il lavoro del nuovo arrivato (1.0 = SRPT esatto;
+                valori più alti riducono le interruzioni). La pratica interrotta rientra nell'heap
+                con il lavoro residuo; il suo completamento scaduto viene ignorato.
+    L'executing_time delle pratiche interrotte comprende il periodo di interruzione.
+    """
+
+    POLICIES = ("sjf", "srpt")
+    COMPACT_MIN_SIZE = 1024      # sotto questa dimensione non conviene ricostruire l'heap dei servizi
+
+    def __init__(self, name, dipendenti, pratichePerDipendente, mean, variance, successProbability,
+                 dropoutProbability, precompilataProbability, policy="sjf", srptThreshold=1.0):
+        super().__init__(name, dipendenti, pratichePerDipendente, mean, variance, successProbability,
+                         dropoutProbability, precompilataProbability)
+        if policy not in self.POLICIES:
+            raise ValueError(f"[{name}] Politica non valida: {policy} (ammesse: {self.POLICIES})")
+        if srptThreshold < 1.0:
+            raise ValueError(f"[{name}] srptThreshold deve essere >= 1 (trovato {srptThreshold})")
+        self.policy = policy
+        self.preemptive = policy == "srpt"
+        self.srptThreshold = srptThreshold
+        self.queueName = policy.upper()
+        self._initQueues()
+
+    def _initQueues(self):
+        self.queue = []                  # heap di (lavoro da svolgere, ordine di arrivo, persona)
+        self.queueLenght = 0
+        self._seq = count()
+        self.inService = {}              # persona -> ordine del servizio in corso
+        self._serviceHeap = []           # heap di (_EPOCH - fine servizio, ordine, persona), con voci scadute
+        self.remaining = {}              # lavoro residuo delle pratiche interrotte
+        self.stale = {}                  # completamenti scaduti ancora in coda, per persona
+
+    def reset(self, replica_id=None):
+        super().reset(replica_id)
+        self._initQueues()
+
+    def finalize(self):
+        self._initQueues()
+
+    def putInQueue(self, person: Person, timestamp: datetime) -> list[Event]:
+        execTime = self.getServiceTime(person)
+        state = StateWithServiceTime(self.name, timestamp, self.queueLenght, execTime, self.queueName)
+        self.queueLenght += 1
+        heapq.heappush(self.queue, (execTime, next(self._seq), person))
+        person.append_state(state)
+
+        if self.working < self.serversNumber:
+            return self.putNextEvent(timestamp)
+        if self.preemptive:
+            return self._preempt(execTime, timestamp)
+        return []
+
+    def _longestInService(self):
+        """Voce valida in cima all'heap dei servizi (quella che finisce più tardi), scartando le scadute."""
+        heap = self._serviceHeap
+        while heap and self.inService.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _preempt(self, execTime: timedelta, now: datetime) -> list[Event]:
+        """SRPT: interrompe il servizio con più lavoro residuo se supera la soglia rispetto al nuovo arrivo."""
+        top = self._longestInService()
+        if top is None:
+            return []
+        key, _, victim = top
+        remaining = (_EPOCH - key) - now
+        if remaining <= execTime * self.srptThreshold:
+            return []
+        heapq.heappop(self._serviceHeap)
+        del self.inService[victim]
+        self.working -= 1
+        self.stale[victim] = self.stale.get(victim, 0) + 1
+
+        remaining = max(remaining, timedelta(0))
+        self.remaining[victim] = remaining
+        heapq.heappush(self.queue, (remaining, next(self._seq), victim))
+        self.queueLenght += 1
+        return self.putNextEvent(now)
+
+    def putNextEvent(self, exitQueueTime) -> list[Event]:
+        if not self.queue or self.working >= self.serversNumber:
+            return []
+        _, seq, person = heapq.heappop(self.queue)
+        self.queueLenght -= 1
+        self.working += 1
+
+        state = person.get_last_state()
+        serviceTime = self.remaining.pop(person, None)
+        if serviceTime is None:
+            serviceTime = state.getServiceTime()
+            state.service_start_time = exitQueueTime
+        state.service_end_time = exitQueueTime + serviceTime
+
+        if self.preemptive:
+            self.inService[person] = seq
+            heapq.heappush(self._serviceHeap, (_EPOCH - state.service_end_time, seq, person))
+        return [Event(state.service_end_time, self.name, person, "queue_empty_put_to_work", self.serveNext)]
+
+    def serveNext(self, person) -> list[Event]:
+        if self.preemptive:
+            stale = self.stale.get(person)
+            if stale:
+                # completamento di un servizio poi interrotto: l'evento è scaduto
+                if stale == 1:
+                    del self.stale[person]
+                else:
+                    self.stale[person] = stale - 1
+                return []
+            del self.inService[person]
+            # la voce del servizio concluso resta nell'heap finché non ne raggiunge la cima
+            stale = len(self._serviceHeap) - len(self.inService)
+            if stale * 2 > len(self._serviceHeap) and len(self._serviceHeap) >= self.COMPACT_MIN_SIZE:
+                self._compactServices()
+        return super().serveNext(person)
+
+    def _compactServices(self):
+        """Ricostruisce l'heap dei servizi con le sole voci dei servizi in corso."""
+        self._serviceHeap = [entry for entry in self._serviceHeap if self.inService.get(entry[2]) == entry[1]]
+        heapq.heapify(self._serviceHeap)
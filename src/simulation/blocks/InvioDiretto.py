@@ -4,6 +4,7 @@ from models.person import Person
 from simulation.Event import Event
 from simulation.states.NormalState import NormalState
 from desPython import rvgs
+from desPython import rngsCrn
 from datetime import timedelta
 import math
 
@@ -50,9 +51,8 @@ class InvioDiretto(SimBlockInterface):
         return [a, b]
 
 
-    def getServiceTime(self,time:datetime)->datetime:
-        from desPython import rngs
-        rngs.selectStream(self.stream)
+    def getServiceTime(self,time:datetime,person:Person=None)->datetime:
+        rngsCrn.selectStream(self.stream, person)
         a,b=self.lognormal_params
         lognormal = rvgs.Lognormal(a, b)
         return time + timedelta(seconds=lognormal)
@@ -91,7 +91,7 @@ class InvioDiretto(SimBlockInterface):
             
             person.get_last_state().service_start_time = exitQueueTime
             self.queueLenght -= 1
-            person.get_last_state().service_end_time = self.getServiceTime(exitQueueTime)
+            person.get_last_state().service_end_time = self.getServiceTime(exitQueueTime, person)
             return [Event(person.get_last_state().service_end_time,  self.name,person, "queue_empty_put_to_work", self.serveNext)]
         return []
 
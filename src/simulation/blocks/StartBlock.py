@@ -3,8 +3,15 @@ from datetime import datetime, timedelta, date
 from models.person import Person
 from simulation.Event import Event
 from simulation.states.NormalState import NormalState
+from simulation.Routing import AliasRouter
+from simulation.ArrivalTrace import open_trace
+from simulation.RateSchedule import RateSchedule
 from desPython import rvgs
 from desPython import rngs
+from desPython import rngsCrn
+
+
+_DAY = timedelta(days=1)
 
 
 class StartBlock(SimBlockInterface):
@@ -14,9 +21,16 @@ class StartBlock(SimBlockInterface):
     Il tasso di servizio varia di giorno in giorno, secondo un array fornito in input (`daily_rates`).
     Il blocco successivo è specificato al momento della creazione.
     Ogni volta che viene generato un utente si crea un evento per generare il successivo.
+    Con `trace` gli istanti di arrivo sono letti da una traccia (simulation/ArrivalTrace.py) invece
+    che estratti dai tassi giornalieri.
     """
 
-    def __init__(self, name, precompilataProbability):
+    _dayStart = None            # giorno dell'ultimo indice calcolato (default per i checkpoint precedenti)
+    _dayEnd = None
+    _dayIndex = 0
+    _dayBase = None
+
+    def __init__(self, name, precompilataProbability, trace=None):
         """Inizializza un nuovo blocco di partenza.
         
         Args:
@@ -24,17 +38,38 @@ class StartBlock(SimBlockInterface):
             nextBlock (SimBlockInterface): Il blocco successivo nella catena di servizi.
             start_timestamp (datetime): Il timestamp di inizio della simulazione.
             daily_rates (list[float]): Una lista di tassi medi giornalieri per ogni giorno della simulazione (dal 1 maggio al 30 settembre).
+            trace (dict): Specifica della traccia degli arrivi da riprodurre (None per gli arrivi di Poisson).
         """
         self.stream=1
         self.name = name
         self.precompilataProbability = precompilataProbability
         self.compilazionePrecompilata = None
         self.invioDiretto = None
+        self.router = None
         self.next = None
         self.generated = 0
         
         self.daily_rates = None                            # array di tassi medi giornalieri
         self.last_date = None                              # per tracciare il cambio di data
+        self.telemetry = None                              # con la telemetria attiva niente stampa giornaliera
+        self.streamed = False                              # arrivi forniti alla coda degli eventi da arrivalStream
+        self.traceSpec = trace
+        self.trace = None                                  # aperta al primo arrivo di ogni replica
+
+    def reset(self, replica_id=None):
+        """Nuova replica: azzera generazione e arrivi giornalieri e riparte dall'inizio dell'orizzonte.
+
+        Le date possono essere reimpostate dopo con setStartAndEndTimestamps, i tassi con setDailyRates.
+        """
+        super().reset(replica_id)
+        self.next = None
+        self.generated = 0
+        self.last_date = None
+        self.streamed = False
+        self.trace = None
+        if hasattr(self, "start_timestamp"):
+            self.current_time = self.start_timestamp
+            self.entrate_nel_sistema = [0] * len(self.entrate_nel_sistema)
 
     def setInvioDiretto(self,nextBlock:SimBlockInterface):
         """Imposta il blocco successivo da chiamare."""
@@ -44,16 +79,20 @@ class StartBlock(SimBlockInterface):
         """Imposta il blocco successivo da chiamare."""
         self.compilazionePrecompilata = nextBlock
 
+    def enableAliasRouting(self):
+        """Instradamento con una sola estrazione (simulation/Routing.py): compilazione precompilata o invio diretto."""
+        p = self.precompilataProbability
+        self.router = AliasRouter([p, 1 - p], [self.compilazionePrecompilata, self.invioDiretto])
+
     def getServiceTime(self,time:datetime)->datetime:
         from desPython import rngs
         rngs.selectStream(self.stream)
         exp= rvgs.Exponential(1/self.serviceRate)
         return time + timedelta(seconds=exp)
     
-    def isPrecompilata(self):
+    def isPrecompilata(self, person=None):
         """Determina se il modulo è precompilato."""
-        from desPython import rngs
-        rngs.selectStream(self.stream)
+        rngsCrn.selectStream(self.stream, person)
         n=rvgs.Uniform(0,1)
         if n < self.precompilataProbability:
             return True
@@ -69,6 +108,7 @@ class StartBlock(SimBlockInterface):
         self.start_timestamp = start_timestamp
         self.current_time = start_timestamp
         self.end_timestamp = end_timestamp
+        self.trace = None
         self.entrate_nel_sistema = [0] * (self.get_index_for_date(end_timestamp) + 1)  # array per tenere traccia degli arrivi giornalieri
 
 
@@ -79,7 +119,7 @@ class StartBlock(SimBlockInterface):
         Args:
             daily_rates (list[float]): Lista di tassi medi giornalieri, uno per ciascun giorno della simulazione.
         """
-        self.daily_rates = daily_rates
+        self.daily_rates = daily_rates if isinstance(daily_rates, RateSchedule) else RateSchedule(daily_rates)
 
 
     def get_entrate_nel_sistema(self,date:datetime):
@@ -98,11 +138,12 @@ class StartBlock(SimBlockInterface):
 
 
 
-    def getServiceTime(self, time: datetime) -> datetime:
+    def getServiceTime(self, time: datetime, person: Person = None) -> datetime:
         """Calcola il tempo di servizio esponenziale a partire da un timestamp specificato, usando il tasso giornaliero.
         
         Args:
             time (datetime): Il timestamp di inizio del servizio.   
+            person (Person): La persona che arriva; in modalità CRN l'interarrivo è estratto dal suo sottostream.
         
         Returns:
             datetime: Il timestamp di fine del servizio, calcolato aggiungendo un tempo esponenziale al timestamp di inizio.
@@ -110,13 +151,16 @@ class StartBlock(SimBlockInterface):
         day_rate = self.getDailyRateForDate(time)
         if day_rate <= 0:
             day_rate = 1.0  # fallback per evitare errori
-        rngs.selectStream(self.stream)
+        rngsCrn.selectStream(self.stream, person)
         exp = rvgs.Exponential(1 / day_rate)
         return time + timedelta(seconds=exp)
 
 
     def get_index_for_date(self, date_obj: datetime) -> int:
         """Restituisce l'indice del giorno per una data specifica tra 1 maggio e 30 settembre.
+
+        L'indice dell'ultimo giorno calcolato resta in memoria: gli istanti dello stesso giorno
+        (quasi tutte le chiamate, gli arrivi sono in ordine) costano due confronti.
         
         Args:
             date_obj (datetime): La data di cui si vuole conoscere l'indice.
@@ -125,7 +169,12 @@ class StartBlock(SimBlockInterface):
             int: L'indice del giorno (0 per il 1 maggio, 121 per il 30 settembre).
         """
         base_date = self.start_timestamp
-        return (date_obj.date() - base_date.date()).days
+        if self._dayBase is base_date and self._dayStart <= date_obj < self._dayEnd:
+            return self._dayIndex
+        day = datetime.combine(date_obj.date(), datetime.min.time())
+        index = (day.date() - base_date.date()).days
+        self._dayBase, self._dayStart, self._dayEnd, self._dayIndex = base_date, day, day + _DAY, index
+        return index
     
 
     def getDailyRateForDate(self, date_obj: datetime) -> float:
@@ -137,18 +186,17 @@ class StartBlock(SimBlockInterface):
         Returns:
             float: Il tasso di arrivo giornaliero corrispondente a quella data.
         """
-        current_date = date_obj.date()
+        index = self.get_index_for_date(date_obj)
         
-        # Stampa quando la data cambia
-        if self.last_date is None or self.last_date != current_date:
-            print(f"[{self.name}] Date changed to: {current_date}")
-            self.last_date = current_date
+        # Stampa quando la data cambia (la telemetria, se attiva, la sostituisce)
+        if self.last_date != self._dayStart:
+            if getattr(self, "telemetry", None) is None:
+                print(f"[{self.name}] Date changed to: {self._dayStart.date()}")
+            self.last_date = self._dayStart
+        if self.daily_rates is None:
+            return -1.0
         
-        base_date = self.start_timestamp
-        index = self.get_index_for_date(date_obj)
-        if 0 <= index < len(self.daily_rates):
-            return self.daily_rates[index]
-        return -1.0  # Valore di fallback se la data è fuori intervallo
+        return self.daily_rates.rate(index)  # -1.0 se la data è fuori intervallo
 
     def start(self):
         """Genera una nuova persona e il primo evento da cui parte il sistema.
@@ -157,14 +205,18 @@ class StartBlock(SimBlockInterface):
             Event: Un evento che rappresenta l'inizio del servizio della persona generata,
                    oppure None se la data di generazione supera la data finale della simulazione.
         """
-        nextServe = self.getServiceTime(self.current_time)
+        person = Person(self.generated)
+        if self.traceSpec is not None:
+            nextServe = self.nextTraceArrival()
+        else:
+            nextServe = self.getServiceTime(self.current_time, person)
 
         # Controllo della condizione di fine: la generazione termina se il tempo supera l'ultimo giorno di settembre
-        if nextServe > self.end_timestamp:
+        if nextServe is None or nextServe > self.end_timestamp:
             print(f"[{self.name}] Generation complete: reached end time {self.end_timestamp}")
             return None
 
-        self.next = Person(self.generated)
+        self.next = person
         self.generated += 1
         state = NormalState(self.name, nextServe, 0)
         state.service_end_time = nextServe
@@ -177,6 +229,22 @@ class StartBlock(SimBlockInterface):
 
         return Event(nextServe, self.name, self.next, "generate_event", self.serveNext)
 
+    def nextTraceArrival(self) -> datetime:
+        """Prossimo istante di arrivo della traccia (None se esaurita), aprendola al primo arrivo della replica."""
+        if self.trace is None:
+            self.trace = open_trace(self.traceSpec, self.start_timestamp, self.end_timestamp, self.stream)
+        return next(self.trace, None)
+
+    def arrivalStream(self) -> "ArrivalStream":
+        """Arrivi come sequenza ordinata da passare a EventQueue.setArrivals, al posto di push(start()).
+
+        Gli eventi di arrivo non entrano nell'heap: la coda confronta il prossimo arrivo con la cima
+        dell'heap a ogni pop. L'arrivo successivo viene generato solo dopo l'esecuzione dell'handler
+        del precedente, quindi le estrazioni avvengono nello stesso ordine di serveNext.
+        """
+        self.streamed = True
+        return ArrivalStream(self)
+
     def serveNext(self,person) -> list[Event]:
         """Rappresenta l'handler dell'evento, aggiunge la persona alla coda del primo blocco, e genera il prossimo evento.
         
@@ -192,8 +260,9 @@ class StartBlock(SimBlockInterface):
         events = []
         self.entrate_nel_sistema[self.get_index_for_date(endTime)] += 1
 
-        precompilataSuccess= self.isPrecompilata()
-        if precompilataSuccess:
+        if self.router is not None:
+            event=self.router.route(serving, self.stream).putInQueue(serving, endTime)
+        elif self.isPrecompilata(serving):
             event=self.compilazionePrecompilata.putInQueue(serving, endTime)
         else:
             event=self.invioDiretto.putInQueue(serving, endTime)
@@ -201,10 +270,31 @@ class StartBlock(SimBlockInterface):
             events.extend(event)
 
         # Genera il prossimo evento se non abbiamo ancora superato il tempo finale della simulazione
-        if self.current_time <= self.end_timestamp:
+        # (con arrivalStream lo genera la coda degli eventi quando le serve)
+        if not self.streamed and self.current_time <= self.end_timestamp:
             new_event = self.start()
             if new_event:
                 events.append(new_event)
                
            
         return events if events else []
+
+
+class ArrivalStream:
+    """Iteratore (serializzabile, per i checkpoint) sugli eventi di arrivo di uno StartBlock."""
+
+    def __init__(self, start_block: StartBlock):
+        self.start_block = start_block
+        self.done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Event:
+        block = self.start_block
+        if not self.done and block.current_time <= block.end_timestamp:
+            event = block.start()
+            if event is not None:
+                return event
+        self.done = True
+        raise StopIteration
@@ -16,7 +16,7 @@ from pathlib import Path
 from tabulate import tabulate
 from math import sqrt
 
-from batch.batchMeanPriority import read_stats, computeBatchMeans, computeBatchStdev, getStudent
+from batch.batchMeanPriority import read_stats, computeBatchMeans, computeBatchStdev, getStudent, selectBatchSize, controlVariateRows
 
 
 
@@ -287,10 +287,18 @@ class SimulationEngine:
         autocorr_1 = cosum[1] / cosum[0] if cosum[0] != 0 else 0.0
         return autocorr_1, mean, stdev
 
-    def run_and_analyze(self, daily_rates=None, n=64*200, batch_count=128,
+    def run_and_analyze(self, daily_rates=None, n=64*200, batch_count=None,
                     theo_json="theo_valuesP.json",
-                    stats_file="transient_analysis_json/daily_stats.json"):
-        """Esegue simulazione, analisi batch e calcola tempo medio in coda."""
+                    stats_file="transient_analysis_json/daily_stats.json",
+                    rho_threshold=0.2, min_batches=32, control_variate=False):
+        """Esegue simulazione, analisi batch e calcola tempo medio in coda.
+
+        Se batch_count è None la dimensione dei batch viene scelta automaticamente
+        (selectBatchSize) sulle serie giornaliere, altrimenti si usano batch_count batch.
+        Vengono usati al più n valori per serie.
+        Con control_variate=True stampa anche gli stimatori corretti con la variabile di
+        controllo "entrate giornaliere", il cui valore atteso è noto da daily_rates.
+        """
 
     # 1) Esegui la simulazione
         self.normale(daily_rates)
@@ -339,11 +347,23 @@ class SimulationEngine:
 
         for service, metrics in stats_raw.items():
             for metric, values in metrics.items():
+                values = values[:n]
                 if len(values) < 2:
                     continue
                 try:
-                    k=len(values)
-                    autocorr_1, mean, stdev = self.autocorr_stats(values, k-1)
+                    if batch_count is None:
+                        selection = selectBatchSize(values, rho_threshold, min_batches)
+                        if not selection["sufficient"]:
+                            print(f"⚠️ {service}:{metric}: run troppo corta, autocorrelazione lag-1 dei batch "
+                                  f"{selection['autocorr_1']:.4f} >= {rho_threshold} "
+                                  f"(servono circa {selection['min_samples_needed']} giorni, "
+                                  f"disponibili {len(values)})")
+                        autocorr_1, mean, stdev = selection["autocorr_1"], selection["mean"], selection["stdev"]
+                        k = selection["batch_count"]
+                    else:
+                        batch_means = computeBatchMeans(values, min(batch_count, len(values)))
+                        k = len(batch_means)
+                        autocorr_1, mean, stdev = self.autocorr_stats(batch_means, 1)
                     stats_raw[service][metric]={
                         "autocorr_1": autocorr_1,
                         "mean": mean,
@@ -395,9 +415,10 @@ class SimulationEngine:
                     k_eff = stats[key]["k"]
                  
                     mean_sim = stats[key]["mean"]
-                    var_sim = stats[key]["stdev"] ** 2 * k_eff  # varianza della media
-                    se = sqrt(var_sim / k_eff)
-                    tcrit = getStudent(k_eff)
+                    # autocorr_stats divide per k: varianza campionaria delle medie dei batch
+                    var_sim = stats[key]["stdev"] ** 2 * k_eff / (k_eff - 1)
+                    se = sqrt(var_sim / k_eff)          # errore standard della media
+                    tcrit = getStudent(k_eff)           # t con k_eff - 1 gradi di libertà
                     ci = (mean_sim - tcrit * se, mean_sim + tcrit * se)
                     half_width = (ci[1] - ci[0]) / 2
                     rho1 = stats[key].get("autocorr_1", None)
@@ -445,6 +466,18 @@ class SimulationEngine:
       
 
 
+        # 🔹 Stimatori con variabile di controllo sulle entrate giornaliere
+        if control_variate:
+            rates = daily_rates if daily_rates is not None else self.getArrivalsRates()
+            keys = [f"{service}:{metric}" for service, metrics in theo_values.items() for metric in metrics]
+            cv_rows = controlVariateRows(stats_file, rates, keys, batch_count, rho_threshold, min_batches)
+            print("\n=== Variabile di controllo: entrate giornaliere (E = λ·86400), batch di giorni ===")
+            print(tabulate(
+                cv_rows,
+                headers=["Chiave", "Media", "Semi-Ampiezza", "Media CV", "Semi-Ampiezza CV", "Beta", "Riduzione"],
+                tablefmt="fancy_grid"
+            ))
+
         # 🔹 Tempo di risposta totale: somma dei tempi medi dei singoli centri
         if response_times_sim:
             total_sim = sum(response_times_sim)
@@ -19,6 +19,7 @@ from simulation.verification.base.InvioDirettoExp import InvioDiretto
 
 from typing import Optional, Tuple
 from batchMean import read_stats, computeBatchMeans, getStudent
+from batch.batchMeanPriority import selectBatchSize, controlVariateRows
 
 # ===== Giorni per mese =====
 monthDays = {
@@ -206,10 +207,15 @@ class SimulationEngineExp:
 
         endBlock.finalize()
     
-    def run_and_analyze(self, daily_rates=None, n=64*200, batch_count=128, theo_json="theo_values.json"):
+    def run_and_analyze(self, daily_rates=None, n=64*200, batch_count=None, theo_json="theo_values.json",
+                        rho_threshold=0.2, min_batches=32, control_variate=False):
         """
         Esegue la simulazione, calcola batch means, stdev e intervallo di confidenza.
         Confronta i valori simulati con quelli teorici e stampa una tabella completa.
+        Se batch_count è None la dimensione dei batch viene scelta automaticamente
+        (selectBatchSize) finché l'autocorrelazione lag-1 delle medie è sotto rho_threshold.
+        Con control_variate=True stampa anche gli stimatori corretti con la variabile di
+        controllo "entrate giornaliere", il cui valore atteso è noto da daily_rates.
         """
     # Esegui la simulazione
         self.run_single_iteration(daily_rates)
@@ -220,8 +226,6 @@ class SimulationEngineExp:
 # legge le stats
         stats = read_stats(str(stats_path), n)
         #stats = read_stats('transient_analysis_json/daily_stats.json', n)
-        n=len(stats["CompilazionePrecompilata:queue_time"])
-        batch_count=32
     # Carica valori teorici
 
         theo_path = Path(__file__).resolve().parents[4] / "conf" / theo_json
@@ -254,7 +258,19 @@ class SimulationEngineExp:
                     rho1 = autocorr_lag1(values)
 
                 # Calcolo batch means
-                    batch_means = computeBatchMeans(values, batch_count)
+                    if batch_count is None:
+                        selection = selectBatchSize(values, rho_threshold, min_batches)
+                        batch_means = selection["batch_means"]
+                        batch_info = f"{selection['batch_size']}×{selection['batch_count']}"
+                        if not selection["sufficient"]:
+                            batch_info += " ⚠️"
+                            print(f"⚠️ {key}: run troppo corta, autocorrelazione lag-1 dei batch "
+                                  f"{selection['autocorr_1']:.4f} >= {rho_threshold} "
+                                  f"(servono circa {selection['min_samples_needed']} campioni, "
+                                  f"disponibili {len(values)})")
+                    else:
+                        batch_means = computeBatchMeans(values, batch_count)
+                        batch_info = f"{len(values) // batch_count}×{len(batch_means)}"
                     k_eff = len(batch_means)
                     if k_eff < 2:
                         mean_sim = None
@@ -268,6 +284,8 @@ class SimulationEngineExp:
                 else:
                     mean_sim = None
                     ci = (None, None)
+                    rho1 = None
+                    batch_info = "-"
                 
                 # 🔹 Accumula solo tempi di risposta
                 if metric == "response_time":
@@ -291,6 +309,7 @@ class SimulationEngineExp:
                     f"[{ci[0]:.4f}, {ci[1]:.4f}]" if mean_sim is not None else "-",
                     f"±{half_width:.4f}" if half_width is not None else "-",
                     f"{rho1:.4f}" if rho1 is not None else "-",
+                    batch_info,
                     "✅" if check else "❌"
                 ])
 
@@ -305,13 +324,25 @@ class SimulationEngineExp:
             print(f"\n📌 Servizio: {service}")
             print(tabulate(
                 metrics,
-                headers=["Metrica", "Teorico", "Simulato", "95% CI", "Semi-Ampiezza","Autocorrelazione","Coerente?"],
+                headers=["Metrica", "Teorico", "Simulato", "95% CI", "Semi-Ampiezza","Autocorrelazione","Batch (b×k)","Coerente?"],
                 tablefmt="fancy_grid"
             ))
 
         
 
 
+        # 🔹 Stimatori con variabile di controllo sulle entrate giornaliere
+        if control_variate:
+            rates = daily_rates if daily_rates is not None else self.getArrivalsRates()
+            keys = [f"{service}:{metric}" for service, metrics in theo_values.items() for metric in metrics]
+            cv_rows = controlVariateRows(str(stats_path), rates, keys, batch_count, rho_threshold, min_batches)
+            print("\n=== Variabile di controllo: entrate giornaliere (E = λ·86400), batch di giorni ===")
+            print(tabulate(
+                cv_rows,
+                headers=["Chiave", "Media", "Semi-Ampiezza", "Media CV", "Semi-Ampiezza CV", "Beta", "Riduzione"],
+                tablefmt="fancy_grid"
+            ))
+
         # 🔹 Tempo di risposta totale: somma dei tempi medi dei singoli centri
         if response_times_sim:
             total_sim = sum(response_times_sim)
@@ -0,0 +1,391 @@
+"""
+Risolutore analitico della rete di code (CompilazionePrecompilata, InvioDiretto, InValutazione).
+
+Legge una configurazione nel formato di conf/input.json (o inputVerf.json / inputVerif2.json),
+costruisce la matrice di routing dai parametri dei blocchi (successProbability,
+dropoutProbability, precompilataProbability), risolve le equazioni di traffico
+lambda = gamma + P^T lambda con numpy.linalg e valuta ogni centro come M/M/c
+(servizi esponenziali, come nei blocchi di verifica) oppure M/G/c con
+l'approssimazione di Allen-Cunneen (servizi del modello reale).
+Per InValutazione è disponibile anche il modello a priorità non-preemptive
+(Diretta, Leggera, Pesante) di InValutazioneCodaPrioritaNP.
+
+Uso (dalla cartella src):
+    python -m simulation.verification.queueingNetwork --config inputVerf.json --out theo_values.json --exponential
+    python -m simulation.verification.queueingNetwork --config inputVerif2.json --out theo_valuesP.json --exponential --priority
+"""
+
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+
+
+CONF_DIR = Path(__file__).resolve().parents[3] / "conf"
+
+# Ordine dei centri nella matrice di routing
+CENTERS = ("CompilazionePrecompilata", "InvioDiretto", "InValutazione")
+_SECTIONS = {
+    "CompilazionePrecompilata": "compilazionePrecompilata",
+    "InvioDiretto": "invioDiretto",
+    "InValutazione": "inValutazione",
+}
+
+# Le pratiche che arrivano in InValutazione da CompilazionePrecompilata sono "Pesante"
+# se il tempo di servizio supera questa frazione della media (vedi InValutazioneCodaPrioritaNP)
+HEAVY_THRESHOLD = 1.5
+PRIORITY_CLASSES = ("Diretta", "Leggera", "Pesante")
+
+# Parametri di InvioDiretto.calculateParameters (lognormale quasi deterministica)
+_INVIO_DIRETTO_B = 1e-4
+# Griglia e limiti usati da InValutazione per la Pareto limitata normalizzata
+_PARETO_A_VALUES = (1.2, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0)
+_PARETO_K_VALUES = (0.001, 0.005, 0.01, 0.02, 0.05)
+_PARETO_L, _PARETO_H = 0.1, 1.0
+
+
+def load_config(filename="input.json") -> dict:
+    """Legge una configurazione da conf/ (o da un path esplicito)."""
+    path = Path(filename)
+    if not path.is_absolute() and not path.exists():
+        path = CONF_DIR / filename
+    if not path.exists():
+        raise FileNotFoundError(f"Config non trovata: {path}")
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_arrival_rate(filename="arrival_rate.json") -> float:
+    """Tasso di arrivo esterno medio (conf/arrival_rate.json)."""
+    with (CONF_DIR / filename).open("r", encoding="utf-8") as f:
+        return float(json.load(f)["arrival_rate"])
+
+
+def servers_number(cfg: dict, center: str) -> int:
+    """Numero di serventi di un centro, come calcolato dai blocchi."""
+    section = cfg[_SECTIONS[center]]
+    if center == "InvioDiretto":
+        return 1
+    if "serversNumber" in section:
+        return int(section["serversNumber"])
+    return int(section["dipendenti"]) * int(section["pratichePerDipendente"])
+
+
+# =========================================================
+# ROUTING
+# =========================================================
+def routing_matrix(cfg: dict, arrival_rate: float):
+    """
+    Costruisce la matrice di routing P (P[i, j] = probabilità di andare da i a j)
+    e il vettore degli arrivi esterni gamma, nell'ordine di CENTERS.
+
+    Start:          precompilataProbability -> CompilazionePrecompilata, altrimenti InvioDiretto
+    Compilazione:   successProbability -> InValutazione, altrimenti rientra in coda
+    InvioDiretto:   -> InValutazione
+    InValutazione:  successProbability -> uscita; in caso di rifiuto dropoutProbability -> uscita,
+                    altrimenti precompilataProbability -> Compilazione, il resto -> InvioDiretto.
+                    Se dropoutProbability manca (blocchi di verifica) il rifiuto esce dal sistema.
+    """
+    start = cfg.get("start", {})
+    p_start = float(start.get("precompilataProbability", cfg.get("precompilataProbability", 0.78)))
+
+    comp = cfg[_SECTIONS["CompilazionePrecompilata"]]
+    val = cfg[_SECTIONS["InValutazione"]]
+    s_c = float(comp.get("successProbability", 1.0))
+    s_v = float(val.get("successProbability", 1.0))
+    d_v = float(val.get("dropoutProbability", 1.0))
+    p_v = float(val.get("precompilataProbability", p_start))
+
+    P = np.zeros((3, 3))
+    P[0, 0] = 1.0 - s_c
+    P[0, 2] = s_c
+    P[1, 2] = 1.0
+    P[2, 0] = (1.0 - s_v) * (1.0 - d_v) * p_v
+    P[2, 1] = (1.0 - s_v) * (1.0 - d_v) * (1.0 - p_v)
+
+    gamma = arrival_rate * np.array([p_start, 1.0 - p_start, 0.0])
+    return P, gamma
+
+
+def solve_traffic(P: np.ndarray, gamma: np.ndarray) -> np.ndarray:
+    """Risolve (I - P^T) lambda = gamma."""
+    return np.linalg.solve(np.eye(len(gamma)) - P.T, gamma)
+
+
+# =========================================================
+# DISTRIBUZIONI DI SERVIZIO
+# =========================================================
+class ExponentialService:
+    """Servizio esponenziale di media mean."""
+
+    def __init__(self, mean):
+        self.mean = float(mean)
+
+    def moments(self, lo=0.0, hi=math.inf):
+        """Restituisce (P(lo < S <= hi), E[S; lo < S <= hi], E[S^2; lo < S <= hi])."""
+        m = self.mean
+
+        def tail(x):
+            # integrali da x a infinito di f, s*f, s^2*f
+            if math.isinf(x):
+                return 0.0, 0.0, 0.0
+            e = math.exp(-x / m)
+            return e, (x + m) * e, ((x + m) ** 2 + m * m) * e
+
+        t_lo, t_hi = tail(lo), tail(hi)
+        return tuple(a - b for a, b in zip(t_lo, t_hi))
+
+
+class LognormalService:
+    """Servizio lognormale descritto solo da media e varianza (coefficiente di variazione)."""
+
+    def __init__(self, mean, variance):
+        self.mean = float(mean)
+        self.variance = float(variance)
+
+    def moments(self, lo=0.0, hi=math.inf):
+        """Restituisce (P(lo < S <= hi), E[S; lo < S <= hi], E[S^2; lo < S <= hi])."""
+        m = self.mean
+        if lo <= 0.0 and math.isinf(hi):
+            return 1.0, m, self.variance + m * m
+        if self.variance <= 0.0:
+            # varianza nulla: servizio deterministico pari alla media
+            inside = 1.0 if lo < m <= hi else 0.0
+            return inside, inside * m, inside * m * m
+        # parametri (mu, sigma) di ln S a partire da media e varianza
+        s2 = math.log(1.0 + self.variance / (m * m))
+        mu, sigma = math.log(m) - s2 / 2, math.sqrt(s2)
+
+        def phi(x):
+            return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+        def partial(r):
+            # E[S^r; lo < S <= hi] = exp(r mu + r^2 s2 / 2) * [Phi(b_r) - Phi(a_r)]
+            a = (math.log(lo) - mu - r * s2) / sigma if lo > 0.0 else -math.inf
+            b = (math.log(hi) - mu - r * s2) / sigma if not math.isinf(hi) else math.inf
+            return math.exp(r * mu + r * r * s2 / 2) * (phi(b) - phi(a))
+
+        return partial(0), partial(1), partial(2)
+
+
+class BoundedParetoService:
+    """
+    Pareto limitata normalizzata su [l, h] e denormalizzata su [L, H],
+    come in rvgsCostum.generate_denormalized_bounded_pareto.
+    """
+
+    def __init__(self, a, k, original_l, original_h, l=_PARETO_L, h=_PARETO_H):
+        self.a, self.k = float(a), float(k)
+        self.l, self.h = float(l), float(h)
+        self.L, self.H = float(original_l), float(original_h)
+        self.scale = (self.H - self.L) / (self.h - self.l)
+        self.offset = self.L - self.scale * self.l
+
+    @classmethod
+    def fitted(cls, mean):
+        """
+        Sceglie (a, k) sulla stessa griglia di find_best_normalized_pareto_params,
+        usando la media esatta invece di quella campionaria (nessun uso dell'RNG).
+        """
+        original_l, original_h = mean * 0.001, mean * 8
+        target = _PARETO_L + (_PARETO_H - _PARETO_L) * (mean - original_l) / (original_h - original_l)
+        best, best_error = None, math.inf
+        for a in _PARETO_A_VALUES:
+            for k in _PARETO_K_VALUES:
+                if k >= _PARETO_L:
+                    continue
+                _, m1, _ = cls._normalized_moments(a, k, _PARETO_L, _PARETO_H, _PARETO_L, _PARETO_H)
+                if abs(m1 - target) < best_error:
+                    best, best_error = (a, k), abs(m1 - target)
+        return cls(best[0], best[1], original_l, original_h)
+
+    @staticmethod
+    def _normalized_moments(a, k, l, h, lo, hi):
+        # Momenti parziali della Pareto(k, a) troncata su [l, h], ristretti a [lo, hi]
+        lo, hi = max(lo, l), min(hi, h)
+        if hi <= lo:
+            return 0.0, 0.0, 0.0
+        norm = (k / l) ** a - (k / h) ** a
+
+        def integral(j):
+            # integrale di x^j * a * k^a * x^(-a-1) su [lo, hi]
+            if abs(j - a) < 1e-12:
+                return a * k ** a * math.log(hi / lo)
+            return a * k ** a * (hi ** (j - a) - lo ** (j - a)) / (j - a)
+
+        return integral(0) / norm, integral(1) / norm, integral(2) / norm
+
+    @property
+    def mean(self):
+        return self.moments()[1]
+
+    def moments(self, lo=0.0, hi=math.inf):
+        # Y = offset + scale * X, si riportano i limiti nella scala normalizzata
+        x_lo = (lo - self.offset) / self.scale
+        x_hi = (hi - self.offset) / self.scale if not math.isinf(hi) else math.inf
+        p, m1, m2 = self._normalized_moments(self.a, self.k, self.l, self.h, x_lo, x_hi)
+        o, s = self.offset, self.scale
+        return p, o * p + s * m1, o * o * p + 2 * o * s * m1 + s * s * m2
+
+
+def service_model(cfg: dict, center: str, exponential: bool = False):
+    """Distribuzione di servizio di un centro, coerente con il blocco che lo simula."""
+    section = cfg[_SECTIONS[center]]
+    mean = float(section["mean"])
+    if exponential:
+        return ExponentialService(mean)
+    if center == "InValutazione":
+        return BoundedParetoService.fitted(mean)
+    if center == "InvioDiretto":
+        b2 = _INVIO_DIRETTO_B ** 2
+        return LognormalService(mean, (math.exp(b2) - 1) * mean ** 2)
+    return LognormalService(mean, float(section.get("variance", 0.0)))
+
+
+# =========================================================
+# FORMULE DEI CENTRI
+# =========================================================
+def erlang_c(c, offered_load):
+    """
+    Probabilità di attesa di Erlang C per c serventi e carico offerto a = lambda*E[S].
+    Accetta array (broadcasting): usa la ricorsione stabile di Erlang B.
+    Restituisce 1 dove il centro non è stabile.
+    """
+    c, a = np.broadcast_arrays(np.asarray(c, dtype=int), np.asarray(offered_load, dtype=float))
+    b = np.ones(a.shape)
+    for k in range(1, int(c.max()) + 1 if c.size else 1):
+        active = k <= c
+        b = np.where(active, a * b / (k + a * b), b)
+    rho = a / c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pc = b / (1.0 - rho * (1.0 - b))
+    pc = np.where(rho < 1.0, pc, 1.0)
+    return pc[()] if pc.ndim == 0 else pc
+
+
+def mgc_queue_time(lam, c, mean, scv):
+    """
+    Tempo medio in coda M/G/c (Allen-Cunneen): Wq(M/M/c) * (1 + scv) / 2.
+    Esatto per M/M/c (scv = 1) e per M/G/1 (Pollaczek-Khinchine). inf se instabile.
+    """
+    lam, c, mean, scv = np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in (lam, c, mean, scv)])
+    a = lam * mean
+    rho = a / c
+    pc = erlang_c(c.astype(int), a)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wq = pc * mean / (c * (1.0 - rho)) * (1.0 + scv) / 2.0
+    wq = np.where(rho < 1.0, wq, np.inf)
+    return wq[()] if wq.ndim == 0 else wq
+
+
+def priority_queue_times(class_rates, class_means, c, mean, scv):
+    """
+    Tempi medi in coda per classi a priorità non-preemptive (classe 0 = priorità massima).
+    W0 è il lavoro residuo atteso (esatto per c = 1, Cobham), approssimato per c > 1
+    come C(c, a) * E[S] / c * (1 + scv) / 2; Wq_k = W0 / ((1 - sigma_{k-1}) (1 - sigma_k)).
+    """
+    lam = sum(class_rates)
+    a = lam * mean
+    if a / c >= 1.0:
+        return [math.inf] * len(class_rates)
+    w0 = float(erlang_c(c, a)) * mean / c * (1.0 + scv) / 2.0
+    times, sigma_prev = [], 0.0
+    for rate, m in zip(class_rates, class_means):
+        sigma = sigma_prev + rate * m / c
+        times.append(w0 / ((1.0 - sigma_prev) * (1.0 - sigma)) if sigma < 1.0 else math.inf)
+        sigma_prev = sigma
+    return times
+
+
+# =========================================================
+# RISOLUZIONE
+# =========================================================
+def solve(cfg: dict, arrival_rate: float = None, exponential: bool = False, priority: bool = False) -> dict:
+    """
+    Valuta la rete per una configurazione.
+
+    Returns:
+        dict: {"arrival_rate", "stable", "response_time" (tempo medio nel sistema),
+               "centers": {nome: {"arrival_rate", "servers", "utilization", "stable",
+                                  "service_time", "queue_time", "response_time", "visits"}}}
+        Con priority=True i centri "InValutazione_<classe>" sostituiscono "InValutazione".
+    """
+    if arrival_rate is None:
+        arrival_rate = load_arrival_rate()
+    P, gamma = routing_matrix(cfg, arrival_rate)
+    lambdas = solve_traffic(P, gamma)
+
+    centers = {}
+    for i, center in enumerate(CENTERS):
+        dist = service_model(cfg, center, exponential)
+        c = servers_number(cfg, center)
+        _, m1, m2 = dist.moments()
+        scv = m2 / (m1 * m1) - 1.0
+        lam = float(lambdas[i])
+        rho = lam * m1 / c
+        base = {"arrival_rate": lam, "servers": c, "utilization": rho, "stable": rho < 1.0,
+                "visits": lam / arrival_rate if arrival_rate > 0 else 0.0}
+
+        if priority and center == "InValutazione":
+            # Classi: Diretta (da InvioDiretto), Leggera/Pesante (da Compilazione) per soglia sul servizio
+            from_diretto = float(lambdas[1] * P[1, 2])
+            from_comp = lam - from_diretto
+            p_light, s_light, _ = dist.moments(0.0, HEAVY_THRESHOLD * m1)
+            p_heavy, s_heavy, _ = dist.moments(HEAVY_THRESHOLD * m1, math.inf)
+            rates = [from_diretto, from_comp * p_light, from_comp * p_heavy]
+            means = [m1, s_light / p_light, s_heavy / p_heavy]
+            waits = priority_queue_times(rates, means, c, m1, scv)
+            for name, rate, mean, wq in zip(PRIORITY_CLASSES, rates, means, waits):
+                centers[f"{center}_{name}"] = dict(base, arrival_rate=rate,
+                                                   visits=rate / arrival_rate if arrival_rate > 0 else 0.0,
+                                                   service_time=mean, queue_time=wq,
+                                                   response_time=wq + mean)
+            continue
+
+        wq = float(mgc_queue_time(lam, c, m1, scv))
+        centers[center] = dict(base, service_time=m1, queue_time=wq, response_time=wq + m1)
+
+    stable = all(c["stable"] for c in centers.values())
+    response = sum(c["visits"] * c["response_time"] for c in centers.values()) if stable else math.inf
+    return {"arrival_rate": arrival_rate, "stable": stable, "response_time": response, "centers": centers}
+
+
+def theo_values(result: dict, digits: int = 4) -> dict:
+    """Estrae dal risultato di solve() il formato di conf/theo_values.json."""
+    return {
+        name: {metric: round(values[metric], digits) for metric in ("queue_time", "service_time", "response_time")}
+        for name, values in result["centers"].items()
+    }
+
+
+def write_theo_values(result: dict, filename: str) -> Path:
+    """Scrive i valori teorici in conf/<filename> (o nel path indicato)."""
+    path = Path(filename)
+    if not path.is_absolute():
+        path = CONF_DIR / filename
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(theo_values(result), f, indent=4)
+        f.write("\n")
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calcola i valori teorici della rete a partire da una config")
+    parser.add_argument("--config", default="input.json", help="Config in conf/ (input.json, inputVerf.json, ...)")
+    parser.add_argument("--out", default=None, help="File di output in conf/ (es. theo_values.json)")
+    parser.add_argument("--arrival-rate", type=float, default=None, help="Default: conf/arrival_rate.json")
+    parser.add_argument("--exponential", action="store_true", help="Servizi esponenziali (blocchi di verifica)")
+    parser.add_argument("--priority", action="store_true", help="InValutazione a priorità non-preemptive")
+    args = parser.parse_args()
+
+    result = solve(load_config(args.config), args.arrival_rate, args.exponential, args.priority)
+    for name, values in result["centers"].items():
+        print(f"{name}: lambda={values['arrival_rate']:.6f} c={values['servers']} "
+              f"rho={values['utilization']:.4f} Tq={values['queue_time']:.4f} "
+              f"S={values['service_time']:.4f} R={values['response_time']:.4f}")
+    print(f"Tempo di risposta del sistema: {result['response_time']:.4f} (stabile: {result['stable']})")
+    if args.out:
+        print(f"Valori teorici scritti in: {write_theo_values(result, args.out)}")
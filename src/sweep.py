@@ -0,0 +1,262 @@
+"""
+Sweep di capacity planning in due fasi.
+
+1) Screening analitico: per ogni combinazione della griglia (dipendenti, pratichePerDipendente
+   di InValutazione e serversNumber di CompilazionePrecompilata) si valutano stabilità e tempo
+   di risposta atteso con il risolutore della rete (simulation/verification/queueingNetwork.py).
+   I centri sono indipendenti dato il routing, quindi tutta la griglia è valutata in forma vettoriale.
+2) Simulazione: solo i candidati promettenti (non dominati, a meno di una tolleranza, nel piano
+   costo / tempo di risposta analitico) vengono simulati in parallelo con l'engine scelto.
+
+In uscita viene stampato e salvato il fronte di Pareto costo / tempo di risposta simulato.
+
+Uso (dalla cartella src):
+    python sweep.py --dipendenti 120:200:20 --pratiche 60,70,80 --servers 6:12 --days 7 --replicas 2
+"""
+
+import argparse
+import contextlib
+import copy
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from tabulate import tabulate
+
+from batch.batchMeanPriority import replicationInterval
+from simulation.verification import queueingNetwork as qn
+
+
+OUT_ROOT = Path(__file__).resolve().parent / "sweep_json"
+
+
+def parse_values(spec: str) -> list[int]:
+    """Interpreta "a:b[:step]" (estremi inclusi) oppure una lista "a,b,c"."""
+    if ":" in spec:
+        parts = [int(p) for p in spec.split(":")]
+        start, stop = parts[0], parts[1]
+        step = parts[2] if len(parts) > 2 else 1
+        return list(range(start, stop + 1, step))
+    return [int(p) for p in spec.split(",") if p.strip()]
+
+
+def config_cost(dipendenti, pratiche, servers, weights: dict):
+    """Costo di una configurazione: combinazione lineare di dipendenti, pratiche totali e serventi."""
+    return (weights["dipendente"] * dipendenti
+            + weights["pratica"] * dipendenti * pratiche
+            + weights["server"] * servers)
+
+
+def apply_config(cfg: dict, dipendenti: int, pratiche: int, servers: int) -> dict:
+    """Restituisce una copia di cfg con i parametri di capacità indicati."""
+    new_cfg = copy.deepcopy(cfg)
+    new_cfg["inValutazione"]["dipendenti"] = int(dipendenti)
+    new_cfg["inValutazione"]["pratichePerDipendente"] = int(pratiche)
+    new_cfg["compilazionePrecompilata"]["serversNumber"] = int(servers)
+    return new_cfg
+
+
+# =========================================================
+# FASE 1: SCREENING ANALITICO
+# =========================================================
+def screen(cfg: dict, dipendenti, pratiche, servers, arrival_rate=None, max_utilization=0.95,
+           weights=None) -> list[dict]:
+    """
+    Valuta analiticamente tutta la griglia.
+
+    Returns:
+        list[dict]: una voce per configurazione con dipendenti, pratiche, servers, cost,
+                    utilization (massima fra i centri), stable e response_time (inf se instabile).
+    """
+    weights = weights or {"dipendente": 1.0, "pratica": 0.0, "server": 1.0}
+    base = qn.solve(cfg, arrival_rate)
+    centers = base["centers"]
+
+    D, K, S = np.meshgrid(np.asarray(dipendenti), np.asarray(pratiche), np.asarray(servers), indexing="ij")
+    D, K, S = D.ravel(), K.ravel(), S.ravel()
+
+    # Il routing non dipende dalla capacità: lambda e visite sono quelli della configurazione base
+    rho_max = np.zeros(D.shape)
+    response = np.zeros(D.shape)
+    for center, servers_grid in (("InValutazione", D * K), ("CompilazionePrecompilata", S),
+                                 ("InvioDiretto", np.ones(D.shape, dtype=int))):
+        info = centers[center]
+        _, m1, m2 = qn.service_model(cfg, center).moments()
+        scv = m2 / (m1 * m1) - 1.0
+        wq = qn.mgc_queue_time(info["arrival_rate"], servers_grid, m1, scv)
+        rho_max = np.maximum(rho_max, info["arrival_rate"] * m1 / servers_grid)
+        response = response + info["visits"] * (wq + m1)
+
+    stable = rho_max < max_utilization
+    response = np.where(stable, response, np.inf)
+    cost = config_cost(D, K, S, weights)
+    return [
+        {"dipendenti": int(d), "pratiche": int(k), "servers": int(s), "cost": float(c),
+         "utilization": float(u), "stable": bool(ok), "response_time": float(r)}
+        for d, k, s, c, u, ok, r in zip(D, K, S, cost, rho_max, stable, response)
+    ]
+
+
+def pareto_front(points: list[dict], key: str = "response_time", slack: float = 0.0) -> list[dict]:
+    """
+    Punti non dominati nel piano (cost, key), ordinati per costo crescente.
+    Con slack > 0 un punto è scartato solo se un punto non più costoso ha un valore
+    migliore di oltre la frazione slack.
+    """
+    finite = [p for p in points if np.isfinite(p[key])]
+    finite.sort(key=lambda p: (p["cost"], p[key]))
+    front, best = [], np.inf
+    for p in finite:
+        if p[key] * (1.0 - slack) < best:
+            front.append(p)
+        best = min(best, p[key])
+    return front
+
+
+# =========================================================
+# FASE 2: SIMULAZIONE PARALLELA
+# =========================================================
+def replica_response_times(out_dir: Path) -> list[float]:
+    """
+    Tempo medio di risposta di ogni replica (file daily_stats_rep*.json di una cartella):
+    tempo totale speso nei centri (visite * (coda + servizio)) diviso il numero di usciti.
+    """
+    paths = glob.glob(str(Path(out_dir) / "daily_stats_rep*.json"))
+    paths.sort(key=lambda p: int(p.rsplit("_rep", 1)[1].split(".")[0]))
+    values = []
+    for path in paths:
+        total_time, exited = 0.0, 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                if row.get("type") != "daily_summary":
+                    continue
+                exited += row["summary"].get("usciti", 0)
+                for stats in row["stats"].values():
+                    visited = stats["visited"]
+                    if isinstance(visited, dict):
+                        for name, v in visited.items():
+                            total_time += v * (stats["queue_time"][name] + stats["executing_time"][name])
+                    else:
+                        total_time += visited * (stats["queue_time"] + stats["executing_time"])
+        values.append(total_time / exited if exited > 0 else float("nan"))
+    return values
+
+
+def mean_response_time(out_dir: Path) -> float:
+    """Tempo medio di risposta mediato fra le repliche di una cartella."""
+    values = [v for v in replica_response_times(out_dir) if v == v]
+    return sum(values) / len(values) if values else float("nan")
+
+
+def simulate_candidate(cfg: dict, candidate: dict, model: str, replicas: int, seed: int, out_dir: str,
+                       antithetic: bool = False) -> dict:
+    """Esegue le repliche a orizzonte finito di un candidato (in un processo separato)."""
+    if model == "migliorativo":
+        from simulation.SimulationEngineMigliorativa import SimulationEngine
+    else:
+        from simulation.SimulationEngine import SimulationEngine
+
+    cand_cfg = apply_config(cfg, candidate["dipendenti"], candidate["pratiche"], candidate["servers"])
+    os.makedirs(out_dir, exist_ok=True)
+    with open(Path(out_dir) / "simulation.log", "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        engine = SimulationEngine(cfg=cand_cfg, out_dir=out_dir, antithetic=antithetic)
+        engine.run_finito_experiment(n_replicas=replicas, seed_base=seed)
+
+    values = [v for v in replica_response_times(Path(out_dir)) if v == v]
+    try:
+        mean, half_width, _ = replicationInterval(values, antithetic=antithetic)
+    except ValueError:
+        mean, half_width = mean_response_time(Path(out_dir)), None
+    return dict(candidate, simulated_response_time=mean, simulated_ci=half_width, out_dir=out_dir)
+
+
+def simulate(cfg: dict, candidates: list[dict], model="base", replicas=2, seed=3, workers=None,
+             antithetic=False) -> list[dict]:
+    """Simula i candidati in parallelo (un processo per candidato)."""
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(simulate_candidate, cfg, cand, model, replicas, seed,
+                        str(OUT_ROOT / f"D{cand['dipendenti']}_P{cand['pratiche']}_S{cand['servers']}"),
+                        antithetic): cand
+            for cand in candidates
+        }
+        for future in as_completed(futures):
+            cand = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"✗ Simulazione fallita per {cand}: {e}")
+                continue
+            print(f"✓ D={cand['dipendenti']} P={cand['pratiche']} S={cand['servers']}: "
+                  f"R simulato = {result['simulated_response_time']:.2f} s")
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep di capacity planning: screening analitico e simulazione")
+    parser.add_argument("--config", default="input.json", help="Config di base in conf/")
+    parser.add_argument("--dipendenti", required=True, help='Valori di dipendenti ("a:b:step" o "a,b,c")')
+    parser.add_argument("--pratiche", required=True, help="Valori di pratichePerDipendente")
+    parser.add_argument("--servers", required=True, help="Valori di serversNumber di CompilazionePrecompilata")
+    parser.add_argument("--arrival-rate", type=float, default=None, help="Default: conf/arrival_rate.json")
+    parser.add_argument("--max-utilization", type=float, default=0.95, help="Soglia di stabilità per lo screening")
+    parser.add_argument("--slack", type=float, default=0.05, help="Tolleranza sul fronte analitico per i candidati")
+    parser.add_argument("--max-candidates", type=int, default=8, help="Numero massimo di configurazioni simulate")
+    parser.add_argument("--cost-dipendente", type=float, default=1.0)
+    parser.add_argument("--cost-pratica", type=float, default=0.0)
+    parser.add_argument("--cost-server", type=float, default=1.0)
+    parser.add_argument("--model", choices=["base", "migliorativo"], default="base")
+    parser.add_argument("--days", type=int, default=None, help="Orizzonte simulato in giorni (default: date della config)")
+    parser.add_argument("--replicas", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--antithetic", action="store_true", help="Repliche a coppie antitetiche (numero pari)")
+    parser.add_argument("--screen-only", action="store_true", help="Esegue solo lo screening analitico")
+    args = parser.parse_args()
+
+    cfg = qn.load_config(args.config)
+    if args.days is not None:
+        start = datetime.fromisoformat(cfg["date"]["start"])
+        cfg["date"]["end"] = (start + timedelta(days=args.days - 1)).date().isoformat()
+    weights = {"dipendente": args.cost_dipendente, "pratica": args.cost_pratica, "server": args.cost_server}
+
+    grid = screen(cfg, parse_values(args.dipendenti), parse_values(args.pratiche), parse_values(args.servers),
+                  args.arrival_rate, args.max_utilization, weights)
+    stable = [p for p in grid if p["stable"]]
+    print(f"\n▶ Screening analitico: {len(grid)} configurazioni, {len(stable)} stabili")
+
+    candidates = pareto_front(stable, slack=args.slack)[:args.max_candidates]
+    print(tabulate([[c["dipendenti"], c["pratiche"], c["servers"], f"{c['cost']:.1f}",
+                     f"{c['utilization']:.3f}", f"{c['response_time']:.2f}"] for c in candidates],
+                   headers=["Dipendenti", "Pratiche", "Serventi", "Costo", "ρ max", "R analitico"],
+                   tablefmt="fancy_grid"))
+
+    OUT_ROOT.mkdir(parents=True, exist_ok=True)
+    summary = {"config": args.config, "grid_size": len(grid), "stable": len(stable), "candidates": candidates}
+
+    if not args.screen_only and candidates:
+        print(f"\n▶ Simulazione di {len(candidates)} candidati ({args.model}, {args.replicas} repliche)...\n")
+        results = simulate(cfg, candidates, args.model, args.replicas, args.seed, args.workers, args.antithetic)
+        front = pareto_front(results, key="simulated_response_time")
+        print("\n=== Fronte di Pareto costo / tempo di risposta simulato ===")
+        print(tabulate([[p["dipendenti"], p["pratiche"], p["servers"], f"{p['cost']:.1f}",
+                         f"{p['response_time']:.2f}", f"{p['simulated_response_time']:.2f}"] for p in front],
+                       headers=["Dipendenti", "Pratiche", "Serventi", "Costo", "R analitico", "R simulato"],
+                       tablefmt="fancy_grid"))
+        summary.update({"simulated": results, "pareto_front": front})
+
+    out_path = OUT_ROOT / "pareto_front.json"
+    with out_path.open("w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"\n📁 Risultati salvati in: {out_path}")
+
+
+if __name__ == "__main__":
+    main()